@@ -0,0 +1,48 @@
+"""Add trigram search indexes
+
+Revision ID: 9b7d4e21c6a8
+Revises: 5f1c2a9e7b43
+Create Date: 2026-10-17 13:40:07.251846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b7d4e21c6a8'
+down_revision: Union[str, None] = '5f1c2a9e7b43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Spalten der Autocomplete-Suche (siehe app/search.py)
+TRIGRAM_INDEXES = [
+    ('articles', 'article_number'),
+    ('articles', 'name'),
+    ('products', 'name'),
+    ('customers', 'customer_number'),
+    ('customers', 'company_name'),
+    ('customers', 'first_name'),
+    ('customers', 'last_name'),
+]
+
+
+def upgrade() -> None:
+    # pg_trgm gibt es nur in PostgreSQL - andere Datenbanken nutzen den Index im Speicher
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in TRIGRAM_INDEXES:
+        op.create_index(
+            f'ix_{table}_{column}_trgm', table, [column], unique=False,
+            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'}
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column in reversed(TRIGRAM_INDEXES):
+        op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
@@ -0,0 +1,374 @@
+"""Export von Rechnungen und Verkaufsaufträgen für die Buchhaltung (CSV / Excel)
+
+Eine Zeile je Position, die Kopfdaten (Rechnungsnummer, Datum, Summen, ...)
+stehen in jeder Zeile - so lässt sich in der Tabellenkalkulation direkt
+filtern und summieren. Belege ohne Positionen erscheinen mit einer Zeile.
+
+Die Köpfe werden serverseitig blockweise gelesen (yield_per), die Positionen
+je Block mit einer IN-Abfrage geladen. Ausgegeben wird in Stücken, ohne die
+Ergebnismenge im Speicher zu halten - auch für mehrere Jahre.
+
+- CSV: Trennzeichen ;, Dezimalkomma, Datum TT.MM.JJJJ, UTF-8 mit BOM
+  (öffnet so direkt in einem deutschen Excel)
+- XLSX: eine Tabelle, Zahlen und Datumswerte als echte Zellwerte. Die Datei
+  wird ohne Zusatzpaket erzeugt (zipfile) und ebenfalls gestreamt.
+
+Kommandozeile:
+    python accounting_export.py invoices --year 2024 --quarter 1 > rechnungen.csv
+    python accounting_export.py sales-orders --year 2024 --format xlsx > auftraege.xlsx
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import groupby
+from typing import Iterator, NamedTuple, Optional
+from xml.sax.saxutils import escape
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Article, Customer, Invoice, InvoiceItem, Product, SalesOrder, SalesOrderItem
+
+EXPORT_BATCH = 1000
+
+
+class Period(NamedTuple):
+    """Zeitraum [start, end) - None = offen"""
+    start: Optional[datetime]
+    end: Optional[datetime]
+    label: str
+
+
+def _whole_number(value, label: str) -> Optional[int]:
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"Ungültiges {label}: '{value}'")
+
+
+def export_period(year=None, quarter=None, date_from: str = "", date_to: str = "") -> Period:
+    """Zeitraum aus Jahr/Quartal oder Von/Bis-Datum (ISO, Bis einschließlich)
+
+    Jahr und Quartal als Zahl oder Text (Formularfelder). ValueError bei
+    ungültigen Angaben. Ohne Angaben: alle Belege.
+    """
+    year, quarter = _whole_number(year, "Jahr"), _whole_number(quarter, "Quartal")
+    if quarter and not year:
+        raise ValueError("Quartal nur zusammen mit Jahr")
+    if quarter and not 1 <= quarter <= 4:
+        raise ValueError("Quartal muss 1-4 sein")
+    if year:
+        if not 1900 <= year <= 9998:
+            raise ValueError(f"Ungültiges Jahr: {year}")
+        if date_from or date_to:
+            raise ValueError("Entweder Jahr/Quartal oder Von/Bis angeben")
+        if quarter:
+            start = datetime(year, 3 * quarter - 2, 1)
+            end = datetime(year + 1, 1, 1) if quarter == 4 else datetime(year, 3 * quarter + 1, 1)
+            return Period(start, end, f"{year}-Q{quarter}")
+        return Period(datetime(year, 1, 1), datetime(year + 1, 1, 1), str(year))
+
+    try:
+        start = datetime.fromisoformat(date_from) if date_from else None
+        end = datetime.fromisoformat(date_to) + timedelta(days=1) if date_to else None
+    except ValueError:
+        raise ValueError("Datum im Format JJJJ-MM-TT angeben")
+    if start and end and end <= start:
+        raise ValueError("Bis-Datum liegt vor dem Von-Datum")
+    if not start and not end:
+        return Period(None, None, "alle")
+    return Period(start, end, f"{date_from or 'anfang'}_{date_to or 'heute'}")
+
+
+def _in_period(statement, column, period: Period):
+    if period.start:
+        statement = statement.where(column >= period.start)
+    if period.end:
+        statement = statement.where(column < period.end)
+    return statement
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _line_rows(db: Session, heads, item_statement, parent_column) -> Iterator[list]:
+    """Kopfzeilen blockweise lesen, Positionen je Block nachladen und verbinden
+
+    heads: Ergebnis mit yield_per, erste Spalte die id des Belegs.
+    item_statement: Abfrage der Positionen, erste Spalte die id des Belegs.
+    """
+    for block in heads.partitions():
+        ids = [head[0] for head in block]
+        items = {}
+        rows = db.execute(item_statement.where(parent_column.in_(ids)))
+        for parent_id, group in groupby(rows, key=lambda row: row[0]):
+            items[parent_id] = [list(row[1:]) for row in group]
+        for head in block:
+            values = list(head[1:])
+            for item in items.get(head[0]) or [[None] * (len(item_statement.selected_columns) - 1)]:
+                yield values + item
+
+
+# ---------------------------------------------------------------------------
+# Belege
+# ---------------------------------------------------------------------------
+
+INVOICE_COLUMNS = [
+    "Rechnungsnr.", "Rechnungsdatum", "Fällig am", "Status", "Kundennr.", "Kunde", "USt-IdNr.",
+    "Netto", "MwSt-Satz", "MwSt", "Brutto", "Bezahlt am", "Auftrag",
+    "Pos.", "Artikelnr.", "Beschreibung", "Menge", "Einheit", "Einzelpreis netto", "Positionssumme netto",
+]
+
+SALES_ORDER_COLUMNS = [
+    "Auftrag", "Auftragsnr.", "Datum", "Status", "Kunde", "Versandkosten", "Verpackungskosten",
+    "Versendet am", "Typ", "Produkt/Artikel", "Artikelnr.", "Menge", "Einzelpreis", "Selbstkosten je Einheit",
+    "Positionssumme",
+]
+
+
+def invoice_rows(db: Session, period: Period) -> Iterator[list]:
+    """Rechnungen im Zeitraum (nach Rechnungsdatum), eine Zeile je Position"""
+    heads = select(
+        Invoice.id, Invoice.invoice_number, Invoice.invoice_date, Invoice.due_date, Invoice.status,
+        Customer.customer_number, Invoice.customer_name, Customer.vat_id,
+        Invoice.total_net, Invoice.vat_rate, Invoice.vat_amount, Invoice.total_gross, Invoice.paid_at,
+        Invoice.sales_order_id,
+    ).outerjoin(Customer, Customer.id == Invoice.customer_id).order_by(Invoice.invoice_date, Invoice.id)
+    heads = _in_period(heads, Invoice.invoice_date, period)
+    items = select(
+        InvoiceItem.invoice_id, InvoiceItem.position, InvoiceItem.article_number, InvoiceItem.description,
+        InvoiceItem.quantity, InvoiceItem.unit, InvoiceItem.unit_price_net, InvoiceItem.total_net,
+    ).order_by(InvoiceItem.invoice_id, InvoiceItem.position)
+
+    result = db.execute(heads.execution_options(yield_per=EXPORT_BATCH))
+    for row in _line_rows(db, result, items, InvoiceItem.invoice_id):
+        for index in (1, 2, 11):  # Rechnungsdatum, Fällig am, Bezahlt am
+            row[index] = _day(row[index])
+        yield row
+
+
+def sales_order_rows(db: Session, period: Period) -> Iterator[list]:
+    """Verkaufsaufträge im Zeitraum (nach Anlagedatum), eine Zeile je Position"""
+    heads = select(
+        SalesOrder.id, SalesOrder.id.label("order_id"), SalesOrder.order_number, SalesOrder.created_at, SalesOrder.status,
+        SalesOrder.customer_name, SalesOrder.shipping_cost, SalesOrder.packaging_cost, SalesOrder.shipped_at,
+    ).order_by(SalesOrder.created_at, SalesOrder.id)
+    heads = _in_period(heads, SalesOrder.created_at, period)
+    items = select(
+        SalesOrderItem.sales_order_id, SalesOrderItem.item_type,
+        Product.name.label("product_name"), Article.name.label("article_name"), Article.article_number,
+        SalesOrderItem.quantity, SalesOrderItem.unit_price, SalesOrderItem.cost_per_unit,
+    ).outerjoin(Product, Product.id == SalesOrderItem.product_id).outerjoin(
+        Article, Article.id == SalesOrderItem.article_id
+    ).order_by(SalesOrderItem.sales_order_id, SalesOrderItem.id)
+
+    result = db.execute(heads.execution_options(yield_per=EXPORT_BATCH))
+    for row in _line_rows(db, result, items, SalesOrderItem.sales_order_id):
+        head, (item_type, product_name, article_name, article_number, quantity, unit_price, cost) = row[:8], row[8:]
+        head[2], head[7] = _day(head[2]), _day(head[7])
+        total = unit_price * quantity if unit_price is not None and quantity is not None else None
+        yield head + [
+            item_type, product_name if item_type == "product" else article_name,
+            None if item_type == "product" else article_number, quantity, unit_price, cost, total,
+        ]
+
+
+EXPORTS = {
+    "invoices": ("Rechnungen", INVOICE_COLUMNS, invoice_rows),
+    "sales-orders": ("Auftraege", SALES_ORDER_COLUMNS, sales_order_rows),
+}
+
+
+# ---------------------------------------------------------------------------
+# Ausgabe
+# ---------------------------------------------------------------------------
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (Decimal, float)):
+        return str(value).replace(".", ",")
+    if isinstance(value, date):
+        return value.strftime("%d.%m.%Y")
+    return value
+
+
+def write_csv(columns: list, rows) -> Iterator[str]:
+    buffer = io.StringIO()
+    buffer.write("\ufeff")  # BOM, damit Excel UTF-8 erkennt
+    writer = csv.writer(buffer, delimiter=";")
+    writer.writerow(columns)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % EXPORT_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+_XLSX_FILES = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '<Relationship Id="rId2" Target="styles.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+        '</Relationships>'
+    ),
+    # Zellformate: 0 = Standard, 1 = Datum, 2 = Betrag (#,##0.00)
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '</styleSheet>'
+    ),
+}
+_XLSX_EPOCH = date(1899, 12, 30)
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_cell(value, style: int = 0) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, date):
+        return f'<c s="1"><v>{(_day(value) - _XLSX_EPOCH).days}</v></c>'
+    if isinstance(value, Decimal):
+        return f'<c s="2"><v>{value}</v></c>'
+    if isinstance(value, (int, float)):
+        return f"<c><v>{value}</v></c>"
+    text = escape(_XML_INVALID.sub("", str(value)))
+    style = f' s="{style}"' if style else ""
+    return f'<c t="inlineStr"{style}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class _Chunks:
+    """Schreibziel für zipfile, das die geschriebenen Bytes zum Abholen sammelt"""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def write_xlsx(columns: list, rows, sheet_name: str = "Export") -> Iterator[bytes]:
+    """Excel-Datei mit einer Tabelle, blockweise als Bytes
+
+    Das ZIP wird in ein nicht durchsuchbares Ziel geschrieben (Größen stehen
+    dann hinter den Daten), die Tabelle selbst wird komprimiert durchgereicht.
+    """
+    sink = _Chunks()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_FILES.items():
+            archive.writestr(name, content)
+        archive.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" '
+                'activePane="bottomLeft" state="frozen"/></sheetView></sheetViews><sheetData>'
+                "<row>" + "".join(_xlsx_cell(name, 3) for name in columns) + "</row>"
+            ).encode())
+            parts = []
+            for count, row in enumerate(rows, start=1):
+                parts.append("<row>" + "".join(_xlsx_cell(value) for value in row) + "</row>")
+                if count % EXPORT_BATCH == 0:
+                    sheet.write("".join(parts).encode())
+                    parts = []
+                    yield sink.take()
+            parts.append("</sheetData></worksheet>")
+            sheet.write("".join(parts).encode())
+    yield sink.take()
+
+
+def export_csv(db: Session, kind: str, period: Period) -> Iterator[str]:
+    _, columns, rows = EXPORTS[kind]
+    return write_csv(columns, rows(db, period))
+
+
+def export_xlsx(db: Session, kind: str, period: Period) -> Iterator[bytes]:
+    sheet_name, columns, rows = EXPORTS[kind]
+    return write_xlsx(columns, rows(db, period), sheet_name)
+
+
+EXPORT_FORMATS = {
+    "csv": (export_csv, "text/csv"),
+    "xlsx": (export_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rechnungen/Aufträge für die Buchhaltung exportieren")
+    parser.add_argument("kind", choices=sorted(EXPORTS))
+    parser.add_argument("--year", type=int)
+    parser.add_argument("--quarter", type=int)
+    parser.add_argument("--from", dest="date_from", default="", help="JJJJ-MM-TT")
+    parser.add_argument("--to", dest="date_to", default="", help="JJJJ-MM-TT (einschließlich)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    args = parser.parse_args()
+    try:
+        period = export_period(args.year, args.quarter, args.date_from, args.date_to)
+    except ValueError as e:
+        parser.error(str(e))
+
+    db = SessionLocal()
+    try:
+        for part in EXPORT_FORMATS[args.format][0](db, args.kind, period):
+            sys.stdout.buffer.write(part.encode() if isinstance(part, str) else part)
+    finally:
+        db.close()
@@ -0,0 +1,168 @@
+"""Inhaltsadressierter Dateispeicher
+
+Dateien liegen unter FILE_STORAGE_PATH/blobs/ab/cd/<sha256><endung> - gleiche
+Inhalte also genau einmal auf der Platte. Die Tabelle file_blobs zählt, wie
+viele Einträge (z.B. ConvertedFile) eine Datei verwenden; gelöscht wird sie
+erst, wenn der Zähler auf 0 fällt.
+
+Uploads werden blockweise in FILE_STORAGE_PATH/tmp geschrieben und dabei
+gehasht (konstanter Speicherbedarf, keine zweite Leserunde). Da das
+Staging-Verzeichnis auf demselben Dateisystem liegt, landet die Datei per
+atomarem Umbenennen an ihrem endgültigen Ort - ohne Kopie.
+"""
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import NamedTuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import FileBlob
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class StagedFile(NamedTuple):
+    """Hochgeladene Datei im Staging-Verzeichnis"""
+    path: Path
+    sha256: str
+    size_bytes: int
+
+
+class FileTooLarge(ValueError):
+    """Upload überschreitet die erlaubte Größe"""
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Ablage und Referenzzählung der Blobs unter storage_path"""
+
+    def __init__(self, storage_path: Path):
+        self.storage_path = storage_path
+        self.staging_dir = storage_path / "tmp"
+
+    def prepare(self):
+        """Legt die Verzeichnisse an (beim Start der App, nicht beim Import)"""
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+    def _staging_target(self) -> Path:
+        return self.staging_dir / f"{uuid.uuid4()}.upload"
+
+    def stage_stream(self, stream, name: str, max_bytes: int = None) -> StagedFile:
+        """Schreibt ein Dateiobjekt blockweise ins Staging-Verzeichnis (Hash und Größe nebenbei)"""
+        target = self._staging_target()
+        digest, size = hashlib.sha256(), 0
+        try:
+            with open(target, "wb") as f:
+                while chunk := stream.read(CHUNK_SIZE):
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise FileTooLarge(f"{name} ist zu groß")
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            target.unlink(missing_ok=True)
+            raise
+        return StagedFile(target, digest.hexdigest(), size)
+
+    @staticmethod
+    def discard(staged_files):
+        for staged in staged_files:
+            staged.path.unlink(missing_ok=True)
+
+    def cleanup_staging(self, max_age_seconds: float) -> int:
+        """Entfernt liegengebliebene, keinem Job zugeordnete Uploads (z.B. nach einem Absturz)"""
+        removed = 0
+        cutoff = time.time() - max_age_seconds
+        for path in self.staging_dir.glob("*.upload"):
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def relative_path(sha256: str, extension: str) -> str:
+        return str(Path("blobs") / sha256[:2] / sha256[2:4] / f"{sha256}{extension}")
+
+    @staticmethod
+    def sha256_of(relative_path: str):
+        """Hash aus einem Blob-Pfad (None bei Dateien außerhalb des Blob-Speichers)"""
+        path = Path(relative_path)
+        if path.parts[:1] != ("blobs",):
+            return None
+        return path.stem
+
+    def path(self, blob: FileBlob) -> Path:
+        return self.storage_path / blob.path
+
+    def add_file(self, db: Session, source: Path, extension: str, sha256: str = None) -> FileBlob:
+        """Übernimmt source in den Speicher (benennt sie um oder verwirft sie) und erhöht den Zähler
+
+        source sollte im Staging-Verzeichnis liegen, damit os.replace atomar
+        umbenennt statt zu kopieren.
+        """
+        sha256 = sha256 or sha256_file(source)
+        blob = db.query(FileBlob).filter(FileBlob.sha256 == sha256).first()
+        if blob is not None and self.path(blob).exists():
+            source.unlink(missing_ok=True)  # Inhalt ist schon vorhanden
+            self.add_ref(db, blob)
+            return blob
+
+        relative = self.relative_path(sha256, extension)
+        target = self.storage_path / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+        if blob is None:
+            try:
+                with db.begin_nested():
+                    blob = FileBlob(sha256=sha256, path=relative, size_bytes=target.stat().st_size, ref_count=1)
+                    db.add(blob)
+            except IntegrityError:
+                # Gleicher Inhalt gleichzeitig von einer anderen Anfrage abgelegt -
+                # die Datei ist identisch, nur den Zähler erhöhen
+                blob = db.query(FileBlob).filter(FileBlob.sha256 == sha256).one()
+                self.add_ref(db, blob)
+        else:
+            # Eintrag ohne Datei (z.B. nach manuellem Aufräumen) - Datei neu ablegen
+            blob.path = relative
+            self.add_ref(db, blob)
+        return blob
+
+    def add_staged(self, db: Session, staged: StagedFile, extension: str) -> FileBlob:
+        return self.add_file(db, staged.path, extension, staged.sha256)
+
+    def add_ref(self, db: Session, blob: FileBlob):
+        # Atomar in der Datenbank hochzählen (Request- und Worker-Thread greifen parallel zu)
+        db.query(FileBlob).filter(FileBlob.sha256 == blob.sha256).update(
+            {FileBlob.ref_count: FileBlob.ref_count + 1}, synchronize_session=False
+        )
+        db.expire(blob, ["ref_count"])
+
+    def release(self, db: Session, sha256: str):
+        """Verringert den Zähler - gibt den Dateipfad zurück, wenn der Blob nicht mehr verwendet wird
+
+        Die Datei selbst wird erst nach dem Commit über remove_files() gelöscht.
+        """
+        db.query(FileBlob).filter(FileBlob.sha256 == sha256).update(
+            {FileBlob.ref_count: FileBlob.ref_count - 1}, synchronize_session=False
+        )
+        blob = db.query(FileBlob).filter(FileBlob.sha256 == sha256).populate_existing().first()
+        if blob is None or blob.ref_count > 0:
+            return None
+        path = self.path(blob)
+        db.delete(blob)
+        return path
+
+    @staticmethod
+    def remove_files(paths):
+        for path in paths:
+            if path is not None:
+                path.unlink(missing_ok=True)
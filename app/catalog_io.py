@@ -0,0 +1,350 @@
+"""Import und Export der Stammdaten (Materialien, Maschinen, Produkte)
+
+Statt Hunderte Preise einzeln im Formular zu ändern: Export als CSV/JSON,
+in der Tabellenkalkulation bearbeiten, wieder importieren.
+
+Import (Upsert):
+- Zeilen mit id aktualisieren den Datensatz - nur die Spalten, die in der
+  Datei stehen. Enthält die Datei alle Pflichtspalten (z.B. ein kompletter
+  Export), geschieht das per INSERT ... ON CONFLICT (id) DO UPDATE, sonst
+  (z.B. nur id;price_per_unit) als UPDATE über die id - ein INSERT ohne
+  Pflichtspalten scheitert an NOT NULL, auch wenn die id schon existiert.
+- Zeilen ohne id legen neue Datensätze an (alle Pflichtspalten nötig).
+- Geschrieben wird in Blöcken von UPSERT_CHUNK Zeilen (ein Statement und ein
+  Commit je Block). Fehlerhafte Zeilen bzw. Blöcke werden gemeldet, der Rest
+  wird trotzdem importiert.
+- Danach werden die Kosten aller betroffenen Produkte einmal gesammelt neu
+  berechnet und die Produktsuche invalidiert (catalog_changed - gleich für
+  API und Kommandozeile). Laufende Worker-Prozesse sehen Änderungen aus der
+  Kommandozeile bzw. einem anderen Worker ohne Neustart: die
+  Dashboard-Statistik kommt aus den Snapshots, Such-Cache und -Index laufen
+  nach SEARCH_CACHE_TTL ab.
+
+Export: alle Spalten inkl. id, serverseitig blockweise gelesen (yield_per)
+und als Text-Stücke erzeugt - für StreamingResponse oder stdout.
+
+Komponenten von Baugruppen (ProductComponent) sind nicht enthalten.
+
+Kommandozeile:
+    python catalog_io.py export materials > materialien.csv
+    python catalog_io.py import materials materialien.csv
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Iterator
+from sqlalchemy import Integer, Numeric, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from costing import product_ids_using, refresh_cost_snapshots
+from models import Machine, Material, Product
+from search import search_changed
+
+CATALOGS = {
+    "materials": Material,
+    "machines": Machine,
+    "products": Product,
+}
+UPSERT_CHUNK = 500
+EXPORT_BATCH = 1000
+MAX_ERRORS = 100  # Weitere Fehler werden nur gezählt
+READ_ONLY_COLUMNS = {"created_at", "updated_at"}
+
+_UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class CatalogImportResult:
+    """Zusammenfassung eines Stammdaten-Imports"""
+
+    def __init__(self):
+        self.rows = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.ignored_columns = set()
+        self.ids = set()  # Geschriebene Datensätze
+        self.product_ids = set()  # Neu zu kalkulierende Produkte
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(message)
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "products_recalculated": len(self.product_ids),
+            "ignored_columns": sorted(self.ignored_columns),
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def catalog_model(kind: str):
+    """Model zum Katalognamen - KeyError bei unbekannten Namen"""
+    return CATALOGS[kind]
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+
+def required_columns(model) -> set:
+    """Spalten ohne die kein neuer Datensatz angelegt werden kann"""
+    return {
+        column.name for column in model.__table__.columns
+        if not column.nullable and not column.primary_key
+        and column.default is None and column.server_default is None
+    }
+
+
+def _convert(column, value):
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == "":
+        return None
+    try:
+        if isinstance(column.type, Integer):
+            return int(value)
+        if isinstance(column.type, Numeric):
+            return Decimal(str(value).replace(",", "."))
+    except (ValueError, InvalidOperation):
+        raise ValueError(f"Ungültiger Wert in {column.name}: '{value}'")
+    return str(value)
+
+
+def _convert_row(columns: dict, required: set, row: dict, result: CatalogImportResult) -> dict:
+    """Werte einer Zeile im Typ der Spalten - ValueError bei ungültigen Zeilen"""
+    values = {}
+    for key, value in row.items():
+        column = columns.get(key)
+        if column is None:
+            if key not in READ_ONLY_COLUMNS:
+                result.ignored_columns.add(key)
+            continue
+        values[key] = _convert(column, value)
+    if values.get("id") is None:
+        values.pop("id", None)  # Neuer Datensatz - id vergibt die Datenbank
+    # Neue Datensätze brauchen alle Pflichtspalten, bestehende dürfen sie nicht leeren
+    missing = sorted(
+        name for name in required
+        if values.get(name) is None and (name in values or "id" not in values)
+    )
+    if missing:
+        raise ValueError(f"Pflichtspalten fehlen: {', '.join(missing)}")
+    return values
+
+
+def _upsert(db: Session, model, required: set, rows: list) -> list:
+    """Schreibt einen Block (ein Statement je Spaltenkombination), gibt die ids zurück"""
+    table = model.__table__
+    insert = _UPSERT_DIALECTS[db.get_bind().dialect.name]
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    ids = []
+    for keys, group in groups.items():
+        if "id" in keys and not required.issubset(keys):
+            # Teil-Update bestehender Datensätze (executemany über den Primärschlüssel)
+            if "updated_at" in table.c:
+                now = datetime.utcnow()
+                group = [dict(row, updated_at=now) for row in group]
+            db.execute(update(model), group)
+            ids.extend(row["id"] for row in group)
+            continue
+        statement = insert(table).values(group)
+        if "id" in keys:
+            updates = {key: statement.excluded[key] for key in keys if key != "id"}
+            if "updated_at" in table.c:
+                updates["updated_at"] = datetime.utcnow()
+            statement = statement.on_conflict_do_update(index_elements=[table.c.id], set_=updates)
+        ids.extend(db.execute(statement.returning(table.c.id)).scalars())
+    return ids
+
+
+def _sync_id_sequence(db: Session, model):
+    """Postgres: Sequenz hinter die höchste id setzen (nach Zeilen mit vorgegebener id)"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    table = model.__table__
+    db.execute(select(func.setval(
+        func.pg_get_serial_sequence(table.name, "id"),
+        select(func.max(table.c.id)).scalar_subquery(),
+    )))
+    db.commit()
+
+
+def _write_chunk(db: Session, model, required: set, chunk: list, result: CatalogImportResult):
+    # Teil-Updates nur für vorhandene ids (ein INSERT wäre ohne Pflichtspalten nicht möglich)
+    partial_ids = [values["id"] for _, values in chunk if "id" in values and not required.issubset(values)]
+    if partial_ids:
+        existing = {row_id for (row_id,) in db.query(model.id).filter(model.id.in_(partial_ids))}
+        kept = []
+        for row_number, values in chunk:
+            if "id" in values and not required.issubset(values) and values["id"] not in existing:
+                result.rows_failed += 1
+                result.error(f"Zeile {row_number}: id {values['id']} nicht gefunden")
+            else:
+                kept.append((row_number, values))
+        chunk = kept
+    if not chunk:
+        return
+
+    first, last = chunk[0][0], chunk[-1][0]
+    try:
+        ids = _upsert(db, model, required, [values for _, values in chunk])
+        db.commit()
+    except DBAPIError as e:
+        db.rollback()
+        result.rows_failed += len(chunk)
+        result.error(f"Zeilen {first}-{last}: {str(e.orig).strip().splitlines()[0]}")
+        return
+    result.rows_written += len(chunk)
+    result.ids.update(ids)
+
+
+def affected_product_ids(db: Session, kind: str, ids) -> set:
+    """Produkte, deren Kosten sich durch geänderte Datensätze ändern können"""
+    if not ids:
+        return set()
+    if kind == "products":
+        return set(ids)
+    if kind == "materials":
+        return set(product_ids_using(db, material_ids=ids))
+    return set(product_ids_using(db, machine_ids=ids))
+
+
+def import_catalog(db: Session, kind: str, rows, chunk_size: int = UPSERT_CHUNK) -> CatalogImportResult:
+    """Importiert Zeilen (z.B. aus row_files.read_rows) in einen Katalog
+
+    Berechnet selbst keine Kosten neu - der Aufrufer bekommt die betroffenen
+    Produkte in result.product_ids und kalkuliert sie gesammelt.
+    """
+    model = catalog_model(kind)
+    columns = {
+        column.name: column for column in model.__table__.columns
+        if column.name not in READ_ONLY_COLUMNS
+    }
+    required = required_columns(model)
+    result = CatalogImportResult()
+    chunk = []
+    has_explicit_ids = False
+    for row_number, row in enumerate(rows, start=1):
+        result.rows = row_number
+        try:
+            values = _convert_row(columns, required, row, result)
+        except ValueError as e:
+            result.rows_failed += 1
+            result.error(f"Zeile {row_number}: {e}")
+            continue
+        if not values:
+            continue
+        has_explicit_ids = has_explicit_ids or "id" in values
+        chunk.append((row_number, values))
+        if len(chunk) >= chunk_size:
+            _write_chunk(db, model, required, chunk, result)
+            chunk = []
+    if chunk:
+        _write_chunk(db, model, required, chunk, result)
+    if has_explicit_ids and result.rows_written:
+        _sync_id_sequence(db, model)
+    result.product_ids = affected_product_ids(db, kind, result.ids)
+    return result
+
+
+def catalog_changed(db: Session, result: CatalogImportResult):
+    """Folgearbeiten nach einem Import: Kosten-Snapshots und Produktsuche aktualisieren"""
+    refresh_cost_snapshots(db, result.product_ids)
+    # Produktsuche liefert Namen und Einkaufspreise mit
+    search_changed("products")
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def export_rows(db: Session, kind: str) -> Iterator[dict]:
+    """Alle Datensätze als dict, blockweise aus der Datenbank gelesen"""
+    model = catalog_model(kind)
+    statement = select(*model.__table__.columns).order_by(model.id)
+    for row in db.execute(statement.execution_options(yield_per=EXPORT_BATCH)):
+        yield dict(row._mapping)
+
+
+def export_csv(db: Session, kind: str) -> Iterator[str]:
+    columns = [column.name for column in catalog_model(kind).__table__.columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(export_rows(db, kind), start=1):
+        writer.writerow(["" if row[name] is None else row[name] for name in columns])
+        if count % EXPORT_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} ist nicht JSON-serialisierbar")
+
+
+def export_json(db: Session, kind: str) -> Iterator[str]:
+    """JSON-Array, ein Objekt je Zeile"""
+    parts = ["["]
+    for count, row in enumerate(export_rows(db, kind)):
+        parts.append(("," if count else "") + "\n" + json.dumps(row, default=_json_value, ensure_ascii=False))
+        if len(parts) >= EXPORT_BATCH:
+            yield "".join(parts)
+            parts = []
+    parts.append("\n]\n")
+    yield "".join(parts)
+
+
+EXPORT_FORMATS = {
+    "csv": (export_csv, "text/csv"),
+    "json": (export_json, "application/json"),
+}
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from database import SessionLocal
+    from row_files import read_rows
+
+    parser = argparse.ArgumentParser(description="Stammdaten importieren/exportieren")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("kind", choices=sorted(CATALOGS))
+    parser.add_argument("file", nargs="?", help="CSV- oder JSON-Datei (nur import)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv", help="Format beim Export")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.action == "export":
+            for part in EXPORT_FORMATS[args.format][0](db, args.kind):
+                sys.stdout.write(part)
+        else:
+            if not args.file:
+                parser.error("import braucht eine Datei")
+            with open(args.file, "rb") as f:
+                summary = import_catalog(db, args.kind, read_rows(f, args.file))
+            catalog_changed(db, summary)
+            print(json.dumps(summary.to_dict(), indent=2, ensure_ascii=False))
+    finally:
+        db.close()
@@ -0,0 +1,439 @@
+"""Warteschlange für PNG-zu-SVG Konvertierungen
+
+vtracer rechnet je nach Bild mehrere Sekunden und würde, direkt im
+Request-Handler aufgerufen, die Event-Loop von uvicorn blockieren. Uploads
+werden deshalb als ConversionJob gespeichert und in einem Prozess-Pool
+(CONVERSION_WORKERS Prozesse, Standard: Anzahl CPU-Kerne) konvertiert.
+Der Request kehrt sofort mit der Job-ID zurück; den Status fragt die
+Ergebnisseite über /api/conversion-jobs/{id} ab.
+
+Stapel-Konvertierungen (viele Dateien oder ein ZIP) bestehen aus einzelnen
+Jobs mit gemeinsamer batch_id. Sie laufen parallel im selben Pool; die
+ConvertedFile-Einträge werden erst angelegt, wenn der letzte Job des Stapels
+fertig ist - alle zusammen in einem Insert.
+
+Ergebnisse werden im inhaltsadressierten BlobStore abgelegt. Wurde dasselbe
+Bild schon einmal mit denselben Parametern konvertiert (gleicher
+conversion_key), ist der Job sofort fertig und verwendet das vorhandene SVG -
+vtracer läuft dann gar nicht erst.
+
+Die Worker-Prozesse werden per "spawn" gestartet und laden nur vectorize.py
+(keine Datenbankverbindungen aus dem Hauptprozess). Das Abschließen eines
+Jobs (Dateien ablegen, ConvertedFile anlegen) läuft in einem eigenen Thread
+mit eigener Session.
+
+Mit mehreren gunicorn-Workern gehört ein Job dem Prozess, der die Eingabedatei
+gesperrt hat (flock, endet automatisch mit dem Prozess). Jeder Worker nimmt
+beim Start die offenen Jobs wieder auf, die niemand sperrt (resume) - nach
+einem Neustart des Servers ebenso wie nach dem Neustart eines einzelnen
+Workers, ohne Jobs zu übernehmen, die noch in einem anderen Worker laufen.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+import zipfile
+try:
+    import fcntl
+except ImportError:  # Windows (nur lokale Entwicklung mit einem Prozess)
+    fcntl = None
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import ConversionJob, ConvertedFile, FileBlob
+from blob_store import BlobStore, StagedFile
+from vectorize import svgz_path, trace_image
+
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", os.cpu_count() or 1))
+# Maximal gleichzeitig wartende/laufende Jobs - darüber wird der Upload abgelehnt
+CONVERSION_QUEUE_LIMIT = int(os.getenv("CONVERSION_QUEUE_LIMIT", "50"))
+# Maximale Anzahl Bilder pro Stapel-Konvertierung - Bilder ohne vorhandenes
+# Ergebnis zählen zusätzlich gegen CONVERSION_QUEUE_LIMIT
+BATCH_MAX_FILES = int(os.getenv("CONVERSION_BATCH_MAX_FILES", "500"))
+# Abgeschlossene Jobs (und nicht gespeicherte Ergebnisse) werden danach entfernt
+JOB_RETENTION = timedelta(days=1)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+MAX_IMAGE_BYTES = 50 * 1024 * 1024  # Schutz vor ZIP-Bomben
+
+
+def images_from_zip(fileobj, blob_store: BlobStore) -> list:
+    """Bilder aus einem ZIP-Archiv ins Staging entpacken - gibt [(Dateiname, StagedFile)] zurück"""
+    images = []
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            name = Path(info.filename).name
+            if info.is_dir() or info.filename.startswith("__MACOSX/") or name.startswith("."):
+                continue
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if info.file_size > MAX_IMAGE_BYTES:
+                raise ValueError(f"{name} ist zu groß")
+            try:
+                # Größe wird beim Entpacken erneut geprüft (Angabe im Archiv kann falsch sein)
+                with archive.open(info) as member:
+                    images.append((name, blob_store.stage_stream(member, name, MAX_IMAGE_BYTES)))
+            except BaseException:
+                blob_store.discard(staged for _, staged in images)
+                raise
+    return images
+
+
+def conversion_key(image_sha256: str, options: dict) -> str:
+    """SHA-256 über Bild-Hash und Konvertierungs-Parameter"""
+    params = json.dumps(options, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{image_sha256}:{params}".encode()).hexdigest()
+
+
+def write_svg_zip(entries, fileobj):
+    """Schreibt [(Originaldateiname, SVG-Pfad)] als ZIP - doppelte Namen werden nummeriert"""
+    used = set()
+    with zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED) as archive:
+        for original_filename, svg_path in entries:
+            stem = Path(original_filename).stem or "bild"
+            name, counter = f"{stem}.svg", 1
+            while name in used:
+                counter += 1
+                name = f"{stem}_{counter}.svg"
+            used.add(name)
+            archive.write(svg_path, name)
+
+
+class ConversionQueueFull(RuntimeError):
+    """Zu viele Konvertierungen in der Warteschlange"""
+
+
+class ConversionQueue:
+    """Prozess-Pool für vtracer plus Verwaltung der ConversionJob-Einträge"""
+
+    def __init__(self, blob_store: BlobStore, workers: int = CONVERSION_WORKERS):
+        # Ein- und Ausgabedateien liegen im Staging-Verzeichnis des BlobStore,
+        # damit sie beim Ablegen nur umbenannt werden
+        self.upload_dir = blob_store.staging_dir
+        self.blob_store = blob_store
+        self.workers = workers
+        self._pool = None
+        self._finisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversion-finish")
+        self._futures = {}  # job_id -> Future der laufenden/wartenden Konvertierung
+        self._claims = {}   # job_id -> gesperrte Eingabedatei
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Pool erst beim ersten Job starten (nicht schon beim Import)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def input_path(self, job_id: str) -> Path:
+        return self.upload_dir / f"{job_id}_input.png"
+
+    def output_path(self, job_id: str) -> Path:
+        return self.upload_dir / f"{job_id}_output.svg"
+
+    def svgz_output_path(self, job_id: str) -> Path:
+        return Path(svgz_path(str(self.output_path(job_id))))
+
+    def _check_capacity(self, count: int = 1):
+        """ConversionQueueFull, wenn count weitere Jobs nicht mehr in die Warteschlange passen"""
+        with self._lock:
+            if len(self._futures) + count > CONVERSION_QUEUE_LIMIT:
+                raise ConversionQueueFull("Zu viele Konvertierungen in der Warteschlange - bitte später erneut versuchen.")
+
+    @staticmethod
+    def cached_result(db: Session, key: str):
+        """Vorhandene Konvertierung mit gleichem conversion_key (oder None)"""
+        return db.query(ConvertedFile).filter(
+            ConvertedFile.conversion_key == key,
+            ConvertedFile.svg_sha256.isnot(None)
+        ).first()
+
+    @staticmethod
+    def cached_keys(db: Session, keys) -> set:
+        """Die conversion_keys, für die es schon ein Ergebnis gibt (eine Abfrage)"""
+        keys = set(keys)
+        if not keys:
+            return set()
+        return {
+            key for (key,) in db.query(ConvertedFile.conversion_key).filter(
+                ConvertedFile.conversion_key.in_(keys),
+                ConvertedFile.svg_sha256.isnot(None)
+            ).distinct()
+        }
+
+    def _new_job(self, db: Session, filename: str, staged: StagedFile, options: dict, save_file: bool,
+                 description: str, tags: str, batch_id: str = None) -> ConversionJob:
+        job = ConversionJob(
+            id=str(uuid.uuid4()),
+            batch_id=batch_id,
+            status="queued",
+            original_filename=filename,
+            options=options,
+            save_file=1 if save_file else 0,
+            description=description if description else None,
+            tags=tags if tags else None,
+            png_sha256=staged.sha256,
+            conversion_key=conversion_key(staged.sha256, options),
+            original_size_bytes=staged.size_bytes,
+        )
+        cached = self.cached_result(db, job.conversion_key)
+        if cached is not None:
+            # Schon einmal konvertiert - vorhandenes SVG verwenden
+            job.status = "done"
+            job.svg_sha256 = cached.svg_sha256
+            job.svg_size_bytes = cached.svg_size_bytes
+            job.svg_raw_size_bytes = cached.svg_raw_size_bytes
+            job.finished_at = datetime.utcnow()
+            staged.path.unlink(missing_ok=True)
+            return job
+        staged.path.replace(self.input_path(job.id))
+        return job
+
+    def submit(self, db: Session, filename: str, staged: StagedFile, options: dict,
+               save_file: bool, description: str = "", tags: str = "") -> ConversionJob:
+        """Legt einen Job an und übergibt ihn dem Pool (außer das Ergebnis ist schon bekannt)
+
+        Die Staging-Datei gehört danach dem Job - außer bei ConversionQueueFull.
+        """
+        self._check_capacity()
+        job = self._new_job(db, filename, staged, options, save_file, description, tags)
+        db.add(job)
+        if job.status == "done" and job.save_file:
+            job.converted_file = self._store(db, job)
+        db.commit()
+        if job.status == "queued":
+            self._start(job.id, options)
+        return job
+
+    def submit_batch(self, db: Session, files: list, options: dict,
+                     save_file: bool, description: str = "", tags: str = "") -> str:
+        """Legt für [(Dateiname, StagedFile)] je einen Job an - gibt die batch_id zurück"""
+        if not files:
+            raise ValueError("Keine Bilder gefunden.")
+        if len(files) > BATCH_MAX_FILES:
+            raise ValueError(f"Maximal {BATCH_MAX_FILES} Bilder pro Stapel.")
+        # Nur Bilder ohne vorhandenes Ergebnis belegen Plätze in der Warteschlange
+        keys = [conversion_key(staged.sha256, options) for _, staged in files]
+        cached = self.cached_keys(db, keys)
+        to_convert = sum(1 for key in keys if key not in cached)
+        if to_convert > CONVERSION_QUEUE_LIMIT:
+            raise ValueError(
+                f"{to_convert} neue Bilder im Stapel - höchstens {CONVERSION_QUEUE_LIMIT} "
+                f"können gleichzeitig konvertiert werden. Bitte den Stapel aufteilen."
+            )
+        self._check_capacity(to_convert)
+
+        batch_id = str(uuid.uuid4())
+        jobs = [
+            self._new_job(db, filename, staged, options, save_file, description, tags, batch_id)
+            for filename, staged in files
+        ]
+        db.add_all(jobs)
+        db.commit()
+        queued = [job for job in jobs if job.status == "queued"]
+        for job in queued:
+            self._start(job.id, options)
+        if not queued:
+            self._complete_batch(db, batch_id)
+        return batch_id
+
+    def _claim(self, job_id: str) -> bool:
+        """Sperrt die Eingabedatei für diesen Prozess - False, wenn ein anderer Prozess den Job hat"""
+        try:
+            handle = open(self.input_path(job_id), "rb")
+        except FileNotFoundError:
+            return False
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                return False
+        self._claims[job_id] = handle
+        return True
+
+    def _start(self, job_id: str, options: dict) -> bool:
+        """Übergibt den Job dem Pool - False, wenn ihn schon ein anderer Prozess bearbeitet"""
+        with self._lock:
+            if not self._claim(job_id):
+                return False
+            future = self._get_pool().submit(
+                trace_image, str(self.input_path(job_id)), str(self.output_path(job_id)), options
+            )
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finisher.submit(self._finish, job_id, f))
+        return True
+
+    def is_running(self, job_id: str) -> bool:
+        future = self._futures.get(job_id)
+        return future is not None and future.running()
+
+    def status(self, job: ConversionJob) -> str:
+        """'queued', 'running', 'done' oder 'failed'"""
+        if job.status == "queued" and self.is_running(job.id):
+            return "running"
+        return job.status
+
+    def _finish(self, job_id: str, future):
+        """Ergebnis eines Worker-Prozesses übernehmen (läuft im Finisher-Thread)"""
+        db = SessionLocal()
+        try:
+            job = db.query(ConversionJob).filter(ConversionJob.id == job_id).first()
+            if job is None or job.status != "queued":
+                return  # gelöscht oder schon von einem anderen Prozess abgeschlossen
+            try:
+                job.svg_raw_size_bytes, job.svg_size_bytes = future.result()
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                self.output_path(job_id).unlink(missing_ok=True)
+                self.svgz_output_path(job_id).unlink(missing_ok=True)
+            else:
+                job.status = "done"
+                if job.save_file and not job.batch_id:
+                    job.converted_file = self._store(db, job)
+            # Bei Stapeln wird die PNG erst mit dem ganzen Stapel abgelegt
+            if not (job.batch_id and job.save_file and job.status == "done"):
+                self.input_path(job_id).unlink(missing_ok=True)
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            if job.batch_id:
+                self._complete_batch(db, job.batch_id)
+        except Exception as e:
+            print(f"Fehler beim Abschließen der Konvertierung {job_id}: {e}")
+        finally:
+            db.close()
+            with self._lock:
+                self._futures.pop(job_id, None)
+                claim = self._claims.pop(job_id, None)
+            if claim is not None:
+                claim.close()
+
+    def _complete_batch(self, db: Session, batch_id: str):
+        """Legt die ConvertedFile-Einträge eines fertigen Stapels in einem Insert an"""
+        # Jobs eines Stapels können in verschiedenen Prozessen fertig werden (nach resume)
+        jobs = db.query(ConversionJob).filter(ConversionJob.batch_id == batch_id).with_for_update().all()
+        if any(job.status == "queued" for job in jobs):
+            return
+        files = []
+        for job in jobs:
+            if job.status == "done" and job.save_file and job.converted_file_id is None:
+                converted_file = self._store(db, job)
+                if converted_file is not None:
+                    job.converted_file = converted_file
+                    files.append(converted_file)
+        if files:
+            db.add_all(files)
+            db.commit()
+
+    def batch_jobs(self, db: Session, batch_id: str) -> list:
+        return db.query(ConversionJob).filter(
+            ConversionJob.batch_id == batch_id
+        ).order_by(ConversionJob.created_at, ConversionJob.original_filename).all()
+
+    def batch_progress(self, jobs: list) -> dict:
+        """Fortschritt eines Stapels (Anzahl je Status)"""
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for job in jobs:
+            counts[self.status(job)] += 1
+        stored = all(job.converted_file_id or not job.save_file or job.status != "done" for job in jobs)
+        return dict(counts, total=len(jobs), finished=counts["queued"] + counts["running"] == 0 and stored)
+
+    def _store(self, db: Session, job: ConversionJob):
+        """Legt PNG und SVG im BlobStore ab, gibt den neuen ConvertedFile zurück
+
+        Bei Ergebnissen aus dem Cache werden nur die Zähler der vorhandenen
+        Blobs erhöht. Ist die Vorlage inzwischen gelöscht, schlägt der Job fehl (None).
+        """
+        if job.svg_sha256:
+            source = self.cached_result(db, job.conversion_key)
+            if source is None:
+                job.status = "failed"
+                job.error = "Gespeichertes Ergebnis wurde inzwischen gelöscht - bitte erneut konvertieren."
+                return None
+            png_blob = db.query(FileBlob).filter(FileBlob.sha256 == source.png_sha256).first()
+            svg_blob = db.query(FileBlob).filter(FileBlob.sha256 == source.svg_sha256).first()
+            self.blob_store.add_ref(db, png_blob)
+            self.blob_store.add_ref(db, svg_blob)
+            svgz_blob = db.query(FileBlob).filter(FileBlob.sha256 == source.svgz_sha256).first()
+            if svgz_blob is not None:
+                self.blob_store.add_ref(db, svgz_blob)
+        else:
+            png_blob = self.blob_store.add_file(db, self.input_path(job.id), ".png", job.png_sha256)
+            svg_blob = self.blob_store.add_file(db, self.output_path(job.id), ".svg")
+            svgz_blob = None
+            if self.svgz_output_path(job.id).exists():
+                svgz_blob = self.blob_store.add_file(db, self.svgz_output_path(job.id), ".svgz")
+
+        return ConvertedFile(
+            original_filename=job.original_filename,
+            stored_filename=job.id,
+            file_path_png=png_blob.path,
+            file_path_svg=svg_blob.path,
+            original_size_bytes=job.original_size_bytes,
+            svg_size_bytes=job.svg_size_bytes,
+            svg_raw_size_bytes=job.svg_raw_size_bytes,
+            conversion_mode=job.options["mode"],
+            color_mode=job.options["color_mode"],
+            description=job.description,
+            tags=job.tags,
+            png_sha256=png_blob.sha256,
+            svg_sha256=svg_blob.sha256,
+            file_path_svgz=svgz_blob.path if svgz_blob else None,
+            svgz_sha256=svgz_blob.sha256 if svgz_blob else None,
+            conversion_key=job.conversion_key
+        )
+
+    def svg_path(self, job: ConversionJob) -> Path:
+        """Pfad der fertigen SVG (Bibliothek, Cache oder temporäres Ergebnis)"""
+        if job.converted_file:
+            return self.blob_store.storage_path / job.converted_file.file_path_svg
+        if job.svg_sha256:
+            return self.blob_store.storage_path / BlobStore.relative_path(job.svg_sha256, ".svg")
+        return self.output_path(job.id)
+
+    def resume(self, db: Session) -> int:
+        """Beim Start eines Workers: offene Jobs übernehmen, die kein anderer Prozess bearbeitet
+
+        Gibt die Anzahl neu eingereihter Jobs zurück.
+        """
+        resumed = 0
+        for job in db.query(ConversionJob).filter(ConversionJob.status == "queued"):
+            if job.id in self._futures:
+                continue
+            if not self.input_path(job.id).exists():
+                job.status = "failed"
+                job.error = "Upload nach Neustart nicht mehr vorhanden"
+                job.finished_at = datetime.utcnow()
+            elif self._start(job.id, job.options):
+                resumed += 1
+        db.commit()
+        return resumed
+
+    def cleanup(self, db: Session):
+        """Einmal beim Serverstart: liegengebliebene Stapel ablegen, alte Jobs entfernen"""
+        # Stapel, deren letzter Job vor dem Neustart fertig wurde, noch ablegen
+        unstored = db.query(ConversionJob.batch_id).filter(
+            ConversionJob.batch_id.isnot(None),
+            ConversionJob.status == "done",
+            ConversionJob.save_file == 1,
+            ConversionJob.converted_file_id.is_(None)
+        ).distinct().all()
+        for (batch_id,) in unstored:
+            self._complete_batch(db, batch_id)
+
+        expired = db.query(ConversionJob).filter(
+            ConversionJob.status != "queued",
+            ConversionJob.finished_at < datetime.utcnow() - JOB_RETENTION
+        ).all()
+        for job in expired:
+            self.output_path(job.id).unlink(missing_ok=True)
+            self.svgz_output_path(job.id).unlink(missing_ok=True)
+            db.delete(job)
+        db.commit()
+        self.blob_store.cleanup_staging(JOB_RETENTION.total_seconds())
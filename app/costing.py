@@ -0,0 +1,232 @@
+"""Sammel-Kalkulation für viele Produkte auf einmal
+
+Product.calculate_costs() lädt Material, Maschine und Komponenten per Lazy
+Loading einzeln nach - bei Listen mit vielen Produkten sind das mehrere
+Abfragen pro Produkt. Hier werden die Eingangsdaten für alle Produkte in
+wenigen mengenbasierten Abfragen geladen und den Produkten vorab zugewiesen.
+Die eigentliche Berechnung bleibt in Product.calculate_costs(), damit das
+Ergebnis exakt dem der Einzelberechnung entspricht.
+
+Die Ergebnisse werden in product_cost_snapshots gespeichert. Lesende Seiten
+verwenden get_product_costs(), neu berechnet wird nur über
+refresh_cost_snapshots() für Produkte, deren Eingangsdaten sich geändert haben.
+"""
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from models import (Product, Material, Machine, ProductComponent, ProductCostSnapshot,
+                    STROM_PREIS_KWH)
+from product_graph import load_product_graph, DependencyCycleError
+
+# Beziehungen von Product auf Material (Beziehungsname, Fremdschlüssel-Spalte)
+MATERIAL_RELATIONS = [
+    ("filament_material", "filament_material_id"),
+    ("sheet_material", "sheet_material_id"),
+    ("laser_material", "laser_material_id"),
+]
+
+
+def prefetch_cost_inputs(db: Session, products: list):
+    """Lädt Materialien, Maschinen und Komponenten für alle Produkte in je einer Abfrage
+
+    Bereits geladene Beziehungen werden nicht überschrieben.
+    """
+    if not products:
+        return
+
+    material_ids = set()
+    machine_ids = set()
+    assembly_ids = []
+    for p in products:
+        for relation, fk in MATERIAL_RELATIONS:
+            if relation not in p.__dict__ and getattr(p, fk):
+                material_ids.add(getattr(p, fk))
+        if "machine" not in p.__dict__ and p.machine_id:
+            machine_ids.add(p.machine_id)
+        if p.product_type == "assembly" and "components" not in p.__dict__:
+            assembly_ids.append(p.id)
+
+    materials = {}
+    if material_ids:
+        materials = {m.id: m for m in db.query(Material).filter(Material.id.in_(material_ids))}
+
+    machines = {}
+    if machine_ids:
+        machines = {m.id: m for m in db.query(Machine).filter(Machine.id.in_(machine_ids))}
+
+    components = {pid: [] for pid in assembly_ids}
+    if assembly_ids:
+        rows = db.query(ProductComponent).filter(
+            ProductComponent.product_id.in_(assembly_ids)
+        ).order_by(ProductComponent.product_id, ProductComponent.id)
+        for comp in rows:
+            components[comp.product_id].append(comp)
+
+    # Geladene Objekte direkt an die Beziehungen hängen (kein Lazy Loading mehr)
+    for p in products:
+        for relation, fk in MATERIAL_RELATIONS:
+            if relation not in p.__dict__:
+                set_committed_value(p, relation, materials.get(getattr(p, fk)))
+        if "machine" not in p.__dict__:
+            set_committed_value(p, "machine", machines.get(p.machine_id))
+        if p.id in components:
+            set_committed_value(p, "components", components[p.id])
+
+
+def costs_for_products(db: Session, products: list) -> dict:
+    """Kalkuliert bereits geladene Produkte - gibt {product_id: costs} zurück"""
+    prefetch_cost_inputs(db, products)
+    return {p.id: p.calculate_costs() for p in products}
+
+
+def calculate_costs_bulk(db: Session, product_ids=None) -> dict:
+    """Kalkuliert mehrere Produkte (oder alle, wenn product_ids None ist)
+
+    Gibt {product_id: costs} zurück - jeder Eintrag ist identisch mit
+    Product.calculate_costs() für das einzelne Produkt.
+    """
+    query = db.query(Product)
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        query = query.filter(Product.id.in_(product_ids))
+
+    return costs_for_products(db, query.all())
+
+
+def product_ids_using(db: Session, material_ids=(), machine_ids=()) -> list:
+    """IDs aller Produkte, deren Kosten von den angegebenen Materialien/Maschinen abhängen"""
+    conditions = []
+    material_ids = list(material_ids)
+    machine_ids = list(machine_ids)
+    if material_ids:
+        conditions += [
+            Product.filament_material_id.in_(material_ids),
+            Product.sheet_material_id.in_(material_ids),
+            Product.laser_material_id.in_(material_ids),
+        ]
+    if machine_ids:
+        conditions.append(Product.machine_id.in_(machine_ids))
+    if not conditions:
+        return []
+    return [pid for (pid,) in db.query(Product.id).filter(or_(*conditions))]
+
+
+def _store_snapshots(db: Session, costs: dict):
+    """Schreibt Kalkulationsergebnisse in product_cost_snapshots (Insert oder Update)"""
+    if not costs:
+        return
+    existing = {
+        s.product_id: s
+        for s in db.query(ProductCostSnapshot).filter(ProductCostSnapshot.product_id.in_(list(costs)))
+    }
+    for pid, calc in costs.items():
+        snapshot = existing.get(pid)
+        if snapshot is None:
+            snapshot = ProductCostSnapshot(product_id=pid)
+            db.add(snapshot)
+        snapshot.total_cost = calc['total_cost']
+        snapshot.material_cost = calc['material_cost']
+        snapshot.machine_cost = calc['machine_cost']
+        snapshot.labor_cost = calc['labor_cost']
+        snapshot.costs = calc
+        snapshot.strom_preis_kwh = STROM_PREIS_KWH
+
+
+def refresh_cost_snapshots(db: Session, product_ids) -> dict:
+    """Berechnet die Snapshots für die angegebenen Produkte neu und speichert sie
+
+    Assemblies, die eines der Produkte (auch indirekt) enthalten, werden in
+    derselben Runde in topologischer Reihenfolge mitberechnet; die Stückkosten
+    ihrer verknüpften Komponenten werden dabei aktualisiert.
+    Gelöschte Produkte werden aus der Snapshot-Tabelle entfernt.
+    Gibt {product_id: costs} aller neu berechneten Produkte zurück.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
+
+    graph = load_product_graph(db)
+    affected = product_ids | graph.dependents_of(product_ids)
+    try:
+        order = graph.topological_order(affected)
+    except DependencyCycleError as e:
+        print(f"Warnung: {e} - betroffene Produkte werden ohne Kaskade berechnet")
+        order = graph.topological_order(affected, strict=False)
+
+    products = {p.id: p for p in db.query(Product).filter(Product.id.in_(affected))}
+    prefetch_cost_inputs(db, list(products.values()))
+
+    # Kosten verknüpfter Produkte außerhalb dieser Runde kommen aus den Snapshots
+    outside_ids = {
+        comp.linked_product_id
+        for p in products.values() if p.product_type == "assembly"
+        for comp in p.components if comp.linked_product_id
+    } - affected
+    linked_costs = get_product_costs(db, outside_ids)
+
+    costs = {}
+    for pid in order:
+        product = products.get(pid)
+        if product is None:
+            continue
+        if product.product_type == "assembly":
+            for comp in product.components:
+                linked = costs.get(comp.linked_product_id) or linked_costs.get(comp.linked_product_id)
+                if linked and float(comp.unit_cost or 0) != linked['total_cost']:
+                    comp.unit_cost = linked['total_cost']
+        costs[pid] = product.calculate_costs()
+
+    removed = affected - set(products)
+    if removed:
+        db.query(ProductCostSnapshot).filter(
+            ProductCostSnapshot.product_id.in_(removed)
+        ).delete(synchronize_session=False)
+    _store_snapshots(db, costs)
+    db.commit()
+    return costs
+
+
+def refresh_stale_snapshots(db: Session) -> int:
+    """Berechnet fehlende und veraltete Snapshots (z.B. nach Änderung von STROM_PREIS_KWH)
+
+    Gibt die Anzahl neu berechneter Produkte zurück.
+    """
+    stale_ids = [
+        pid for (pid,) in db.query(Product.id).outerjoin(
+            ProductCostSnapshot, ProductCostSnapshot.product_id == Product.id
+        ).filter(
+            (ProductCostSnapshot.product_id.is_(None)) |
+            (ProductCostSnapshot.strom_preis_kwh != STROM_PREIS_KWH)
+        )
+    ]
+    refresh_cost_snapshots(db, stale_ids)
+    return len(stale_ids)
+
+
+def get_product_costs(db: Session, product_ids) -> dict:
+    """Liest die Kalkulation aus den Snapshots - gibt {product_id: costs} zurück
+
+    Fehlende Snapshots werden beim Start über refresh_stale_snapshots()
+    angelegt; fehlt trotzdem einer, wird er hier ohne Speichern berechnet.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return {}
+
+    result = {
+        pid: costs
+        for pid, costs in db.query(ProductCostSnapshot.product_id, ProductCostSnapshot.costs).filter(
+            ProductCostSnapshot.product_id.in_(product_ids)
+        )
+    }
+    missing = product_ids - set(result)
+    if missing:
+        result.update(calculate_costs_bulk(db, missing))
+    return result
+
+
+def get_product_cost(db: Session, product_id: int):
+    """Kalkulation eines einzelnen Produkts aus dem Snapshot (None wenn nicht vorhanden)"""
+    return get_product_costs(db, [product_id]).get(product_id)
@@ -0,0 +1,63 @@
+"""Kostenstatistik für das Dashboard
+
+Durchschnitt, Minimum und Maximum der Produktkosten (gesamt, je Produkttyp
+und je Kategorie) werden mit einer GROUP-BY-Abfrage direkt aus den
+Kosten-Snapshots (product_cost_snapshots) berechnet. Die Snapshots werden
+von allen schreibenden Routen und CLIs aktuell gehalten - die Statistik ist
+damit in jedem Worker-Prozess sofort aktuell, ohne Zustand im Speicher.
+
+Produkte ohne Snapshot (nur kurz nach dem Start, bis refresh_stale_snapshots
+gelaufen ist) werden nicht mitgezählt.
+"""
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import Product, ProductCostSnapshot
+
+
+class CostGroup:
+    """Kennzahlen (Anzahl, Summe, Min, Max) für eine Produktgruppe"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, count: int, total: float, minimum: float, maximum: float):
+        """Fügt die Kennzahlen einer Teilgruppe hinzu"""
+        self.count += count
+        self.total += total
+        self.min = minimum if self.min is None else min(self.min, minimum)
+        self.max = maximum if self.max is None else max(self.max, maximum)
+
+    def to_dict(self) -> dict:
+        avg = self.total / self.count if self.count else 0
+        return {
+            'count': self.count,
+            'avg_cost': round(avg, 2),
+            'min_cost': round(self.min or 0, 2),
+            'max_cost': round(self.max or 0, 2),
+        }
+
+
+def cost_summary(db: Session) -> dict:
+    """Aktuelle Kennzahlen (gesamt, je Typ, je Kategorie) - eine Abfrage"""
+    cost = ProductCostSnapshot.total_cost
+    rows = db.query(
+        Product.product_type, Product.category,
+        func.count(), func.sum(cost), func.min(cost), func.max(cost),
+    ).join(ProductCostSnapshot, ProductCostSnapshot.product_id == Product.id).group_by(
+        Product.product_type, Product.category
+    )
+
+    overall, by_type, by_category = CostGroup(), {}, {}
+    for product_type, category, count, total, minimum, maximum in rows:
+        values = (count, float(total or 0), float(minimum or 0), float(maximum or 0))
+        overall.add(*values)
+        by_type.setdefault(product_type, CostGroup()).add(*values)
+        by_category.setdefault(category or "Sonstiges", CostGroup()).add(*values)
+    return {
+        **overall.to_dict(),
+        'by_type': {k: g.to_dict() for k, g in sorted(by_type.items(), key=lambda item: str(item[0]))},
+        'by_category': {k: g.to_dict() for k, g in sorted(by_category.items())},
+    }
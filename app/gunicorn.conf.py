@@ -0,0 +1,61 @@
+"""gunicorn-Konfiguration für den Produktivbetrieb
+
+Startet WEB_CONCURRENCY uvicorn-Worker (Standard: Anzahl CPU-Kerne):
+    gunicorn -c gunicorn.conf.py main:app
+
+Jeder Worker hat seinen eigenen Connection-Pool (siehe database.py) und
+seinen eigenen Konvertierungs-Pool - CONVERSION_WORKERS wird deshalb auf die
+Worker aufgeteilt, wenn es nicht gesetzt ist.
+
+Einmalige Arbeit (Tabellen anlegen, Seeds, Kosten-Snapshots, alte
+Konvertierungen aufräumen) erledigt der Master vor dem Start der Worker - beim
+Start und bei jedem Reload (HUP). Kein Worker bedient Anfragen, bevor sie
+fertig ist. Offene Konvertierungen übernimmt jeder neue Worker selbst (auch
+nach dem Neustart eines einzelnen Workers), siehe conversion_jobs.py.
+
+Zustand im Speicher gilt pro Worker und wird nur im Worker invalidiert, der
+die Änderung ausgeführt hat (bzw. gar nicht bei den CLIs). Alles davon läuft
+deshalb ab: Such-Cache und SQLite-Suchindex nach SEARCH_CACHE_TTL, der
+Bildindex nach IMAGE_INDEX_MAX_AGE Sekunden. Die Dashboard-Statistik kommt
+direkt aus der Datenbank.
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", cpu_count))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+# vtracer-Prozesse auf die Worker aufteilen (sonst workers * cpu_count Prozesse)
+os.environ.setdefault("CONVERSION_WORKERS", str(max(1, cpu_count // workers)))
+
+
+def prepare_database(server):
+    # In einem eigenen Prozess: der Master importiert die App nicht (Reload lädt neuen Code)
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "main.py", "--prepare"], cwd=app_dir)
+    if result.returncode != 0:
+        server.log.error("Vorbereiten der Datenbank fehlgeschlagen (Exit-Code %s)", result.returncode)
+    return result.returncode == 0
+
+
+def when_ready(server):
+    if not prepare_database(server):
+        sys.exit(1)
+
+
+def on_reload(server):
+    prepare_database(server)
+
+
+def post_fork(server, worker):
+    # Einmalige Arbeit hat der Master schon erledigt (when_ready/on_reload)
+    os.environ["RUN_STARTUP_TASKS"] = "false"
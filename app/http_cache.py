@@ -0,0 +1,129 @@
+"""HTTP-Caching für gespeicherte Dateien
+
+Gespeicherte Dateien ändern sich nie (Blobs sind nach ihrem Hash benannt,
+ältere Dateien nach einer UUID, Varianten nach Hash und Breite). Browser
+dürfen sie daher unbegrenzt cachen (Cache-Control: immutable) und fragen
+höchstens per If-None-Match / If-Modified-Since nach - darauf antworten wir
+mit 304 ohne Inhalt.
+
+Das ETag ist bei Blobs der SHA-256 des Inhalts, sonst ein Hash aus Pfad,
+Größe und Änderungszeit. Für große Downloads (SVG) werden einfache
+Range-Anfragen (bytes=a-b) mit 206 beantwortet.
+"""
+import hashlib
+import os
+import re
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from blob_store import BlobStore
+
+CACHE_CONTROL_IMMUTABLE = "public, max-age=31536000, immutable"
+RANGE_CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(relative_path: str, stat_result: os.stat_result) -> str:
+    """Starkes ETag (in Anführungszeichen)"""
+    sha256 = BlobStore.sha256_of(relative_path)
+    if sha256 is None:
+        sha256 = hashlib.sha256(
+            f"{relative_path}:{stat_result.st_size}:{stat_result.st_mtime_ns}".encode()
+        ).hexdigest()
+    return f'"{sha256}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match vergleicht schwach - W/ wird ignoriert
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _not_modified(request: Request, etag: str, stat_result: os.stat_result) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat_result.st_mtime) <= since
+    return False
+
+
+def _parse_range(header: str, size: int):
+    """(start, end) für eine einzelne Range - None bei ungültigen oder mehreren Ranges
+
+    Wirft ValueError, wenn die Range außerhalb der Datei liegt (416).
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # bytes=-500: die letzten 500 Bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Leere Range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range außerhalb der Datei")
+    return start, end
+
+
+def _read_range(path: Path, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def stored_file_response(request: Request, storage_path: Path, relative_path: str, media_type: str,
+                         filename: str = None, headers: dict = None) -> Response:
+    """FileResponse mit ETag, Cache-Control, 304 und Range-Unterstützung"""
+    path = storage_path / relative_path
+    stat_result = path.stat()
+    etag = file_etag(relative_path, stat_result)
+    response = FileResponse(path, media_type=media_type, filename=filename,
+                            stat_result=stat_result, headers=headers)
+    response.headers["etag"] = etag
+    response.headers["cache-control"] = CACHE_CONTROL_IMMUTABLE
+    response.headers["accept-ranges"] = "bytes"
+
+    if _not_modified(request, etag, stat_result):
+        cache_headers = {
+            key: value for key, value in response.headers.items()
+            if key in ("etag", "cache-control", "last-modified", "vary")
+        }
+        return Response(status_code=304, headers=cache_headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        size = stat_result.st_size
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            partial_headers = {
+                key: value for key, value in response.headers.items()
+                if key not in ("content-length", "content-type")
+            }
+            partial_headers["content-range"] = f"bytes {start}-{end}/{size}"
+            partial_headers["content-length"] = str(end - start + 1)
+            return StreamingResponse(_read_range(path, start, end), status_code=206,
+                                     media_type=media_type, headers=partial_headers)
+    return response
@@ -0,0 +1,87 @@
+"""Speicherpfade der Produktbilder im Speicher
+
+/product-images/{id} wird für jedes Vorschaubild einer Liste aufgerufen und
+braucht aus der Datenbank nur file_path und mime_type. Der Index lädt beide
+Spalten aller Bilder einmalig und wird von den Upload-, Verknüpfungs- und
+Lösch-Routen aktuell gehalten - Bildanfragen kommen danach ohne Datenbank aus.
+
+Fehlt eine ID (z.B. von einem anderen Worker-Prozess angelegt), wird sie
+einzeln nachgeladen. In anderen Prozessen gelöschte Bilder fallen auf, wenn
+die Datei fehlt (siehe get_product_image), spätestens aber nach
+IMAGE_INDEX_MAX_AGE Sekunden - dann wird der Index komplett neu geladen.
+"""
+import os
+import threading
+import time
+from typing import NamedTuple
+from database import SessionLocal
+from models import ProductImage
+
+IMAGE_INDEX_MAX_AGE = float(os.getenv("IMAGE_INDEX_MAX_AGE", "300"))
+
+
+class IndexedImage(NamedTuple):
+    file_path: str
+    mime_type: str
+
+
+class ImagePathIndex:
+    """image_id -> (file_path, mime_type)"""
+
+    def __init__(self):
+        self._entries = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry(file_path: str, mime_type: str) -> IndexedImage:
+        return IndexedImage(file_path, mime_type or "image/png")
+
+    def _load(self):
+        db = SessionLocal()
+        try:
+            rows = db.query(ProductImage.id, ProductImage.file_path, ProductImage.mime_type).all()
+        finally:
+            db.close()
+        with self._lock:
+            self._entries = {
+                image_id: self._entry(file_path, mime_type) for image_id, file_path, mime_type in rows
+            }
+            self._loaded_at = time.monotonic()
+
+    def _is_current(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < IMAGE_INDEX_MAX_AGE
+
+    def get(self, image_id: int):
+        """Eintrag zum Bild oder None, wenn es das Bild nicht gibt"""
+        if not self._is_current():
+            self._load()
+        entry = self._entries.get(image_id)
+        if entry is not None:
+            return entry
+
+        db = SessionLocal()
+        try:
+            row = db.query(ProductImage.file_path, ProductImage.mime_type).filter(
+                ProductImage.id == image_id
+            ).first()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        entry = self._entry(*row)
+        with self._lock:
+            self._entries[image_id] = entry
+        return entry
+
+    def put(self, image: ProductImage):
+        with self._lock:
+            self._entries[image.id] = self._entry(image.file_path, image.mime_type)
+
+    def forget(self, *image_ids: int):
+        with self._lock:
+            for image_id in image_ids:
+                self._entries.pop(image_id, None)
+
+
+image_index = ImagePathIndex()
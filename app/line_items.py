@@ -0,0 +1,135 @@
+"""Positionen von Verkaufsaufträgen und Rechnungen gesammelt schreiben
+
+Bisher wurde der Kopf eines Auftrags/einer Rechnung erst committet und neu
+geladen, dann jede Position einzeln hinzugefügt - bei Rechnungen zusätzlich
+mit einer Abfrage je Position für die Artikelnummer. Ein Auftrag mit 200
+Positionen (Marktplatz-Import) brauchte so Hunderte Round-Trips.
+
+Hier werden alle referenzierten Produkte und Artikel mit je einer IN-Abfrage
+geprüft bzw. geladen und sämtliche Positionen mit einem einzigen INSERT
+(executemany) geschrieben. Summen werden vorher aus den Positionen berechnet,
+alles landet in derselben Transaktion - der Aufrufer committet einmal.
+"""
+from typing import NamedTuple, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from models import Article, InvoiceItem, Product, SalesOrderItem
+
+# NULL-Werte mitschreiben, damit alle Zeilen dieselben Spalten haben und in
+# einem executemany landen (sonst teilt SQLAlchemy nach gesetzten Spalten auf)
+_BULK_OPTIONS = {"render_nulls": True}
+
+
+class UnknownReference(ValueError):
+    """Position verweist auf ein Produkt oder einen Artikel, den es nicht gibt"""
+
+
+class SalesOrderLine(NamedTuple):
+    item_type: str  # 'product' oder 'article'
+    product_id: Optional[int]
+    article_id: Optional[int]
+    quantity: int
+    unit_price: float
+    cost_per_unit: float = 0
+
+
+class InvoiceLine(NamedTuple):
+    description: str
+    quantity: float
+    unit: str
+    unit_price_net: float
+    article_id: Optional[int] = None
+
+    @property
+    def total_net(self) -> float:
+        return self.quantity * self.unit_price_net
+
+
+def _existing_ids(db: Session, model, ids) -> set:
+    ids = {i for i in ids if i}
+    if not ids:
+        return set()
+    return {row_id for (row_id,) in db.query(model.id).filter(model.id.in_(ids))}
+
+
+def _check_references(found: set, wanted, label: str):
+    missing = sorted({i for i in wanted if i} - found)
+    if missing:
+        raise UnknownReference(f"{label} nicht gefunden: {', '.join(map(str, missing))}")
+
+
+def bulk_insert(db: Session, model, rows: list, *returning) -> list:
+    """Ein INSERT (executemany) für alle Zeilen - mit returning die zurückgegebenen Spalten"""
+    if not rows:
+        return []
+    statement = insert(model).execution_options(**_BULK_OPTIONS)
+    if returning:
+        return db.execute(statement.returning(*returning), rows).all()
+    db.execute(statement, rows)
+    return []
+
+
+def sales_order_item_rows(sales_order_id: int, lines: list) -> list:
+    """Zeilen für bulk_insert(SalesOrderItem) - ohne Prüfung der Referenzen"""
+    return [
+        {
+            "sales_order_id": sales_order_id,
+            "item_type": "product" if line.item_type == "product" else "article",
+            "product_id": line.product_id if line.item_type == "product" else None,
+            "article_id": None if line.item_type == "product" else line.article_id,
+            "quantity": line.quantity,
+            "unit_price": line.unit_price,
+            "cost_per_unit": line.cost_per_unit,
+        }
+        for line in lines
+    ]
+
+
+def insert_sales_order_items(db: Session, sales_order_id: int, lines: list) -> int:
+    """Schreibt die Positionen eines Auftrags (ohne Commit), gibt die Anzahl zurück"""
+    product_ids = [line.product_id for line in lines if line.item_type == "product"]
+    article_ids = [line.article_id for line in lines if line.item_type != "product"]
+    _check_references(_existing_ids(db, Product, product_ids), product_ids, "Produkt")
+    _check_references(_existing_ids(db, Article, article_ids), article_ids, "Artikel")
+
+    rows = sales_order_item_rows(sales_order_id, lines)
+    bulk_insert(db, SalesOrderItem, rows)
+    return len(rows)
+
+
+def invoice_totals(lines: list, vat_rate: float) -> dict:
+    """total_net, vat_amount und total_gross einer Rechnung aus ihren Positionen"""
+    total_net = sum(line.total_net for line in lines)
+    vat_amount = total_net * (float(vat_rate) / 100)
+    return {"total_net": total_net, "vat_amount": vat_amount, "total_gross": total_net + vat_amount}
+
+
+def insert_invoice_items(db: Session, invoice_id: int, lines: list) -> int:
+    """Schreibt die Positionen einer Rechnung (ohne Commit), gibt die Anzahl zurück
+
+    Die Artikelnummern werden als Kopie übernommen (eine Abfrage für alle Artikel).
+    """
+    article_ids = {line.article_id for line in lines if line.article_id}
+    article_numbers = {}
+    if article_ids:
+        article_numbers = dict(
+            db.query(Article.id, Article.article_number).filter(Article.id.in_(article_ids))
+        )
+    _check_references(set(article_numbers), article_ids, "Artikel")
+
+    rows = [
+        {
+            "invoice_id": invoice_id,
+            "position": position,
+            "article_id": line.article_id,
+            "article_number": article_numbers.get(line.article_id),
+            "description": line.description,
+            "quantity": line.quantity,
+            "unit": line.unit,
+            "unit_price_net": line.unit_price_net,
+            "total_net": line.total_net,
+        }
+        for position, line in enumerate(lines, start=1)
+    ]
+    bulk_insert(db, InvoiceItem, rows)
+    return len(rows)
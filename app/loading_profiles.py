@@ -0,0 +1,48 @@
+"""Lade-Profile für Listen- und Detailansichten
+
+Jedes Profil bündelt die selectinload/joinedload-Optionen, die eine Ansicht
+braucht, damit das Template keine Beziehungen pro Zeile nachlädt (N+1).
+Die Routen wählen ihr Profil über with_profile(query, "<name>").
+"""
+from sqlalchemy.orm import Query, configure_mappers, joinedload, selectinload
+from models import Product, SalesOrder, SalesOrderItem, Invoice, Article
+
+# Backrefs (z.B. SalesOrder.items) existieren erst nach der Mapper-Konfiguration
+configure_mappers()
+
+# Material, Maschine und Komponenten - für Kalkulation und Materialzusammenfassung
+_PRODUCT_COST_INPUTS = (
+    joinedload(Product.filament_material),
+    joinedload(Product.sheet_material),
+    joinedload(Product.laser_material),
+    joinedload(Product.machine),
+    selectinload(Product.components),
+)
+
+LOADING_PROFILES = {
+    # Produkte
+    "products.summary": _PRODUCT_COST_INPUTS,
+    "products.list": _PRODUCT_COST_INPUTS + (selectinload(Product.images),),
+    "products.detail": _PRODUCT_COST_INPUTS,
+    # Verkaufsaufträge: Positionen für Anzahl/Summen, Produkt/Artikel für Namen und Links
+    "sales_orders.list": (selectinload(SalesOrder.items),),
+    "sales_orders.detail": (
+        selectinload(SalesOrder.items).joinedload(SalesOrderItem.product),
+        selectinload(SalesOrder.items).joinedload(SalesOrderItem.article),
+    ),
+    # Rechnungen: Liste zeigt nur Spalten der Rechnung selbst
+    "invoices.list": (),
+    "invoices.detail": (
+        selectinload(Invoice.items),
+        joinedload(Invoice.sales_order),
+        joinedload(Invoice.customer),
+    ),
+    # Artikel
+    "articles.list": (joinedload(Article.category),),
+    "articles.detail": (joinedload(Article.category), joinedload(Article.linked_product)),
+}
+
+
+def with_profile(query: Query, profile: str) -> Query:
+    """Wendet ein benanntes Lade-Profil auf eine Abfrage an"""
+    return query.options(*LOADING_PROFILES[profile])
@@ -1,19 +1,50 @@
 from fastapi import FastAPI, Request, Depends, Form, HTTPException, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError
-from database import engine, get_db, SessionLocal
+from sqlalchemy import inspect
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+from database import engine, get_db, SessionLocal, pool_metrics
 from models import (Base, Product, Material, MaterialType, Machine, Feedback, Idea, 
                      ConvertedFile, ProductImage, ProductComponent, SalesOrder, SalesOrderItem, 
-                     Article, ArticleCategory, Invoice, InvoiceItem, Customer, STROM_PREIS_KWH)
+                     Article, ArticleCategory, Invoice, InvoiceItem, Customer, ProductCostSnapshot,
+                     ConversionJob, FileBlob, STROM_PREIS_KWH)
+from costing import (product_ids_using, get_product_costs, get_product_cost,
+                     refresh_cost_snapshots, refresh_stale_snapshots)
+from dashboard_stats import cost_summary
+from product_graph import load_product_graph
+from loading_profiles import with_profile
+from pagination import paginate, row_dict, DEFAULT_PAGE_SIZE
+from search import create_trigram_indexes, search, search_changed
+from search_cache import normalize_query, search_cache
+from line_items import (InvoiceLine, SalesOrderLine, UnknownReference, insert_invoice_items,
+                        insert_sales_order_items, invoice_totals)
+from numbering import (claim_invoice_number, next_article_number, next_customer_number,
+                       next_invoice_number, preview_customer_number, preview_invoice_number)
+from order_import import import_orders
+from row_files import RowFileError, read_rows
+from catalog_io import CATALOGS, EXPORT_FORMATS, catalog_changed, import_catalog
+from accounting_export import EXPORTS as ACCOUNTING_EXPORTS, EXPORT_FORMATS as ACCOUNTING_FORMATS, export_period
+from blob_store import BlobStore
+from http_cache import stored_file_response
+from image_index import image_index
+from svg_optimize import DEFAULT_PRECISION
+from thumbnails import Thumbnailer, variant_format, variant_width
+from conversion_jobs import ConversionQueue, ConversionQueueFull, images_from_zip, write_svg_zip
 from datetime import datetime
+from typing import List
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import tempfile
 import time
+import zipfile
 import os
 import uuid
-import vtracer
 from pathlib import Path
+from urllib.parse import urlencode
 
 
 def parse_decimal(value: str) -> float:
@@ -29,6 +60,15 @@ def minutes_to_hours(minutes: float) -> float:
     return minutes / 60.0
 
 
+def products_cost_changed(db: Session, product_ids):
+    """Aktualisiert abgeleitete Kostendaten nach Änderungen an Produkten, Materialien oder Maschinen"""
+    product_ids = set(product_ids)
+    # Snapshots neu berechnen (inkl. aller Assemblies, die diese Produkte enthalten)
+    refresh_cost_snapshots(db, product_ids)
+    # Produktsuche liefert Einkaufspreise mit
+    search_cache.invalidate("products")
+
+
 def seed_material_types(db: Session):
     """Initialisiert Standard-Materialtypen falls noch keine existieren"""
     existing = db.query(MaterialType).first()
@@ -48,33 +88,115 @@ def seed_material_types(db: Session):
         mt = MaterialType(key=key, name=name, description=desc, sort_order=sort_order)
         db.add(mt)
     
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # Gleichzeitig von einem anderen Prozess angelegt
+        return
     print("Standard-Materialtypen wurden initialisiert.")
 
 
-# Wait for database and create tables
-max_retries = 30
-retry_delay = 2
-
-for i in range(max_retries):
-    try:
-        Base.metadata.create_all(bind=engine)
-        print("Database connected and tables created successfully!")
-        # Initialisiere Standard-Materialtypen
-        db = SessionLocal()
+def wait_for_database(max_retries: int = 30, retry_delay: int = 2):
+    """Wartet, bis die Datenbank erreichbar ist (z.B. beim gemeinsamen Start mit docker compose)"""
+    for i in range(max_retries):
         try:
-            seed_material_types(db)
-        finally:
-            db.close()
-        break
-    except OperationalError as e:
-        print(f"Database not ready yet (attempt {i+1}/{max_retries}). Retrying in {retry_delay} seconds...")
-        time.sleep(retry_delay)
-else:
+            with engine.connect():
+                return
+        except OperationalError:
+            print(f"Database not ready yet (attempt {i+1}/{max_retries}). Retrying in {retry_delay} seconds...")
+            time.sleep(retry_delay)
     print("Could not connect to database after maximum retries!")
     raise Exception("Database connection failed")
 
-app = FastAPI(title="Picobellu Kalkulator")
+
+def bootstrap_schema():
+    """Legt in einer leeren Datenbank alle Tabellen an und markiert sie als aktuell
+
+    Das Schema bestehender Datenbanken ändert nur Alembic (alembic upgrade head,
+    siehe deploy.sh) - create_all würde dort neue Tabellen vor ihrer Migration
+    anlegen, die dann fehlschlägt. Die Migrationen selbst können keine leere
+    Datenbank aufbauen, daher hier create_all + Stempel auf den aktuellen Stand.
+    Was nur in Migrationen steht (pg_trgm und die Trigramm-Indizes), wird hier
+    zusätzlich angelegt.
+    """
+    if inspect(engine).get_table_names():
+        return
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    # Im Repository liegt alembic/ neben app/, im Container (Dockerfile) unter /app
+    app_dir = Path(__file__).resolve().parent
+    alembic_ini = next(
+        (path for path in (app_dir.parent / "alembic.ini", app_dir / "alembic.ini") if path.exists()),
+        None,
+    )
+    Base.metadata.create_all(bind=engine)
+    if engine.dialect.name == "postgresql":
+        try:
+            with engine.begin() as connection:
+                create_trigram_indexes(connection)
+        except DBAPIError as exc:
+            # z.B. fehlende Rechte für CREATE EXTENSION - die Suche kommt ohne similarity() aus
+            print(f"Trigramm-Indizes nicht angelegt: {exc.orig}")
+    if alembic_ini is None:
+        print("Tabellen angelegt (alembic.ini nicht gefunden - Revision nicht gestempelt).")
+        return
+    config = Config(str(alembic_ini))
+    config.set_main_option("script_location", str(alembic_ini.parent / "alembic"))
+    script = ScriptDirectory.from_config(config)
+    with engine.begin() as connection:
+        MigrationContext.configure(connection).stamp(script, "head")
+    print(f"Tabellen angelegt, Alembic-Revision {script.get_current_head()} gestempelt.")
+
+
+def prepare_database():
+    """Einmalige Arbeit an der Datenbank: Schema, Seeds, Snapshots, alte Konvertierungen
+
+    Unter gunicorn im Master vor dem Start der Worker (gunicorn.conf.py,
+    python main.py --prepare), sonst beim Start der App.
+    """
+    bootstrap_schema()
+    db = SessionLocal()
+    try:
+        seed_material_types(db)
+        seed_article_categories(db)
+        refreshed = refresh_stale_snapshots(db)
+        if refreshed:
+            print(f"{refreshed} Kosten-Snapshots neu berechnet.")
+        conversion_queue.cleanup(db)
+    finally:
+        db.close()
+
+
+def run_startup_tasks():
+    """Arbeit beim Start eines Worker-Prozesses (nicht beim Import)
+
+    Offene Konvertierungen übernimmt jeder Worker - nur die, die kein anderer
+    Worker bearbeitet (siehe conversion_jobs.py).
+    """
+    wait_for_database()
+    blob_store.prepare()
+    if os.getenv("RUN_STARTUP_TASKS", "true").lower() == "true":
+        prepare_database()
+    db = SessionLocal()
+    try:
+        resumed = conversion_queue.resume(db)
+        if resumed:
+            print(f"{resumed} offene Konvertierungen neu gestartet.")
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    await run_in_threadpool(run_startup_tasks)
+    print(f"Startup abgeschlossen in {time.perf_counter() - started:.2f}s")
+    yield
+
+
+app = FastAPI(title="Picobellu Kalkulator", lifespan=lifespan)
 
 # Templates
 templates = Jinja2Templates(directory="templates")
@@ -114,52 +236,62 @@ STICKER_CATEGORIES = [
 ]
 
 @app.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request, db: Session = Depends(get_db)):
+def dashboard(request: Request, db: Session = Depends(get_db)):
     """Dashboard mit Übersicht"""
-    products = db.query(Product).order_by(Product.updated_at.desc()).limit(5).all()
+    products = with_profile(db.query(Product), "products.summary").order_by(Product.updated_at.desc()).limit(5).all()
+    product_costs = get_product_costs(db, [p.id for p in products])
     total_products = db.query(Product).count()
     total_materials = db.query(Material).count()
     total_machines = db.query(Machine).count()
     
-    # Berechne Durchschnittskosten
-    all_products = db.query(Product).all()
-    avg_cost = 0
-    if all_products:
-        total = sum([p.calculate_costs()['total_cost'] for p in all_products])
-        avg_cost = total / len(all_products)
+    # Kostenstatistik per GROUP BY aus den Snapshots (kein Laden aller Produkte)
+    cost_stats = cost_summary(db)
     
     return templates.TemplateResponse("index.html", {
         "request": request,
         "products": products,
+        "product_costs": product_costs,
         "total_products": total_products,
         "total_materials": total_materials,
         "total_machines": total_machines,
-        "avg_cost": round(avg_cost, 2),
+        "avg_cost": cost_stats['avg_cost'],
+        "cost_stats": cost_stats,
         "categories": CATEGORIES
     })
 
 # ===== MATERIAL ROUTES =====
 
 @app.get("/materials", response_class=HTMLResponse)
-async def list_materials(request: Request, material_type: str = "", db: Session = Depends(get_db)):
-    """Liste aller Materialien"""
+def list_materials(
+    request: Request,
+    material_type: str = "",
+    after: str = "",
+    before: str = "",
+    limit: int = DEFAULT_PAGE_SIZE,
+    format: str = "",
+    db: Session = Depends(get_db)
+):
+    """Liste aller Materialien (seitenweise)"""
     query = db.query(Material)
     
     if material_type:
         query = query.filter(Material.material_type == material_type)
     
-    materials = query.order_by(Material.material_type, Material.name).all()
+    page = paginate(query, "materials", after, before, limit)
+    if format == "json":
+        return JSONResponse(page.to_dict([row_dict(m) for m in page.items]))
     material_types = get_material_types(db)
     
     return templates.TemplateResponse("materials/list.html", {
         "request": request,
-        "materials": materials,
+        "materials": page.items,
+        "page": page,
         "material_type": material_type,
         "material_types": material_types
     })
 
 @app.get("/materials/new", response_class=HTMLResponse)
-async def new_material_form(request: Request, db: Session = Depends(get_db)):
+def new_material_form(request: Request, db: Session = Depends(get_db)):
     """Formular für neues Material"""
     material_types = get_material_types(db)
     return templates.TemplateResponse("materials/form.html", {
@@ -170,7 +302,7 @@ async def new_material_form(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.post("/materials")
-async def create_material(
+def create_material(
     request: Request,
     name: str = Form(...),
     material_type: str = Form(...),
@@ -199,7 +331,7 @@ async def create_material(
     return RedirectResponse(url="/materials", status_code=303)
 
 @app.get("/materials/{material_id}/edit", response_class=HTMLResponse)
-async def edit_material_form(material_id: int, request: Request, db: Session = Depends(get_db)):
+def edit_material_form(material_id: int, request: Request, db: Session = Depends(get_db)):
     """Formular zum Bearbeiten eines Materials"""
     material = db.query(Material).filter(Material.id == material_id).first()
     if not material:
@@ -214,7 +346,7 @@ async def edit_material_form(material_id: int, request: Request, db: Session = D
     })
 
 @app.post("/materials/{material_id}/update")
-async def update_material(
+def update_material(
     material_id: int,
     request: Request,
     name: str = Form(...),
@@ -241,25 +373,28 @@ async def update_material(
     material.updated_at = datetime.utcnow()
     
     db.commit()
+    products_cost_changed(db, product_ids_using(db, material_ids=[material_id]))
     
     return RedirectResponse(url="/materials", status_code=303)
 
 @app.post("/materials/{material_id}/delete")
-async def delete_material(material_id: int, db: Session = Depends(get_db)):
+def delete_material(material_id: int, db: Session = Depends(get_db)):
     """Material löschen"""
     material = db.query(Material).filter(Material.id == material_id).first()
     if not material:
         raise HTTPException(status_code=404, detail="Material nicht gefunden")
     
+    affected_ids = product_ids_using(db, material_ids=[material_id])
     db.delete(material)
     db.commit()
+    products_cost_changed(db, affected_ids)
     
     return RedirectResponse(url="/materials", status_code=303)
 
 # ===== MATERIALTYPEN ROUTES =====
 
 @app.get("/material-types", response_class=HTMLResponse)
-async def list_material_types(request: Request, db: Session = Depends(get_db)):
+def list_material_types(request: Request, db: Session = Depends(get_db)):
     """Liste aller Materialtypen (Verwaltung)"""
     material_types = db.query(MaterialType).order_by(MaterialType.sort_order, MaterialType.name).all()
     
@@ -270,7 +405,7 @@ async def list_material_types(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.get("/material-types/new", response_class=HTMLResponse)
-async def new_material_type_form(request: Request):
+def new_material_type_form(request: Request):
     """Formular für neuen Materialtyp"""
     return templates.TemplateResponse("materials/type_form.html", {
         "request": request,
@@ -279,7 +414,7 @@ async def new_material_type_form(request: Request):
     })
 
 @app.post("/material-types")
-async def create_material_type(
+def create_material_type(
     request: Request,
     key: str = Form(...),
     name: str = Form(...),
@@ -308,7 +443,7 @@ async def create_material_type(
     return RedirectResponse(url="/material-types", status_code=303)
 
 @app.get("/material-types/{type_id}/edit", response_class=HTMLResponse)
-async def edit_material_type_form(type_id: int, request: Request, db: Session = Depends(get_db)):
+def edit_material_type_form(type_id: int, request: Request, db: Session = Depends(get_db)):
     """Formular zum Bearbeiten eines Materialtyps"""
     material_type = db.query(MaterialType).filter(MaterialType.id == type_id).first()
     if not material_type:
@@ -321,7 +456,7 @@ async def edit_material_type_form(type_id: int, request: Request, db: Session =
     })
 
 @app.post("/material-types/{type_id}/update")
-async def update_material_type(
+def update_material_type(
     type_id: int,
     request: Request,
     key: str = Form(...),
@@ -353,7 +488,7 @@ async def update_material_type(
     return RedirectResponse(url="/material-types", status_code=303)
 
 @app.post("/material-types/{type_id}/delete")
-async def delete_material_type(type_id: int, db: Session = Depends(get_db)):
+def delete_material_type(type_id: int, db: Session = Depends(get_db)):
     """Materialtyp löschen (nur wenn nicht in Verwendung)"""
     material_type = db.query(MaterialType).filter(MaterialType.id == type_id).first()
     if not material_type:
@@ -372,24 +507,35 @@ async def delete_material_type(type_id: int, db: Session = Depends(get_db)):
 # ===== MACHINE ROUTES =====
 
 @app.get("/machines", response_class=HTMLResponse)
-async def list_machines(request: Request, machine_type: str = "", db: Session = Depends(get_db)):
-    """Liste aller Maschinen"""
+def list_machines(
+    request: Request,
+    machine_type: str = "",
+    after: str = "",
+    before: str = "",
+    limit: int = DEFAULT_PAGE_SIZE,
+    format: str = "",
+    db: Session = Depends(get_db)
+):
+    """Liste aller Maschinen (seitenweise)"""
     query = db.query(Machine)
     
     if machine_type:
         query = query.filter(Machine.machine_type == machine_type)
     
-    machines = query.order_by(Machine.machine_type, Machine.name).all()
+    page = paginate(query, "machines", after, before, limit)
+    if format == "json":
+        return JSONResponse(page.to_dict([row_dict(m) for m in page.items]))
     
     return templates.TemplateResponse("machines/list.html", {
         "request": request,
-        "machines": machines,
+        "machines": page.items,
+        "page": page,
         "machine_type": machine_type,
         "machine_types": [("3d_printer", "3D-Drucker"), ("cutter_plotter", "Cutter/Plotter"), ("inkjet_printer", "Tintenstrahl-Drucker"), ("other", "Sonstiges")]
     })
 
 @app.get("/machines/new", response_class=HTMLResponse)
-async def new_machine_form(request: Request):
+def new_machine_form(request: Request):
     """Formular für neue Maschine"""
     return templates.TemplateResponse("machines/form.html", {
         "request": request,
@@ -400,7 +546,7 @@ async def new_machine_form(request: Request):
     })
 
 @app.post("/machines")
-async def create_machine(
+def create_machine(
     request: Request,
     name: str = Form(...),
     machine_type: str = Form(...),
@@ -433,7 +579,7 @@ async def create_machine(
     return RedirectResponse(url="/machines", status_code=303)
 
 @app.get("/machines/{machine_id}/edit", response_class=HTMLResponse)
-async def edit_machine_form(machine_id: int, request: Request, db: Session = Depends(get_db)):
+def edit_machine_form(machine_id: int, request: Request, db: Session = Depends(get_db)):
     """Formular zum Bearbeiten einer Maschine"""
     machine = db.query(Machine).filter(Machine.id == machine_id).first()
     if not machine:
@@ -448,7 +594,7 @@ async def edit_machine_form(machine_id: int, request: Request, db: Session = Dep
     })
 
 @app.post("/machines/{machine_id}/update")
-async def update_machine(
+def update_machine(
     machine_id: int,
     request: Request,
     name: str = Form(...),
@@ -479,34 +625,39 @@ async def update_machine(
     machine.updated_at = datetime.utcnow()
     
     db.commit()
+    products_cost_changed(db, product_ids_using(db, machine_ids=[machine_id]))
     
     return RedirectResponse(url="/machines", status_code=303)
 
 @app.post("/machines/{machine_id}/delete")
-async def delete_machine(machine_id: int, db: Session = Depends(get_db)):
+def delete_machine(machine_id: int, db: Session = Depends(get_db)):
     """Maschine löschen"""
     machine = db.query(Machine).filter(Machine.id == machine_id).first()
     if not machine:
         raise HTTPException(status_code=404, detail="Maschine nicht gefunden")
     
+    affected_ids = product_ids_using(db, machine_ids=[machine_id])
     db.delete(machine)
     db.commit()
+    products_cost_changed(db, affected_ids)
     
     return RedirectResponse(url="/machines", status_code=303)
 
 # ===== PRODUCT ROUTES - Übersicht =====
 
 @app.get("/products", response_class=HTMLResponse)
-async def list_products(
+def list_products(
     request: Request, 
     search: str = "",
     category: str = "",
+    after: str = "",
+    before: str = "",
+    limit: int = DEFAULT_PAGE_SIZE,
+    format: str = "",
     db: Session = Depends(get_db)
 ):
-    """Produktliste mit Filter"""
-    from sqlalchemy.orm import joinedload
-    
-    query = db.query(Product).options(joinedload(Product.images))
+    """Produktliste mit Filter (seitenweise)"""
+    query = with_profile(db.query(Product), "products.list")
     
     if search:
         query = query.filter(Product.name.ilike(f"%{search}%"))
@@ -514,20 +665,25 @@ async def list_products(
     if category:
         query = query.filter(Product.category == category)
     
-    products = query.order_by(Product.name).all()
+    page = paginate(query, "products", after, before, limit)
+    products = page.items
+    
+    # Kalkulation aus den Snapshots
+    costs = get_product_costs(db, [p.id for p in products])
+    if format == "json":
+        return JSONResponse(page.to_dict([dict(row_dict(p), costs=costs[p.id]) for p in products]))
     
-    # Füge Berechnungen hinzu
     products_with_calc = []
     for p in products:
-        calc = p.calculate_costs()
         products_with_calc.append({
             'product': p,
-            'calc': calc
+            'calc': costs[p.id]
         })
     
     return templates.TemplateResponse("products/list.html", {
         "request": request,
         "products": products_with_calc,
+        "page": page,
         "search": search,
         "category": category,
         "categories": CATEGORIES
@@ -536,7 +692,7 @@ async def list_products(
 # ===== NEUES PRODUKT - TYP AUSWAHL =====
 
 @app.get("/products/new", response_class=HTMLResponse)
-async def new_product_select_type(request: Request):
+def new_product_select_type(request: Request):
     """Auswahlseite für Produkttyp beim Erstellen eines neuen Produkts"""
     return templates.TemplateResponse("products/product_type_select.html", {
         "request": request,
@@ -546,7 +702,7 @@ async def new_product_select_type(request: Request):
 # ===== 3D-DRUCK PRODUKTE =====
 
 @app.get("/products/3d-print/new", response_class=HTMLResponse)
-async def new_3d_print_form(request: Request, db: Session = Depends(get_db)):
+def new_3d_print_form(request: Request, db: Session = Depends(get_db)):
     """Formular für neues 3D-Druck Produkt"""
     filaments = db.query(Material).filter(Material.material_type == "filament").order_by(Material.name).all()
     machines = db.query(Machine).filter(Machine.machine_type == "3d_printer").order_by(Machine.name).all()
@@ -561,7 +717,7 @@ async def new_3d_print_form(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.post("/products/3d-print")
-async def create_3d_print(
+def create_3d_print(
     request: Request,
     name: str = Form(...),
     category: str = Form("Sonstiges"),
@@ -596,13 +752,15 @@ async def create_3d_print(
     db.add(product)
     db.commit()
     db.refresh(product)
+    products_cost_changed(db, [product.id])
+    search_changed("products")
     
     return RedirectResponse(url=f"/products/{product.id}", status_code=303)
 
 # ===== STICKER PRODUKTE (Sticker-Sheet + DieCut zusammengefasst) =====
 
 @app.get("/products/sticker/new", response_class=HTMLResponse)
-async def new_sticker_form(request: Request, db: Session = Depends(get_db)):
+def new_sticker_form(request: Request, db: Session = Depends(get_db)):
     """Formular für neues Sticker Produkt"""
     # Alle Materialien verfügbar (Filter kann später hinzugefügt werden)
     materials = db.query(Material).order_by(Material.name).all()
@@ -620,7 +778,7 @@ async def new_sticker_form(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.post("/products/sticker")
-async def create_sticker(
+def create_sticker(
     request: Request,
     name: str = Form(...),
     category: str = Form("StickerSheet"),  # StickerSheet oder DieCut
@@ -660,13 +818,15 @@ async def create_sticker(
     db.add(product)
     db.commit()
     db.refresh(product)
+    products_cost_changed(db, [product.id])
+    search_changed("products")
     
     return RedirectResponse(url=f"/products/{product.id}", status_code=303)
 
 # ===== SCHREIBWAREN ROUTES =====
 
 @app.get("/products/stationery/new", response_class=HTMLResponse)
-async def new_stationery_form(request: Request, db: Session = Depends(get_db)):
+def new_stationery_form(request: Request, db: Session = Depends(get_db)):
     """Formular für neue Schreibwaren"""
     # Alle Materialien verfügbar (Filter kann später hinzugefügt werden)
     materials = db.query(Material).order_by(Material.name).all()
@@ -682,7 +842,7 @@ async def new_stationery_form(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.post("/products/stationery")
-async def create_stationery(
+def create_stationery(
     request: Request,
     name: str = Form(...),
     category: str = Form("Sonstiges"),
@@ -721,24 +881,26 @@ async def create_stationery(
     db.add(product)
     db.commit()
     db.refresh(product)
+    products_cost_changed(db, [product.id])
+    search_changed("products")
     
     return RedirectResponse(url=f"/products/{product.id}", status_code=303)
 
 # Legacy: Alte URLs auf neue weiterleiten
 @app.get("/products/sticker-sheet/new")
-async def redirect_sticker_sheet_new():
+def redirect_sticker_sheet_new():
     """Redirect alte Sticker-Sheet URL auf neue Sticker URL"""
     return RedirectResponse(url="/products/sticker/new", status_code=307)
 
 @app.get("/products/diecut-sticker/new")
-async def redirect_diecut_sticker_new():
+def redirect_diecut_sticker_new():
     """Redirect alte DieCut-Sticker URL auf neue Sticker URL"""
     return RedirectResponse(url="/products/sticker/new", status_code=307)
 
 # ===== LASER-GRAVUR ROUTES =====
 
 @app.get("/products/laser-engraving/new", response_class=HTMLResponse)
-async def new_laser_engraving_form(request: Request, db: Session = Depends(get_db)):
+def new_laser_engraving_form(request: Request, db: Session = Depends(get_db)):
     """Formular für neue Laser-Gravur"""
     laser_materials = db.query(Material).filter(Material.material_type == "laser_material").order_by(Material.name).all()
     
@@ -751,7 +913,7 @@ async def new_laser_engraving_form(request: Request, db: Session = Depends(get_d
     })
 
 @app.post("/products/laser-engraving")
-async def create_laser_engraving(
+def create_laser_engraving(
     request: Request,
     name: str = Form(...),
     category: str = Form("Sonstiges"),
@@ -823,13 +985,15 @@ async def create_laser_engraving(
     db.add(product)
     db.commit()
     db.refresh(product)
+    products_cost_changed(db, [product.id])
+    search_changed("products")
     
     return RedirectResponse(url=f"/products/{product.id}", status_code=303)
 
 # ===== ZUSAMMENBAU (ASSEMBLY) ROUTES =====
 
 @app.get("/products/assembly/new", response_class=HTMLResponse)
-async def new_assembly_form(request: Request, db: Session = Depends(get_db)):
+def new_assembly_form(request: Request, db: Session = Depends(get_db)):
     """Formular für neues Zusammenbau-Produkt"""
     # Lade alle Produkte für Verknüpfung
     all_products = db.query(Product).order_by(Product.name).all()
@@ -843,7 +1007,7 @@ async def new_assembly_form(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.post("/products/assembly")
-async def create_assembly(
+def create_assembly(
     request: Request,
     name: str = Form(...),
     category: str = Form("Sonstiges"),
@@ -886,10 +1050,9 @@ async def create_assembly(
             if i < len(component_linked_product_id) and component_linked_product_id[i]:
                 try:
                     linked_id = int(component_linked_product_id[i])
-                    linked_product = db.query(Product).filter(Product.id == linked_id).first()
-                    if linked_product:
-                        # Berechne Kosten des verknüpften Produkts
-                        linked_calc = linked_product.calculate_costs()
+                    # Kosten des verknüpften Produkts (aus dem Snapshot)
+                    linked_calc = get_product_cost(db, linked_id)
+                    if linked_calc:
                         unit_cost = linked_calc['total_cost']
                 except (ValueError, TypeError):
                     linked_id = None
@@ -906,13 +1069,15 @@ async def create_assembly(
             db.add(comp)
     
     db.commit()
+    products_cost_changed(db, [product.id])
+    search_changed("products")
     
     return RedirectResponse(url=f"/products/{product.id}", status_code=303)
 
 # ===== PRODUKT ANZEIGEN/BEARBEITEN =====
 
 @app.get("/products/{product_id}", response_class=HTMLResponse)
-async def view_product(
+def view_product(
     product_id: int, 
     request: Request, 
     success: str = "",
@@ -920,11 +1085,11 @@ async def view_product(
     db: Session = Depends(get_db)
 ):
     """Produktdetails anzeigen"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = with_profile(db.query(Product), "products.detail").filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Produkt nicht gefunden")
     
-    calculations = product.calculate_costs()
+    calculations = get_product_cost(db, product_id)
     
     # Lade Bilder des Produkts
     images = db.query(ProductImage).filter(
@@ -967,7 +1132,7 @@ async def view_product(
     })
 
 @app.get("/products/{product_id}/edit", response_class=HTMLResponse)
-async def edit_product_form(product_id: int, request: Request, db: Session = Depends(get_db)):
+def edit_product_form(product_id: int, request: Request, db: Session = Depends(get_db)):
     """Produkt bearbeiten - typ-spezifisches Formular"""
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
@@ -1052,7 +1217,7 @@ async def edit_product_form(product_id: int, request: Request, db: Session = Dep
         })
 
 @app.post("/products/{product_id}/update")
-async def update_product(
+def update_product(
     product_id: int,
     request: Request,
     name: str = Form(...),
@@ -1114,6 +1279,12 @@ async def update_product(
     if not product:
         raise HTTPException(status_code=404, detail="Produkt nicht gefunden")
     
+    # Verknüpfte Produkte dürfen die Assembly nicht selbst (indirekt) enthalten
+    if product.product_type == "assembly":
+        linked_ids = {int(lid) for lid in component_linked_product_id if lid and lid.isdigit()}
+        if linked_ids and load_product_graph(db).would_create_cycle(product_id, linked_ids):
+            raise HTTPException(status_code=400, detail="Zirkuläre Verknüpfung: Ein verknüpftes Produkt enthält dieses Produkt bereits")
+    
     product.name = name
     product.category = category
     
@@ -1173,10 +1344,9 @@ async def update_product(
                 if i < len(component_linked_product_id) and component_linked_product_id[i]:
                     try:
                         linked_id = int(component_linked_product_id[i])
-                        linked_product = db.query(Product).filter(Product.id == linked_id).first()
-                        if linked_product:
-                            # Berechne Kosten des verknüpften Produkts
-                            linked_calc = linked_product.calculate_costs()
+                        # Kosten des verknüpften Produkts (aus dem Snapshot)
+                        linked_calc = get_product_cost(db, linked_id)
+                        if linked_calc:
                             unit_cost = linked_calc['total_cost']
                     except (ValueError, TypeError):
                         linked_id = None
@@ -1210,28 +1380,43 @@ async def update_product(
     product.updated_at = datetime.utcnow()
     
     db.commit()
+    products_cost_changed(db, [product_id])
+    search_changed("products")
     
     return RedirectResponse(url=f"/products/{product_id}", status_code=303)
 
 @app.post("/products/{product_id}/delete")
-async def delete_product(product_id: int, db: Session = Depends(get_db)):
+def delete_product(product_id: int, db: Session = Depends(get_db)):
     """Produkt löschen"""
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Produkt nicht gefunden")
     
-    # Lösche zuerst alle Komponenten (falls Assembly-Produkt)
+    # Lösche zuerst alle Komponenten (falls Assembly-Produkt) und den Kosten-Snapshot
     db.query(ProductComponent).filter(ProductComponent.product_id == product_id).delete()
+    db.query(ProductCostSnapshot).filter(ProductCostSnapshot.product_id == product_id).delete()
+    
+    # Produktbilder aus dem Blob-Speicher freigeben
+    image_ids = [image.id for image in product.images]
+    orphaned = [
+        blob_store.release(db, blob_store.sha256_of(image.file_path))
+        for image in product.images if blob_store.sha256_of(image.file_path)
+    ]
     
     db.delete(product)
     db.commit()
+    image_index.forget(*image_ids)
+    blob_store.remove_files(orphaned)
+    thumbnailer.discard(orphaned)
+    products_cost_changed(db, [product_id])
+    search_changed("products")
     
     return RedirectResponse(url="/products", status_code=303)
 
 # ===== FEEDBACK ROUTES =====
 
 @app.get("/feedback", response_class=HTMLResponse)
-async def feedback_form(request: Request, page: str = "/", title: str = ""):
+def feedback_form(request: Request, page: str = "/", title: str = ""):
     """Feedback-Formular anzeigen"""
     return templates.TemplateResponse("feedback/form.html", {
         "request": request,
@@ -1241,7 +1426,7 @@ async def feedback_form(request: Request, page: str = "/", title: str = ""):
     })
 
 @app.post("/feedback")
-async def submit_feedback(
+def submit_feedback(
     request: Request,
     page_url: str = Form(...),
     page_title: str = Form(""),
@@ -1267,7 +1452,7 @@ async def submit_feedback(
     return response
 
 @app.get("/feedback/list", response_class=HTMLResponse)
-async def list_feedback(request: Request, db: Session = Depends(get_db)):
+def list_feedback(request: Request, db: Session = Depends(get_db)):
     """Alle Feedback-Einträge anzeigen (Admin-Ansicht)"""
     feedbacks = db.query(Feedback).order_by(Feedback.created_at.desc()).all()
     
@@ -1278,7 +1463,7 @@ async def list_feedback(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.post("/feedback/{feedback_id}/status")
-async def update_feedback_status(
+def update_feedback_status(
     feedback_id: int,
     status: str = Form(...),
     db: Session = Depends(get_db)
@@ -1295,7 +1480,7 @@ async def update_feedback_status(
     return RedirectResponse(url="/feedback/list", status_code=303)
 
 @app.post("/feedback/{feedback_id}/delete")
-async def delete_feedback(feedback_id: int, db: Session = Depends(get_db)):
+def delete_feedback(feedback_id: int, db: Session = Depends(get_db)):
     """Feedback-Eintrag löschen"""
     feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
     if not feedback:
@@ -1309,7 +1494,7 @@ async def delete_feedback(feedback_id: int, db: Session = Depends(get_db)):
 # ===== IDEEN-BOARD ROUTES =====
 
 @app.get("/ideas", response_class=HTMLResponse)
-async def ideas_board(request: Request, db: Session = Depends(get_db)):
+def ideas_board(request: Request, db: Session = Depends(get_db)):
     """Kanban-Style Ideen-Board anzeigen"""
     ideas_todo = db.query(Idea).filter(Idea.status == "todo").order_by(Idea.created_at.desc()).all()
     ideas_in_progress = db.query(Idea).filter(Idea.status == "in_progress").order_by(Idea.created_at.desc()).all()
@@ -1324,7 +1509,7 @@ async def ideas_board(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.post("/ideas")
-async def create_idea(
+def create_idea(
     request: Request,
     subject: str = Form(...),
     content: str = Form(""),
@@ -1345,7 +1530,7 @@ async def create_idea(
     return RedirectResponse(url="/ideas", status_code=303)
 
 @app.post("/ideas/{idea_id}/update")
-async def update_idea(
+def update_idea(
     idea_id: int,
     request: Request,
     subject: str = Form(...),
@@ -1368,7 +1553,7 @@ async def update_idea(
     return RedirectResponse(url="/ideas", status_code=303)
 
 @app.post("/ideas/{idea_id}/delete")
-async def delete_idea(idea_id: int, db: Session = Depends(get_db)):
+def delete_idea(idea_id: int, db: Session = Depends(get_db)):
     """Idee löschen"""
     idea = db.query(Idea).filter(Idea.id == idea_id).first()
     if not idea:
@@ -1381,7 +1566,7 @@ async def delete_idea(idea_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/ideas/{idea_id}/status")
-async def update_idea_status(
+def update_idea_status(
     idea_id: int,
     status: str = Form(...),
     db: Session = Depends(get_db)
@@ -1403,18 +1588,33 @@ async def update_idea_status(
 # ========================================
 
 @app.get("/sales-orders", response_class=HTMLResponse)
-async def list_sales_orders(request: Request, db: Session = Depends(get_db)):
-    """Liste aller Verkaufsaufträge"""
-    orders = db.query(SalesOrder).order_by(SalesOrder.created_at.desc()).all()
+def list_sales_orders(
+    request: Request,
+    after: str = "",
+    before: str = "",
+    limit: int = DEFAULT_PAGE_SIZE,
+    format: str = "",
+    error: str = "",
+    success: str = "",
+    db: Session = Depends(get_db)
+):
+    """Liste aller Verkaufsaufträge (seitenweise)"""
+    page = paginate(with_profile(db.query(SalesOrder), "sales_orders.list"), "sales_orders", after, before, limit)
+    if format == "json":
+        return JSONResponse(page.to_dict([dict(row_dict(o), item_count=len(o.items)) for o in page.items]))
     return templates.TemplateResponse("sales_orders/list.html", {
         "request": request,
-        "orders": orders
+        "orders": page.items,
+        "page": page,
+        "error": error,
+        "success": success
     })
 
 @app.get("/sales-orders/new", response_class=HTMLResponse)
-async def new_sales_order_form(request: Request, product_id: int = None, db: Session = Depends(get_db)):
+def new_sales_order_form(request: Request, product_id: int = None, db: Session = Depends(get_db)):
     """Formular für neuen Verkaufsauftrag"""
     products = db.query(Product).order_by(Product.name).all()
+    product_costs = get_product_costs(db, [p.id for p in products])
     articles = db.query(Article).filter(Article.is_active == 1).order_by(Article.name).all()
     product = None
     if product_id:
@@ -1423,13 +1623,14 @@ async def new_sales_order_form(request: Request, product_id: int = None, db: Ses
         "request": request,
         "order": None,
         "products": products,
+        "product_costs": product_costs,
         "articles": articles,
         "product": product,
         "title": "Neuer Verkaufsauftrag"
     })
 
 @app.post("/sales-orders")
-async def create_sales_order(
+def create_sales_order(
     request: Request,
     order_number: str = Form(""),
     customer_name: str = Form(""),
@@ -1460,51 +1661,64 @@ async def create_sales_order(
         notes=notes if notes else None,
         status="pending"
     )
-    db.add(order)
-    db.commit()
-    db.refresh(order)
     
-    # Auftragspositionen erstellen
+    # Auftragspositionen sammeln (Positionen ohne Produkt/Artikel werden übersprungen)
+    lines = []
     for i in range(len(item_type)):
         if i < len(quantity) and i < len(unit_price):
-            item_type_val = item_type[i] if i < len(item_type) else 'product'
-            
-            if item_type_val == 'product':
-                # Produkt-Position
-                pid = int(product_id[i]) if i < len(product_id) and product_id[i] else None
-                if pid:
-                    item = SalesOrderItem(
-                        sales_order_id=order.id,
-                        item_type='product',
-                        product_id=pid,
-                        article_id=None,
-                        quantity=int(quantity[i]),
-                        unit_price=parse_decimal(unit_price[i]),
-                        cost_per_unit=parse_decimal(cost_per_unit[i]) if i < len(cost_per_unit) else 0
-                    )
-                    db.add(item)
+            if item_type[i] == 'product':
+                ref_id = product_id[i] if i < len(product_id) else ""
             else:
-                # Artikel-Position
-                aid = int(article_id[i]) if i < len(article_id) and article_id[i] else None
-                if aid:
-                    item = SalesOrderItem(
-                        sales_order_id=order.id,
-                        item_type='article',
-                        product_id=None,
-                        article_id=aid,
-                        quantity=int(quantity[i]),
-                        unit_price=parse_decimal(unit_price[i]),
-                        cost_per_unit=parse_decimal(cost_per_unit[i]) if i < len(cost_per_unit) else 0
-                    )
-                    db.add(item)
-    
+                ref_id = article_id[i] if i < len(article_id) else ""
+            if not ref_id:
+                continue
+            lines.append(SalesOrderLine(
+                item_type=item_type[i],
+                product_id=int(ref_id) if item_type[i] == 'product' else None,
+                article_id=None if item_type[i] == 'product' else int(ref_id),
+                quantity=int(quantity[i]),
+                unit_price=parse_decimal(unit_price[i]),
+                cost_per_unit=parse_decimal(cost_per_unit[i]) if i < len(cost_per_unit) else 0
+            ))
+    
+    # Kopf und alle Positionen in einer Transaktion (Positionen als ein INSERT)
+    db.add(order)
+    db.flush()
+    try:
+        insert_sales_order_items(db, order.id, lines)
+    except UnknownReference as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     db.commit()
     return RedirectResponse(url=f"/sales-orders/{order.id}", status_code=303)
 
+@app.post("/sales-orders/import")
+def import_sales_orders(
+    file: UploadFile = File(...),
+    source: str = Form("import"),
+    format: str = Form(""),
+    db: Session = Depends(get_db)
+):
+    """Marktplatz-Bestellungen (CSV/JSON) als Verkaufsaufträge importieren (siehe order_import.py)"""
+    try:
+        result = import_orders(db, read_rows(file.file, file.filename or ""), source)
+    except RowFileError as e:
+        db.rollback()
+        if format == "json":
+            raise HTTPException(status_code=400, detail=str(e))
+        return RedirectResponse(url=f"/sales-orders?{urlencode({'error': str(e)})}", status_code=303)
+    if format == "json":
+        return JSONResponse(result.to_dict())
+    message = (f"{result.orders_imported} Aufträge mit {result.items_imported} Positionen importiert, "
+               f"{result.orders_skipped} bereits vorhanden, {result.orders_failed} fehlerhaft.")
+    if result.errors:
+        message += " Erster Fehler: " + result.errors[0]
+    return RedirectResponse(url=f"/sales-orders?{urlencode({'success': message})}", status_code=303)
+
 @app.get("/sales-orders/{order_id}", response_class=HTMLResponse)
-async def view_sales_order(order_id: int, request: Request, db: Session = Depends(get_db)):
+def view_sales_order(order_id: int, request: Request, db: Session = Depends(get_db)):
     """Verkaufsauftrag anzeigen"""
-    order = db.query(SalesOrder).filter(SalesOrder.id == order_id).first()
+    order = with_profile(db.query(SalesOrder), "sales_orders.detail").filter(SalesOrder.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Auftrag nicht gefunden")
     
@@ -1514,7 +1728,7 @@ async def view_sales_order(order_id: int, request: Request, db: Session = Depend
     })
 
 @app.post("/sales-orders/{order_id}/status")
-async def update_sales_order_status(
+def update_sales_order_status(
     order_id: int,
     request: Request,
     status: str = Form(...),
@@ -1538,28 +1752,76 @@ async def update_sales_order_status(
 # TOOLS - PNG TO SVG CONVERTER
 # ========================================
 
-# Verzeichnis für temporäre Uploads
-UPLOAD_DIR = Path("/tmp/picocalc_uploads")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 # Permanentes Speicherverzeichnis (Docker Volume)
 FILE_STORAGE_PATH = Path(os.environ.get("FILE_STORAGE_PATH", "/app/storage"))
-FILE_STORAGE_PATH.mkdir(parents=True, exist_ok=True)
+
+# Inhaltsadressierte Ablage (gleiche Dateien nur einmal auf der Platte)
+blob_store = BlobStore(FILE_STORAGE_PATH)
+
+# Verkleinerte Produktbilder (Cache unter FILE_STORAGE_PATH/variants)
+thumbnailer = Thumbnailer(FILE_STORAGE_PATH)
+
+# Hintergrund-Konvertierung (vtracer im Prozess-Pool)
+conversion_queue = ConversionQueue(blob_store)
 
 @app.get("/tools/png-to-svg", response_class=HTMLResponse)
-async def png_to_svg_form(request: Request, error: str = "", success: str = ""):
+def png_to_svg_form(request: Request, error: str = "", success: str = ""):
     """PNG zu SVG Converter - Upload Formular"""
     return templates.TemplateResponse("tools/png_to_svg.html", {
         "request": request,
         "title": "PNG zu SVG Converter",
         "error": error,
         "success": success,
-        "svg_content": None,
+        "svg_url": None,
+        "original_filename": None
+    })
+
+ALLOWED_IMAGE_TYPES = ['image/png', 'image/jpeg', 'image/jpg', 'image/webp', 'image/bmp']
+ZIP_TYPES = ['application/zip', 'application/x-zip-compressed']
+
+
+def conversion_options(mode, color_mode, filter_speckle, color_precision, layer_difference, corner_threshold,
+                       optimize_svg="false", svg_precision=DEFAULT_PRECISION, svgz="false") -> dict:
+    """vtracer-Parameter und Nachbearbeitung aus dem Formular"""
+    options = {
+        "mode": mode,                              # 'spline', 'polygon', oder 'none'
+        "color_mode": color_mode,                  # 'color' oder 'binary'
+        "filter_speckle": filter_speckle,          # Default: 4
+        "color_precision": color_precision,        # Default: 6
+        "layer_difference": layer_difference,      # Default: 16
+        "corner_threshold": corner_threshold,      # Default: 60
+        "optimize": optimize_svg == "true",        # Koordinaten runden, Pfade zusammenfassen
+        "svgz": svgz == "true",                    # zusätzlich gzip-Variante speichern
+    }
+    if options["optimize"]:
+        options["precision"] = max(0, min(svg_precision, 6))  # Nachkommastellen
+    return options
+
+
+SVG_PREVIEW_BYTES = 3000  # Länge der Code-Vorschau
+
+
+def read_svg_head(path: Path, limit: int = SVG_PREVIEW_BYTES):
+    """Anfang einer SVG-Datei für die Code-Vorschau - gibt (Text, gekürzt?) zurück"""
+    with open(path, "rb") as f:
+        head = f.read(limit + 1)
+    return head[:limit].decode("utf-8", errors="ignore"), len(head) > limit
+
+
+def converter_error(request: Request, error: str):
+    """Converter-Formular mit Fehlermeldung"""
+    return templates.TemplateResponse("tools/png_to_svg.html", {
+        "request": request,
+        "title": "PNG zu SVG Converter",
+        "error": error,
+        "success": "",
+        "svg_url": None,
         "original_filename": None
     })
 
+
 @app.post("/tools/png-to-svg")
-async def png_to_svg_convert(
+def png_to_svg_convert(
     request: Request,
     image: UploadFile = File(...),
     mode: str = Form("spline"),
@@ -1568,132 +1830,285 @@ async def png_to_svg_convert(
     color_precision: int = Form(6),
     layer_difference: int = Form(16),
     corner_threshold: int = Form(60),
+    optimize_svg: str = Form("false"),  # 'true' oder 'false'
+    svg_precision: int = Form(DEFAULT_PRECISION),
+    svgz: str = Form("false"),
     save_file: str = Form("true"),  # 'true' oder 'false'
     description: str = Form(""),
     tags: str = Form(""),
     db: Session = Depends(get_db)
 ):
-    """PNG/JPG zu SVG konvertieren und optional speichern"""
+    """PNG/JPG zu SVG konvertieren und optional speichern
+
+    Die Konvertierung läuft im Hintergrund - die Antwort enthält nur die Job-ID
+    (JSON bei Accept: application/json, sonst Weiterleitung zur Ergebnisseite).
+    """
     
     # Prüfe Dateityp
-    allowed_types = ['image/png', 'image/jpeg', 'image/jpg', 'image/webp', 'image/bmp']
-    if image.content_type not in allowed_types:
-        return templates.TemplateResponse("tools/png_to_svg.html", {
-            "request": request,
-            "title": "PNG zu SVG Converter",
-            "error": "Nur PNG, JPG, WEBP oder BMP Dateien erlaubt.",
-            "success": "",
-            "svg_content": None,
-            "original_filename": None
-        })
+    if image.content_type not in ALLOWED_IMAGE_TYPES:
+        return converter_error(request, "Nur PNG, JPG, WEBP oder BMP Dateien erlaubt.")
+    
+    options = conversion_options(mode, color_mode, filter_speckle, color_precision,
+                                 layer_difference, corner_threshold, optimize_svg, svg_precision, svgz)
     
+    staged = blob_store.stage_stream(image.file, image.filename)
     try:
-        # Generiere eindeutige Dateinamen
-        file_id = str(uuid.uuid4())
-        input_path = UPLOAD_DIR / f"{file_id}_input.png"
-        output_path = UPLOAD_DIR / f"{file_id}_output.svg"
-        
-        # Speichere hochgeladene Datei
-        content = await image.read()
-        with open(input_path, "wb") as f:
-            f.write(content)
-        
-        # Konvertiere zu SVG mit vtracer
-        vtracer.convert_image_to_svg_py(
-            str(input_path),
-            str(output_path),
-            colormode=color_mode,           # 'color' oder 'binary'
-            mode=mode,                      # 'spline', 'polygon', oder 'none'
-            filter_speckle=filter_speckle,  # Default: 4
-            color_precision=color_precision,# Default: 6
-            layer_difference=layer_difference,  # Default: 16
-            corner_threshold=corner_threshold,  # Default: 60
+        job = conversion_queue.submit(
+            db, image.filename, staged, options,
+            save_file=(save_file == "true"), description=description, tags=tags
         )
-        
-        # Lese generierte SVG
-        with open(output_path, "r", encoding="utf-8") as f:
-            svg_content = f.read()
-        
-        # Berechne Dateigrößen
-        original_size = len(content)
-        svg_size = len(svg_content.encode('utf-8'))
-        
-        # Wenn speichern aktiviert, in permanenten Speicher verschieben
-        db_entry = None
-        if save_file == "true":
-            # Erstelle Unterordner basierend auf Datum für bessere Organisation
-            from datetime import datetime
-            date_folder = datetime.now().strftime("%Y/%m")
-            storage_subdir = FILE_STORAGE_PATH / date_folder
-            storage_subdir.mkdir(parents=True, exist_ok=True)
-            
-            # Permanente Pfade
-            png_filename = f"{file_id}.png"
-            svg_filename = f"{file_id}.svg"
-            png_path = storage_subdir / png_filename
-            svg_path = storage_subdir / svg_filename
-            
-            # Kopiere Dateien in permanenten Speicher
-            import shutil
-            shutil.copy(input_path, png_path)
-            shutil.copy(output_path, svg_path)
-            
-            # Datenbank-Eintrag erstellen
-            db_entry = ConvertedFile(
-                original_filename=image.filename,
-                stored_filename=file_id,
-                file_path_png=str(Path(date_folder) / png_filename),
-                file_path_svg=str(Path(date_folder) / svg_filename),
-                original_size_bytes=original_size,
-                svg_size_bytes=svg_size,
-                conversion_mode=mode,
-                color_mode=color_mode,
-                description=description if description else None,
-                tags=tags if tags else None
-            )
-            db.add(db_entry)
-            db.commit()
-            db.refresh(db_entry)
-        
-        # Lösche temporäre Dateien
-        input_path.unlink(missing_ok=True)
-        output_path.unlink(missing_ok=True)
-        
+    except ConversionQueueFull as e:
+        blob_store.discard([staged])
+        if "application/json" in request.headers.get("accept", ""):
+            raise HTTPException(status_code=503, detail=str(e))
+        return converter_error(request, str(e))
+    
+    if "application/json" in request.headers.get("accept", ""):
+        return JSONResponse({
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/conversion-jobs/{job.id}"
+        }, status_code=202)
+    return RedirectResponse(url=f"/tools/png-to-svg/jobs/{job.id}", status_code=303)
+
+
+def get_conversion_job(db: Session, job_id: str) -> ConversionJob:
+    job = db.query(ConversionJob).filter(ConversionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Konvertierung nicht gefunden")
+    return job
+
+
+@app.get("/api/conversion-jobs/{job_id}")
+def conversion_job_status(job_id: str, db: Session = Depends(get_db)):
+    """Status einer Konvertierung (für Polling)"""
+    job = get_conversion_job(db, job_id)
+    return {
+        "job_id": job.id,
+        "status": conversion_queue.status(job),
+        "original_filename": job.original_filename,
+        "original_size": job.original_size_bytes,
+        "svg_size": job.svg_size_bytes,
+        "svg_raw_size": job.svg_raw_size_bytes,
+        "saved_file_id": job.converted_file_id,
+        "error": job.error,
+        "result_url": f"/tools/png-to-svg/jobs/{job.id}"
+    }
+
+
+@app.get("/tools/png-to-svg/jobs/{job_id}", response_class=HTMLResponse)
+def conversion_job_result(request: Request, job_id: str, db: Session = Depends(get_db)):
+    """Ergebnisseite einer Konvertierung (wartet, bis der Job fertig ist)"""
+    job = get_conversion_job(db, job_id)
+    status = conversion_queue.status(job)
+    
+    if status == "failed":
+        return converter_error(request, f"Fehler bei der Konvertierung: {job.error}")
+    
+    if status != "done":
         return templates.TemplateResponse("tools/png_to_svg.html", {
             "request": request,
-            "title": "PNG zu SVG Converter - Ergebnis",
+            "title": "PNG zu SVG Converter - Konvertierung läuft",
             "error": "",
-            "success": f"Konvertierung erfolgreich! Original: {original_size/1024:.1f} KB, SVG: {svg_size/1024:.1f} KB" + (" (Gespeichert)" if db_entry else " (Nicht gespeichert)"),
-            "svg_content": svg_content,
-            "original_filename": image.filename,
-            "original_size": original_size,
-            "svg_size": svg_size,
-            "saved_file_id": db_entry.id if db_entry else None
-        })
-        
-    except Exception as e:
-        # Cleanup bei Fehler
-        if 'input_path' in locals():
-            input_path.unlink(missing_ok=True)
-        if 'output_path' in locals():
-            output_path.unlink(missing_ok=True)
-        
-        return templates.TemplateResponse("tools/png_to_svg.html", {
-            "request": request,
-            "title": "PNG zu SVG Converter",
-            "error": f"Fehler bei der Konvertierung: {str(e)}",
             "success": "",
-            "svg_content": None,
-            "original_filename": None
+            "svg_url": None,
+            "original_filename": job.original_filename,
+            "pending_job": job,
+            "pending_status": status
         })
+    
+    svg_path = conversion_queue.svg_path(job)
+    if not svg_path.exists():
+        raise HTTPException(status_code=404, detail="SVG-Datei nicht mehr vorhanden")
+    svg_head, svg_truncated = read_svg_head(svg_path)
+    
+    original_size = job.original_size_bytes
+    svg_size = job.svg_size_bytes
+    return templates.TemplateResponse("tools/png_to_svg.html", {
+        "request": request,
+        "title": "PNG zu SVG Converter - Ergebnis",
+        "error": "",
+        "success": f"Konvertierung erfolgreich! Original: {original_size/1024:.1f} KB, SVG: {svg_size/1024:.1f} KB" + (" (Gespeichert)" if job.converted_file_id else " (Nicht gespeichert)"),
+        "svg_url": f"/tools/png-to-svg/jobs/{job.id}/svg",
+        "svg_head": svg_head,
+        "svg_truncated": svg_truncated,
+        "original_filename": job.original_filename,
+        "original_size": original_size,
+        "svg_size": svg_size,
+        "svg_raw_size": job.svg_raw_size_bytes,
+        "saved_file_id": job.converted_file_id
+    })
+
+
+@app.get("/tools/png-to-svg/jobs/{job_id}/svg")
+def conversion_job_svg(request: Request, job_id: str, download: bool = False, db: Session = Depends(get_db)):
+    """SVG einer fertigen Konvertierung (gestreamt, mit ?download=1 als Anhang)"""
+    job = get_conversion_job(db, job_id)
+    if conversion_queue.status(job) != "done":
+        raise HTTPException(status_code=404, detail="Konvertierung noch nicht fertig")
+    svg_path = conversion_queue.svg_path(job)
+    if not svg_path.exists():
+        raise HTTPException(status_code=404, detail="SVG-Datei nicht mehr vorhanden")
+    return stored_file_response(
+        request, FILE_STORAGE_PATH, str(svg_path.relative_to(FILE_STORAGE_PATH)),
+        media_type="image/svg+xml",
+        filename=f"{Path(job.original_filename).stem}.svg" if download else None
+    )
+
+@app.post("/tools/png-to-svg/batch")
+def png_to_svg_batch(
+    request: Request,
+    images: List[UploadFile] = File(...),
+    mode: str = Form("spline"),
+    color_mode: str = Form("color"),
+    filter_speckle: int = Form(4),
+    color_precision: int = Form(6),
+    layer_difference: int = Form(16),
+    corner_threshold: int = Form(60),
+    optimize_svg: str = Form("false"),
+    svg_precision: int = Form(DEFAULT_PRECISION),
+    svgz: str = Form("false"),
+    save_file: str = Form("true"),
+    description: str = Form(""),
+    tags: str = Form(""),
+    db: Session = Depends(get_db)
+):
+    """Stapel-Konvertierung: mehrere Bilder und/oder ZIP-Archive auf einmal"""
+    wants_json = "application/json" in request.headers.get("accept", "")
+    options = conversion_options(mode, color_mode, filter_speckle, color_precision,
+                                 layer_difference, corner_threshold, optimize_svg, svg_precision, svgz)
+    files = []  # [(Dateiname, StagedFile)]
+    try:
+        for image in images:
+            if image.content_type in ZIP_TYPES or (image.filename or "").lower().endswith(".zip"):
+                files.extend(images_from_zip(image.file, blob_store))
+            elif image.content_type in ALLOWED_IMAGE_TYPES:
+                files.append((image.filename, blob_store.stage_stream(image.file, image.filename)))
+            else:
+                raise ValueError(f"{image.filename}: Nur PNG, JPG, WEBP, BMP oder ZIP Dateien erlaubt.")
+        batch_id = conversion_queue.submit_batch(
+            db, files, options, save_file=(save_file == "true"), description=description, tags=tags
+        )
+    except ConversionQueueFull as e:
+        blob_store.discard(staged for _, staged in files)
+        if wants_json:
+            raise HTTPException(status_code=503, detail=str(e))
+        return converter_error(request, str(e))
+    except (ValueError, zipfile.BadZipFile) as e:
+        blob_store.discard(staged for _, staged in files)
+        if wants_json:
+            raise HTTPException(status_code=400, detail=str(e))
+        return converter_error(request, str(e))
+    
+    if wants_json:
+        return JSONResponse({
+            "batch_id": batch_id,
+            "progress_url": f"/api/conversion-batches/{batch_id}/progress",
+            "download_url": f"/tools/png-to-svg/batches/{batch_id}/download"
+        }, status_code=202)
+    return RedirectResponse(url=f"/tools/png-to-svg/batches/{batch_id}", status_code=303)
+
+
+def get_conversion_batch(db: Session, batch_id: str) -> list:
+    jobs = conversion_queue.batch_jobs(db, batch_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Stapel-Konvertierung nicht gefunden")
+    return jobs
+
+
+@app.get("/tools/png-to-svg/batches/{batch_id}", response_class=HTMLResponse)
+def conversion_batch_page(request: Request, batch_id: str, db: Session = Depends(get_db)):
+    """Fortschritt und Ergebnis einer Stapel-Konvertierung"""
+    jobs = get_conversion_batch(db, batch_id)
+    return templates.TemplateResponse("tools/png_to_svg_batch.html", {
+        "request": request,
+        "title": "Stapel-Konvertierung",
+        "batch_id": batch_id,
+        "jobs": jobs,
+        "statuses": {job.id: conversion_queue.status(job) for job in jobs},
+        "progress": conversion_queue.batch_progress(jobs)
+    })
+
+
+# Grenzen für den Fortschritts-Stream: Jobs eines beendeten Workers bleiben
+# sonst für immer "queued" und der Stream fragt endlos ab
+BATCH_PROGRESS_MAX_SECONDS = float(os.getenv("BATCH_PROGRESS_MAX_SECONDS", "1800"))
+BATCH_PROGRESS_IDLE_SECONDS = float(os.getenv("BATCH_PROGRESS_IDLE_SECONDS", "300"))
+
+
+@app.get("/api/conversion-batches/{batch_id}/progress")
+def conversion_batch_progress(batch_id: str, db: Session = Depends(get_db)):
+    """Fortschritt einer Stapel-Konvertierung als Server-Sent Events
+
+    Endet, wenn alles fertig ist - oder mit einem "timeout"-Event nach
+    BATCH_PROGRESS_MAX_SECONDS bzw. wenn sich BATCH_PROGRESS_IDLE_SECONDS lang
+    nichts mehr ändert.
+    """
+    get_conversion_batch(db, batch_id)
+    db.close()
+    
+    def poll():
+        poll_db = SessionLocal()
+        try:
+            return conversion_queue.batch_progress(conversion_queue.batch_jobs(poll_db, batch_id))
+        finally:
+            poll_db.close()
+    
+    async def events():
+        last = None
+        started = changed = time.monotonic()
+        while True:
+            progress = await run_in_threadpool(poll)
+            now = time.monotonic()
+            if progress != last:
+                yield f"data: {json.dumps(progress)}\n\n"
+                last, changed = progress, now
+            if progress["finished"]:
+                return
+            if now - started > BATCH_PROGRESS_MAX_SECONDS or now - changed > BATCH_PROGRESS_IDLE_SECONDS:
+                yield f"event: timeout\ndata: {json.dumps(progress)}\n\n"
+                return
+            await asyncio.sleep(0.5)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/tools/png-to-svg/batches/{batch_id}/download")
+def download_conversion_batch(batch_id: str, db: Session = Depends(get_db)):
+    """Alle fertigen SVGs eines Stapels als ZIP"""
+    jobs = [job for job in get_conversion_batch(db, batch_id) if job.status == "done"]
+    entries = [(job.original_filename, conversion_queue.svg_path(job)) for job in jobs]
+    entries = [(name, path) for name, path in entries if path.exists()]
+    if not entries:
+        raise HTTPException(status_code=404, detail="Noch keine fertigen SVG-Dateien")
+    
+    # ZIP im Speicher bzw. ab 10 MB in einer temporären Datei aufbauen
+    archive = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    write_svg_zip(entries, archive)
+    archive.seek(0)
+    
+    def chunks():
+        with archive:
+            while chunk := archive.read(64 * 1024):
+                yield chunk
+    
+    return StreamingResponse(chunks(), media_type="application/zip", headers={
+        "Content-Disposition": f'attachment; filename="svg_stapel_{batch_id[:8]}.zip"'
+    })
+
 
 @app.get("/tools/converted-files", response_class=HTMLResponse)
-async def list_converted_files(
+def list_converted_files(
     request: Request,
     search: str = "",
+    after: str = "",
+    before: str = "",
+    limit: int = DEFAULT_PAGE_SIZE,
+    format: str = "",
     db: Session = Depends(get_db)
 ):
-    """Liste aller gespeicherten Konvertierungen"""
+    """Liste aller gespeicherten Konvertierungen (seitenweise)"""
     query = db.query(ConvertedFile)
     
     if search:
@@ -1703,17 +2118,20 @@ async def list_converted_files(
             (ConvertedFile.tags.ilike(f"%{search}%"))
         )
     
-    files = query.order_by(ConvertedFile.created_at.desc()).all()
+    page = paginate(query, "converted_files", after, before, limit)
+    if format == "json":
+        return JSONResponse(page.to_dict([row_dict(f) for f in page.items]))
     
     return templates.TemplateResponse("tools/converted_files_list.html", {
         "request": request,
         "title": "Gespeicherte Konvertierungen",
-        "files": files,
+        "files": page.items,
+        "page": page,
         "search": search
     })
 
 @app.get("/tools/converted-files/{file_id}/preview", response_class=HTMLResponse)
-async def preview_converted_file(
+def preview_converted_file(
     file_id: int,
     request: Request,
     db: Session = Depends(get_db)
@@ -1728,18 +2146,19 @@ async def preview_converted_file(
     if not svg_path.exists():
         raise HTTPException(status_code=404, detail="SVG-Datei nicht gefunden")
     
-    with open(svg_path, "r", encoding="utf-8") as f:
-        svg_content = f.read()
+    # Nur den Anfang lesen - die Vorschau zeigt höchstens SVG_PREVIEW_BYTES Zeichen
+    svg_head, svg_truncated = read_svg_head(svg_path)
     
     return templates.TemplateResponse("tools/converted_file_preview.html", {
         "request": request,
         "title": f"Vorschau: {file_entry.original_filename}",
         "file": file_entry,
-        "svg_content": svg_content
+        "svg_head": svg_head,
+        "svg_truncated": svg_truncated
     })
 
 @app.get("/tools/converted-files/{file_id}/download/svg")
-async def download_svg(file_id: int, db: Session = Depends(get_db)):
+def download_svg(request: Request, file_id: int, db: Session = Depends(get_db)):
     """Download der SVG-Datei"""
     file_entry = db.query(ConvertedFile).filter(ConvertedFile.id == file_id).first()
     if not file_entry:
@@ -1749,14 +2168,30 @@ async def download_svg(file_id: int, db: Session = Depends(get_db)):
     if not svg_path.exists():
         raise HTTPException(status_code=404, detail="SVG-Datei nicht gefunden")
     
-    return FileResponse(
-        path=svg_path,
+    return stored_file_response(
+        request, FILE_STORAGE_PATH, file_entry.file_path_svg,
         filename=file_entry.original_filename.replace('.png', '.svg').replace('.jpg', '.svg'),
         media_type="image/svg+xml"
     )
 
+@app.get("/tools/converted-files/{file_id}/download/svgz")
+def download_svgz(request: Request, file_id: int, db: Session = Depends(get_db)):
+    """Download der gzip-komprimierten SVG (.svgz), falls gespeichert"""
+    file_entry = db.query(ConvertedFile).filter(ConvertedFile.id == file_id).first()
+    if not file_entry or not file_entry.file_path_svgz:
+        raise HTTPException(status_code=404, detail="Datei nicht gefunden")
+    
+    if not (FILE_STORAGE_PATH / file_entry.file_path_svgz).exists():
+        raise HTTPException(status_code=404, detail="SVGZ-Datei nicht gefunden")
+    
+    return stored_file_response(
+        request, FILE_STORAGE_PATH, file_entry.file_path_svgz,
+        filename=f"{Path(file_entry.original_filename).stem}.svgz",
+        media_type="image/svg+xml"
+    )
+
 @app.get("/tools/converted-files/{file_id}/download/png")
-async def download_png(file_id: int, db: Session = Depends(get_db)):
+def download_png(request: Request, file_id: int, db: Session = Depends(get_db)):
     """Download der originalen PNG-Datei"""
     file_entry = db.query(ConvertedFile).filter(ConvertedFile.id == file_id).first()
     if not file_entry:
@@ -1766,29 +2201,35 @@ async def download_png(file_id: int, db: Session = Depends(get_db)):
     if not png_path.exists():
         raise HTTPException(status_code=404, detail="PNG-Datei nicht gefunden")
     
-    return FileResponse(
-        path=png_path,
+    return stored_file_response(
+        request, FILE_STORAGE_PATH, file_entry.file_path_png,
         filename=file_entry.original_filename,
         media_type="image/png"
     )
 
 @app.post("/tools/converted-files/{file_id}/delete")
-async def delete_converted_file(file_id: int, db: Session = Depends(get_db)):
+def delete_converted_file(file_id: int, db: Session = Depends(get_db)):
     """Lösche eine gespeicherte Konvertierung"""
     file_entry = db.query(ConvertedFile).filter(ConvertedFile.id == file_id).first()
     if not file_entry:
         raise HTTPException(status_code=404, detail="Datei nicht gefunden")
     
-    # Lösche physische Dateien
-    png_path = FILE_STORAGE_PATH / file_entry.file_path_png
-    svg_path = FILE_STORAGE_PATH / file_entry.file_path_svg
-    
-    png_path.unlink(missing_ok=True)
-    svg_path.unlink(missing_ok=True)
+    if file_entry.png_sha256:
+        # Blobs nur löschen, wenn sie kein anderer Eintrag mehr verwendet
+        orphaned = [blob_store.release(db, file_entry.png_sha256),
+                    blob_store.release(db, file_entry.svg_sha256)]
+        if file_entry.svgz_sha256:
+            orphaned.append(blob_store.release(db, file_entry.svgz_sha256))
+    else:
+        # Ältere Einträge mit eigenen Dateien
+        orphaned = [FILE_STORAGE_PATH / file_entry.file_path_png,
+                    FILE_STORAGE_PATH / file_entry.file_path_svg]
     
-    # Lösche DB-Eintrag
+    # Lösche DB-Eintrag, danach die nicht mehr verwendeten Dateien
     db.delete(file_entry)
     db.commit()
+    blob_store.remove_files(orphaned)
+    thumbnailer.discard(orphaned)
     
     return RedirectResponse(url="/tools/converted-files", status_code=303)
 
@@ -1798,7 +2239,7 @@ async def delete_converted_file(file_id: int, db: Session = Depends(get_db)):
 # ========================================
 
 @app.post("/products/{product_id}/images/upload")
-async def upload_product_image(
+def upload_product_image(
     product_id: int,
     request: Request,
     image: UploadFile = File(...),
@@ -1822,24 +2263,14 @@ async def upload_product_image(
         )
     
     try:
-        # Generiere eindeutigen Dateinamen
-        file_id = str(uuid.uuid4())
-        date_folder = datetime.now().strftime("%Y/%m")
-        storage_subdir = FILE_STORAGE_PATH / "products" / date_folder
-        storage_subdir.mkdir(parents=True, exist_ok=True)
-        
         # Dateiendung bestimmen
         ext = image.filename.split('.')[-1].lower()
         if ext not in ['png', 'jpg', 'jpeg', 'webp']:
             ext = 'png'
         
-        filename = f"{file_id}.{ext}"
-        file_path = storage_subdir / filename
-        
-        # Speichere Datei
-        content = await image.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # Datei blockweise speichern und inhaltsadressiert ablegen (gleiche Bilder nur einmal)
+        staged = blob_store.stage_stream(image.file, image.filename)
+        blob = blob_store.add_staged(db, staged, f".{ext}")
         
         # Falls is_primary gesetzt, setze alle anderen Bilder auf nicht-primary
         if is_primary:
@@ -1851,15 +2282,17 @@ async def upload_product_image(
         product_image = ProductImage(
             product_id=product_id,
             original_filename=image.filename,
-            stored_filename=file_id,
-            file_path=str(Path("products") / date_folder / filename),
-            file_size_bytes=len(content),
+            stored_filename=str(uuid.uuid4()),
+            file_path=blob.path,
+            file_size_bytes=staged.size_bytes,
             mime_type=image.content_type,
             description=description if description else None,
             is_primary=is_primary
         )
         db.add(product_image)
         db.commit()
+        image_index.put(product_image)
+        thumbnailer.pregenerate(product_image.file_path)
         
         return RedirectResponse(
             url=f"/products/{product_id}?success=Bild erfolgreich hochgeladen", 
@@ -1874,24 +2307,45 @@ async def upload_product_image(
 
 
 @app.get("/product-images/{image_id}")
-async def get_product_image(image_id: int, db: Session = Depends(get_db)):
-    """Zeige ein Produktbild an"""
-    image = db.query(ProductImage).filter(ProductImage.id == image_id).first()
+def get_product_image(request: Request, image_id: int, w: int = 0):
+    """Zeige ein Produktbild an
+
+    Mit ?w= wird eine verkleinerte Variante (WebP oder JPEG) ausgeliefert.
+    Pfad und Typ kommen aus dem image_index (keine Datenbankabfrage pro Bild).
+    Synchron im Threadpool: Das Laden des Index, Nachladen einzelner Bilder
+    und die Dateizugriffe blockieren sonst die Event-Loop.
+    """
+    image = image_index.get(image_id)
     if not image:
         raise HTTPException(status_code=404, detail="Bild nicht gefunden")
     
     file_path = FILE_STORAGE_PATH / image.file_path
     if not file_path.exists():
+        image_index.forget(image_id)
         raise HTTPException(status_code=404, detail="Datei nicht gefunden")
     
-    return FileResponse(
-        path=file_path,
-        media_type=image.mime_type or "image/png"
+    width = variant_width(w) if w > 0 else None
+    if width:
+        fmt = variant_format(request.headers.get("accept", ""))
+        future = thumbnailer.get(image.file_path, width, fmt)
+        try:
+            variant = future.result() if future is not None else None
+        except Exception:
+            variant = None  # Kein lesbares Bild (protokolliert und gemerkt) - Original ausliefern
+        if variant is not None:
+            return stored_file_response(
+                request, FILE_STORAGE_PATH, str(variant.relative_to(FILE_STORAGE_PATH)),
+                media_type=f"image/{fmt}", headers={"Vary": "Accept"}
+            )
+    
+    return stored_file_response(
+        request, FILE_STORAGE_PATH, image.file_path,
+        media_type=image.mime_type
     )
 
 
 @app.post("/product-images/{image_id}/delete")
-async def delete_product_image(image_id: int, db: Session = Depends(get_db)):
+def delete_product_image(image_id: int, db: Session = Depends(get_db)):
     """Lösche ein Produktbild"""
     image = db.query(ProductImage).filter(ProductImage.id == image_id).first()
     if not image:
@@ -1899,19 +2353,25 @@ async def delete_product_image(image_id: int, db: Session = Depends(get_db)):
     
     product_id = image.product_id
     
-    # Lösche physische Datei
-    file_path = FILE_STORAGE_PATH / image.file_path
-    file_path.unlink(missing_ok=True)
+    # Bilder im Blob-Speicher können mehrfach verwendet werden - nur die Referenz freigeben
+    sha256 = blob_store.sha256_of(image.file_path)
+    if sha256:
+        orphaned = [blob_store.release(db, sha256)]
+    else:
+        orphaned = [FILE_STORAGE_PATH / image.file_path]
     
-    # Lösche DB-Eintrag
+    # Lösche DB-Eintrag, danach die Datei (falls nicht mehr verwendet)
     db.delete(image)
     db.commit()
+    image_index.forget(image_id)
+    blob_store.remove_files(orphaned)
+    thumbnailer.discard(orphaned)
     
     return RedirectResponse(url=f"/products/{product_id}", status_code=303)
 
 
 @app.post("/product-images/{image_id}/set-primary")
-async def set_primary_image(image_id: int, db: Session = Depends(get_db)):
+def set_primary_image(image_id: int, db: Session = Depends(get_db)):
     """Setze ein Bild als Hauptbild"""
     image = db.query(ProductImage).filter(ProductImage.id == image_id).first()
     if not image:
@@ -1930,7 +2390,7 @@ async def set_primary_image(image_id: int, db: Session = Depends(get_db)):
 
 
 @app.post("/products/{product_id}/images/link-svg")
-async def link_svg_to_product(
+def link_svg_to_product(
     product_id: int,
     converted_file_id: int = Form(...),
     description: str = Form(""),
@@ -1947,6 +2407,11 @@ async def link_svg_to_product(
     if not converted_file:
         raise HTTPException(status_code=404, detail="SVG nicht gefunden")
     
+    # PNG-Vorschau aus dem Blob-Speicher wird mitverwendet
+    if converted_file.png_sha256:
+        png_blob = db.query(FileBlob).filter(FileBlob.sha256 == converted_file.png_sha256).first()
+        blob_store.add_ref(db, png_blob)
+    
     # Erstelle Verknüpfung
     product_image = ProductImage(
         product_id=product_id,
@@ -1960,6 +2425,8 @@ async def link_svg_to_product(
     )
     db.add(product_image)
     db.commit()
+    image_index.put(product_image)
+    thumbnailer.pregenerate(product_image.file_path)
     
     return RedirectResponse(
         url=f"/products/{product_id}?success=SVG erfolgreich verknüpft", 
@@ -1996,19 +2463,27 @@ def seed_article_categories(db: Session):
         )
         db.add(cat)
     
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # Gleichzeitig von einem anderen Prozess angelegt
+        return
     print("Standard-Artikelkategorien wurden initialisiert.")
 
 
 @app.get("/articles", response_class=HTMLResponse)
-async def list_articles(
+def list_articles(
     request: Request, 
     category_id: int = None,
     search: str = "",
+    after: str = "",
+    before: str = "",
+    limit: int = DEFAULT_PAGE_SIZE,
+    format: str = "",
     db: Session = Depends(get_db)
 ):
-    """Liste aller Artikel mit Filter"""
-    query = db.query(Article)
+    """Liste aller Artikel mit Filter (seitenweise)"""
+    query = with_profile(db.query(Article), "articles.list")
     
     if category_id:
         query = query.filter(Article.category_id == category_id)
@@ -2020,12 +2495,15 @@ async def list_articles(
             (Article.description.ilike(f"%{search}%"))
         )
     
-    articles = query.filter(Article.is_active == 1).order_by(Article.article_number).all()
+    page = paginate(query.filter(Article.is_active == 1), "articles", after, before, limit)
+    if format == "json":
+        return JSONResponse(page.to_dict([row_dict(a) for a in page.items]))
     categories = db.query(ArticleCategory).filter(ArticleCategory.is_active == 1).order_by(ArticleCategory.name).all()
     
     return templates.TemplateResponse("articles/list.html", {
         "request": request,
-        "articles": articles,
+        "articles": page.items,
+        "page": page,
         "categories": categories,
         "selected_category": category_id,
         "search": search
@@ -2033,7 +2511,7 @@ async def list_articles(
 
 
 @app.get("/articles/new", response_class=HTMLResponse)
-async def new_article_form(request: Request, product_id: int = None, db: Session = Depends(get_db)):
+def new_article_form(request: Request, product_id: int = None, db: Session = Depends(get_db)):
     """Formular für neuen Artikel - optional mit vorausgefülltem Produkt"""
     categories = db.query(ArticleCategory).filter(ArticleCategory.is_active == 1).order_by(ArticleCategory.name).all()
     products = db.query(Product).order_by(Product.name).all()
@@ -2049,7 +2527,7 @@ async def new_article_form(request: Request, product_id: int = None, db: Session
     if product_id:
         selected_product = db.query(Product).filter(Product.id == product_id).first()
         if selected_product:
-            product_costs = selected_product.calculate_costs()
+            product_costs = get_product_cost(db, product_id)
     
     return templates.TemplateResponse("articles/form.html", {
         "request": request,
@@ -2064,7 +2542,7 @@ async def new_article_form(request: Request, product_id: int = None, db: Session
 
 
 @app.post("/articles")
-async def create_article(
+def create_article(
     request: Request,
     category_id: int = Form(...),
     linked_product_id: str = Form(""),
@@ -2086,8 +2564,8 @@ async def create_article(
     if not category:
         raise HTTPException(status_code=400, detail="Ungültige Kategorie")
     
-    # Automatische Artikelnummer generieren
-    article_number = category.generate_article_number()
+    # Automatische Artikelnummer vergeben (Zähler der Kategorie)
+    article_number = next_article_number(db, category)
     
     # Produkt-ID verarbeiten (kann leer sein)
     product_id = int(linked_product_id) if linked_product_id else None
@@ -2095,9 +2573,8 @@ async def create_article(
     # Wenn Produkt verknüpft, EK aus Produktionskosten übernehmen
     final_purchase_price = parse_decimal(purchase_price)
     if product_id:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        if product:
-            costs = product.calculate_costs()
+        costs = get_product_cost(db, product_id)
+        if costs:
             final_purchase_price = costs['total_cost']
     
     # Artikel erstellen
@@ -2114,20 +2591,17 @@ async def create_article(
         is_active=1
     )
     db.add(article)
-    
-    # Nummernzähler erhöhen
-    category.increment_number()
-    
     db.commit()
     db.refresh(article)
+    search_changed("articles")
     
     return RedirectResponse(url=f"/articles/{article.id}", status_code=303)
 
 
 @app.get("/articles/{article_id}", response_class=HTMLResponse)
-async def view_article(article_id: int, request: Request, db: Session = Depends(get_db)):
+def view_article(article_id: int, request: Request, db: Session = Depends(get_db)):
     """Artikel-Detailansicht"""
-    article = db.query(Article).filter(Article.id == article_id).first()
+    article = with_profile(db.query(Article), "articles.detail").filter(Article.id == article_id).first()
     if not article:
         raise HTTPException(status_code=404, detail="Artikel nicht gefunden")
     
@@ -2138,7 +2612,7 @@ async def view_article(article_id: int, request: Request, db: Session = Depends(
 
 
 @app.get("/articles/{article_id}/edit", response_class=HTMLResponse)
-async def edit_article_form(article_id: int, request: Request, db: Session = Depends(get_db)):
+def edit_article_form(article_id: int, request: Request, db: Session = Depends(get_db)):
     """Formular zum Bearbeiten eines Artikels"""
     article = db.query(Article).filter(Article.id == article_id).first()
     if not article:
@@ -2156,7 +2630,7 @@ async def edit_article_form(article_id: int, request: Request, db: Session = Dep
 
 
 @app.post("/articles/{article_id}")
-async def update_article(
+def update_article(
     article_id: int,
     request: Request,
     category_id: int = Form(...),
@@ -2185,12 +2659,13 @@ async def update_article(
     
     db.commit()
     db.refresh(article)
+    search_changed("articles")
     
     return RedirectResponse(url=f"/articles/{article.id}", status_code=303)
 
 
 @app.post("/articles/{article_id}/delete")
-async def delete_article(article_id: int, db: Session = Depends(get_db)):
+def delete_article(article_id: int, db: Session = Depends(get_db)):
     """Artikel soft-delete (auf inaktiv setzen)"""
     article = db.query(Article).filter(Article.id == article_id).first()
     if not article:
@@ -2198,13 +2673,14 @@ async def delete_article(article_id: int, db: Session = Depends(get_db)):
     
     article.is_active = 0
     db.commit()
+    search_changed("articles")
     
     return RedirectResponse(url="/articles", status_code=303)
 
 
 # Artikelkategorien-Verwaltung
 @app.get("/article-categories", response_class=HTMLResponse)
-async def list_article_categories(request: Request, db: Session = Depends(get_db)):
+def list_article_categories(request: Request, db: Session = Depends(get_db)):
     """Liste aller Artikelkategorien"""
     categories = db.query(ArticleCategory).order_by(ArticleCategory.name).all()
     return templates.TemplateResponse("articles/category_list.html", {
@@ -2214,7 +2690,7 @@ async def list_article_categories(request: Request, db: Session = Depends(get_db
 
 
 @app.post("/article-categories")
-async def create_article_category(
+def create_article_category(
     request: Request,
     code: str = Form(...),
     name: str = Form(...),
@@ -2240,18 +2716,19 @@ async def create_article_category(
 
 # API-Endpunkt für Artikel-Suche (Autocomplete)
 @app.get("/api/articles/search")
-async def search_articles_api(q: str = "", limit: int = 10, db: Session = Depends(get_db)):
+def search_articles_api(q: str = "", limit: int = 10, db: Session = Depends(get_db)):
     """API-Endpunkt für Artikel-Suche (Autocomplete)"""
+    q = normalize_query(q)  # Derselbe Wert für Cache-Schlüssel und Suche
     if not q or len(q) < 2:
         return []
     
-    articles = db.query(Article).filter(
-        Article.is_active == 1,
-        (Article.name.ilike(f"%{q}%")) |
-        (Article.article_number.ilike(f"%{q}%"))
-    ).limit(limit).all()
+    cached = search_cache.get("articles", q, limit)
+    if cached is not None:
+        return cached
+    
+    articles = search(db, "articles", q, limit)
     
-    return [
+    result = [
         {
             "id": a.id,
             "article_number": a.article_number,
@@ -2263,22 +2740,28 @@ async def search_articles_api(q: str = "", limit: int = 10, db: Session = Depend
         }
         for a in articles
     ]
+    search_cache.put("articles", q, limit, result)
+    return result
 
 
 # API-Endpunkt für Produkt-Suche (Autocomplete für Artikel-Erstellung)
 @app.get("/api/products/search")
-async def search_products_api(q: str = "", limit: int = 20, db: Session = Depends(get_db)):
+def search_products_api(q: str = "", limit: int = 20, db: Session = Depends(get_db)):
     """API-Endpunkt für Produkt-Suche (Autocomplete)"""
-    query = db.query(Product)
-    
-    if q and len(q) >= 1:
-        query = query.filter(Product.name.ilike(f"%{q}%"))
+    q = normalize_query(q)  # Derselbe Wert für Cache-Schlüssel und Suche
+    cached = search_cache.get("products", q, limit)
+    if cached is not None:
+        return cached
     
-    products = query.order_by(Product.name).limit(limit).all()
+    if q:
+        products = search(db, "products", q, limit)
+    else:
+        products = db.query(Product).order_by(Product.name).limit(limit).all()
+    all_costs = get_product_costs(db, [p.id for p in products])
     
     result = []
     for p in products:
-        costs = p.calculate_costs()
+        costs = all_costs[p.id]
         result.append({
             "id": p.id,
             "name": p.name,
@@ -2287,44 +2770,118 @@ async def search_products_api(q: str = "", limit: int = 20, db: Session = Depend
             "display": f"{p.name} (EK: {costs['total_cost']:.2f} €)"
         })
     
+    search_cache.put("products", q, limit, result)
     return result
 
 
-# ========================================# RECHNUNGS-VERWALTUNG
+@app.get("/api/search/cache-stats")
+def search_cache_stats():
+    """Trefferquote und Verdrängungen des Autocomplete-Caches"""
+    return search_cache.stats()
+
+
+@app.get("/api/system/db-pool")
+def db_pool_stats():
+    """Auslastung des Connection-Pools (gilt für den antwortenden Worker-Prozess)"""
+    return pool_metrics.stats()
+
+
+# ========================================
+# STAMMDATEN IMPORT/EXPORT
 # ========================================
 
-def generate_invoice_number(db: Session) -> str:
-    """Generiert die nächste Rechnungsnummer (RE-YYYY-XXXX)"""
-    current_year = datetime.now().year
-    prefix = f"RE-{current_year}-"
-    
-    # Suche die höchste Nummer für dieses Jahr
-    latest_invoice = db.query(Invoice).filter(
-        Invoice.invoice_number.like(f"{prefix}%")
-    ).order_by(Invoice.invoice_number.desc()).first()
-    
-    if latest_invoice:
-        # Extrahiere Nummer aus z.B. "RE-2024-0042"
+@app.get("/api/catalog/{kind}/export")
+def export_catalog(kind: str, format: str = "csv"):
+    """Materialien, Maschinen oder Produkte als CSV/JSON (gestreamt, siehe catalog_io.py)"""
+    if kind not in CATALOGS:
+        raise HTTPException(status_code=404, detail="Unbekannter Katalog")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Format muss csv oder json sein")
+    export, media_type = EXPORT_FORMATS[format]
+
+    def stream():
+        # Eigene Session - die der Abhängigkeit ist beim Streamen schon geschlossen
+        db = SessionLocal()
         try:
-            last_num = int(latest_invoice.invoice_number.split("-")[-1])
-            next_num = last_num + 1
-        except:
-            next_num = 1
-    else:
-        next_num = 1
-    
-    return f"{prefix}{str(next_num).zfill(4)}"
+            yield from export(db, kind)
+        finally:
+            db.close()
+
+    return StreamingResponse(stream(), media_type=media_type, headers={
+        "content-disposition": f'attachment; filename="{kind}.{format}"'
+    })
+
+
+@app.post("/api/catalog/{kind}/import")
+def import_catalog_file(kind: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """Materialien, Maschinen oder Produkte aus CSV/JSON anlegen bzw. aktualisieren (Upsert über id)"""
+    if kind not in CATALOGS:
+        raise HTTPException(status_code=404, detail="Unbekannter Katalog")
+    try:
+        result = import_catalog(db, kind, read_rows(file.file, file.filename or ""))
+    except RowFileError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    # Kosten aller betroffenen Produkte in einem Durchgang neu berechnen
+    catalog_changed(db, result)
+    return JSONResponse(result.to_dict())
+
 
+# ========================================
+# BUCHHALTUNGS-EXPORT
+# ========================================
+
+@app.get("/api/accounting/{kind}/export")
+def export_accounting(
+    kind: str,
+    format: str = "csv",
+    year: str = "",
+    quarter: str = "",
+    date_from: str = "",
+    date_to: str = ""
+):
+    """Rechnungen oder Verkaufsaufträge eines Zeitraums als CSV/XLSX (gestreamt, siehe accounting_export.py)"""
+    if kind not in ACCOUNTING_EXPORTS:
+        raise HTTPException(status_code=404, detail="Unbekannter Export")
+    if format not in ACCOUNTING_FORMATS:
+        raise HTTPException(status_code=400, detail="Format muss csv oder xlsx sein")
+    try:
+        # Leere Formularfelder kommen als "" - daher Jahr/Quartal als Text
+        period = export_period(year, quarter, date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    export, media_type = ACCOUNTING_FORMATS[format]
+
+    def stream():
+        # Eigene Session - die der Abhängigkeit ist beim Streamen schon geschlossen
+        db = SessionLocal()
+        try:
+            yield from export(db, kind, period)
+        finally:
+            db.close()
+
+    filename = f"{ACCOUNTING_EXPORTS[kind][0].lower()}_{period.label}.{format}"
+    return StreamingResponse(stream(), media_type=media_type, headers={
+        "content-disposition": f'attachment; filename="{filename}"'
+    })
+
+
+# ========================================# RECHNUNGS-VERWALTUNG
+# ========================================
 
 @app.get("/invoices", response_class=HTMLResponse)
-async def list_invoices(
+def list_invoices(
     request: Request,
     status: str = "",
     search: str = "",
+    after: str = "",
+    before: str = "",
+    limit: int = DEFAULT_PAGE_SIZE,
+    format: str = "",
     db: Session = Depends(get_db)
 ):
-    """Liste aller Rechnungen"""
-    query = db.query(Invoice)
+    """Liste aller Rechnungen (seitenweise)"""
+    query = with_profile(db.query(Invoice), "invoices.list")
     
     if status:
         query = query.filter(Invoice.status == status)
@@ -2335,18 +2892,21 @@ async def list_invoices(
             (Invoice.customer_name.ilike(f"%{search}%"))
         )
     
-    invoices = query.order_by(Invoice.created_at.desc()).all()
+    page = paginate(query, "invoices", after, before, limit)
+    if format == "json":
+        return JSONResponse(page.to_dict([row_dict(i) for i in page.items]))
     
     return templates.TemplateResponse("invoices/list.html", {
         "request": request,
-        "invoices": invoices,
+        "invoices": page.items,
+        "page": page,
         "filter_status": status,
         "search": search
     })
 
 
 @app.get("/invoices/new", response_class=HTMLResponse)
-async def new_invoice_form(
+def new_invoice_form(
     request: Request,
     sales_order_id: int = None,
     customer_id: int = None,
@@ -2363,7 +2923,7 @@ async def new_invoice_form(
         customer = db.query(Customer).filter(Customer.id == customer_id).first()
     
     # Generiere Vorschau der Rechnungsnummer
-    invoice_number_preview = generate_invoice_number(db)
+    invoice_number_preview = preview_invoice_number(db)
     
     # Lade aktive Artikel für Dropdown
     articles = db.query(Article).filter(Article.is_active == 1).order_by(Article.name).all()
@@ -2381,9 +2941,10 @@ async def new_invoice_form(
 
 
 @app.post("/invoices")
-async def create_invoice(
+def create_invoice(
     request: Request,
-    invoice_number: str = Form(...),
+    invoice_number: str = Form(""),
+    suggested_invoice_number: str = Form(""),
     customer_id: int = Form(None),
     customer_name: str = Form(""),
     customer_address: str = Form(""),
@@ -2410,6 +2971,17 @@ async def create_invoice(
             customer_name = customer.display_name
             customer_address = customer.full_address
     
+    # Unveränderte Vorschau (oder leer): Nummer erst jetzt vergeben - die
+    # Vorschau kann inzwischen von einer anderen Rechnung belegt sein
+    invoice_number = invoice_number.strip()
+    if not invoice_number or invoice_number == suggested_invoice_number:
+        invoice_number = next_invoice_number(db)
+    else:
+        # Von Hand eingegeben: der Zähler darf diese Nummer später nicht mehr vergeben
+        claim_invoice_number(db, invoice_number)
+        if db.query(Invoice.id).filter(Invoice.invoice_number == invoice_number).first():
+            raise HTTPException(status_code=400, detail=f"Rechnungsnummer {invoice_number} ist bereits vergeben")
+    
     # Rechnung erstellen
     invoice = Invoice(
         invoice_number=invoice_number,
@@ -2424,56 +2996,38 @@ async def create_invoice(
         footer_text=footer_text if footer_text else None,
         status="draft"
     )
-    db.add(invoice)
-    db.commit()
-    db.refresh(invoice)
     
-    # Positionen hinzufügen
-    total_net = 0
+    # Positionen sammeln (nur mit Beschreibung)
+    lines = []
     for i in range(len(position_desc)):
-        if position_desc[i].strip():  # Nur wenn Beschreibung vorhanden
-            qty = parse_decimal(position_qty[i]) if i < len(position_qty) else 1
-            price = parse_decimal(position_price[i]) if i < len(position_price) else 0
-            item_total = qty * price
-            
-            article_id = int(position_article_id[i]) if i < len(position_article_id) and position_article_id[i] else None
-            
-            item = InvoiceItem(
-                invoice_id=invoice.id,
-                position=i + 1,
-                article_id=article_id,
-                article_number=None,  # Wird unten gefüllt wenn Artikel vorhanden
+        if position_desc[i].strip():
+            lines.append(InvoiceLine(
                 description=position_desc[i],
-                quantity=qty,
+                quantity=parse_decimal(position_qty[i]) if i < len(position_qty) else 1,
                 unit=position_unit[i] if i < len(position_unit) else "Stück",
-                unit_price_net=price,
-                total_net=item_total
-            )
-            
-            # Wenn Artikel verknüpft, Artikelnummer kopieren
-            if article_id:
-                article = db.query(Article).filter(Article.id == article_id).first()
-                if article:
-                    item.article_number = article.article_number
-            
-            db.add(item)
-            total_net += item_total
-    
-    # Summen berechnen
-    invoice.total_net = total_net
-    invoice.vat_amount = total_net * (float(invoice.vat_rate) / 100)
-    invoice.total_gross = invoice.total_net + invoice.vat_amount
+                unit_price_net=parse_decimal(position_price[i]) if i < len(position_price) else 0,
+                article_id=int(position_article_id[i]) if i < len(position_article_id) and position_article_id[i] else None
+            ))
     
+    # Summen berechnen - Kopf und Positionen in einer Transaktion
+    for key, value in invoice_totals(lines, invoice.vat_rate).items():
+        setattr(invoice, key, value)
+    db.add(invoice)
+    db.flush()
+    try:
+        insert_invoice_items(db, invoice.id, lines)
+    except UnknownReference as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     db.commit()
-    db.refresh(invoice)
     
     return RedirectResponse(url=f"/invoices/{invoice.id}", status_code=303)
 
 
 @app.get("/invoices/{invoice_id}", response_class=HTMLResponse)
-async def view_invoice(invoice_id: int, request: Request, db: Session = Depends(get_db)):
+def view_invoice(invoice_id: int, request: Request, db: Session = Depends(get_db)):
     """Rechnungs-Detailansicht"""
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+    invoice = with_profile(db.query(Invoice), "invoices.detail").filter(Invoice.id == invoice_id).first()
     if not invoice:
         raise HTTPException(status_code=404, detail="Rechnung nicht gefunden")
     
@@ -2484,9 +3038,9 @@ async def view_invoice(invoice_id: int, request: Request, db: Session = Depends(
 
 
 @app.get("/invoices/{invoice_id}/print", response_class=HTMLResponse)
-async def print_invoice(invoice_id: int, request: Request, db: Session = Depends(get_db)):
+def print_invoice(invoice_id: int, request: Request, db: Session = Depends(get_db)):
     """Druckansicht der Rechnung"""
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+    invoice = with_profile(db.query(Invoice), "invoices.detail").filter(Invoice.id == invoice_id).first()
     if not invoice:
         raise HTTPException(status_code=404, detail="Rechnung nicht gefunden")
     
@@ -2498,7 +3052,7 @@ async def print_invoice(invoice_id: int, request: Request, db: Session = Depends
 
 
 @app.post("/invoices/{invoice_id}/status")
-async def update_invoice_status(
+def update_invoice_status(
     invoice_id: int,
     status: str = Form(...),
     db: Session = Depends(get_db)
@@ -2520,7 +3074,7 @@ async def update_invoice_status(
 
 
 @app.post("/invoices/{invoice_id}/delete")
-async def delete_invoice(invoice_id: int, db: Session = Depends(get_db)):
+def delete_invoice(invoice_id: int, db: Session = Depends(get_db)):
     """Rechnung löschen (nur wenn Status 'draft')"""
     invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
     if not invoice:
@@ -2543,23 +3097,17 @@ async def delete_invoice(invoice_id: int, db: Session = Depends(get_db)):
 # KUNDEN-VERWALTUNG
 # =============================================================================
 
-def generate_customer_number(db: Session) -> str:
-    """Generiert die nächste Kundennummer (K-0001, K-0002, ...)"""
-    last_customer = db.query(Customer).order_by(Customer.id.desc()).first()
-    next_num = 1
-    if last_customer and last_customer.customer_number:
-        # Versuche Nummer aus letzter Kundennummer zu extrahieren
-        try:
-            parts = last_customer.customer_number.split('-')
-            if len(parts) == 2 and parts[1].isdigit():
-                next_num = int(parts[1]) + 1
-        except:
-            pass
-    return f"K-{next_num:04d}"
-
 @app.get("/customers", response_class=HTMLResponse)
-async def list_customers(request: Request, search: str = "", db: Session = Depends(get_db)):
-    """Kundenliste mit Suche"""
+def list_customers(
+    request: Request,
+    search: str = "",
+    after: str = "",
+    before: str = "",
+    limit: int = DEFAULT_PAGE_SIZE,
+    format: str = "",
+    db: Session = Depends(get_db)
+):
+    """Kundenliste mit Suche (seitenweise)"""
     query = db.query(Customer).filter(Customer.is_active == 1)
     
     if search:
@@ -2572,18 +3120,21 @@ async def list_customers(request: Request, search: str = "", db: Session = Depen
         )
         query = query.filter(search_filter)
     
-    customers = query.order_by(Customer.last_name, Customer.first_name).all()
+    page = paginate(query, "customers", after, before, limit)
+    if format == "json":
+        return JSONResponse(page.to_dict([row_dict(c) for c in page.items]))
     
     return templates.TemplateResponse("customers/list.html", {
         "request": request,
-        "customers": customers,
+        "customers": page.items,
+        "page": page,
         "search": search
     })
 
 @app.get("/customers/new", response_class=HTMLResponse)
-async def new_customer_form(request: Request, db: Session = Depends(get_db)):
+def new_customer_form(request: Request, db: Session = Depends(get_db)):
     """Formular für neuen Kunden"""
-    customer_number = generate_customer_number(db)
+    customer_number = preview_customer_number(db)
     
     return templates.TemplateResponse("customers/form.html", {
         "request": request,
@@ -2593,9 +3144,9 @@ async def new_customer_form(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.post("/customers")
-async def create_customer(
+def create_customer(
     request: Request,
-    customer_number: str = Form(...),
+    customer_number: str = Form(""),  # Nur Vorschau - vergeben wird beim Speichern
     company_name: str = Form(""),
     first_name: str = Form(...),
     last_name: str = Form(...),
@@ -2612,7 +3163,7 @@ async def create_customer(
 ):
     """Neuen Kunden anlegen"""
     customer = Customer(
-        customer_number=customer_number,
+        customer_number=next_customer_number(db),
         company_name=company_name if company_name else None,
         first_name=first_name,
         last_name=last_name,
@@ -2631,18 +3182,19 @@ async def create_customer(
     db.add(customer)
     db.commit()
     db.refresh(customer)
+    search_changed("customers")
     
     return RedirectResponse(url=f"/customers/{customer.id}", status_code=303)
 
 @app.get("/customers/{customer_id}", response_class=HTMLResponse)
-async def view_customer(customer_id: int, request: Request, db: Session = Depends(get_db)):
+def view_customer(customer_id: int, request: Request, db: Session = Depends(get_db)):
     """Kunden-Detailansicht"""
     customer = db.query(Customer).filter(Customer.id == customer_id).first()
     if not customer:
         raise HTTPException(status_code=404, detail="Kunde nicht gefunden")
     
     # Rechnungen des Kunden laden
-    invoices = db.query(Invoice).filter(
+    invoices = with_profile(db.query(Invoice), "invoices.list").filter(
         Invoice.customer_id == customer_id
     ).order_by(Invoice.invoice_date.desc()).all()
     
@@ -2653,7 +3205,7 @@ async def view_customer(customer_id: int, request: Request, db: Session = Depend
     })
 
 @app.get("/customers/{customer_id}/edit", response_class=HTMLResponse)
-async def edit_customer_form(customer_id: int, request: Request, db: Session = Depends(get_db)):
+def edit_customer_form(customer_id: int, request: Request, db: Session = Depends(get_db)):
     """Formular zum Bearbeiten eines Kunden"""
     customer = db.query(Customer).filter(Customer.id == customer_id).first()
     if not customer:
@@ -2667,7 +3219,7 @@ async def edit_customer_form(customer_id: int, request: Request, db: Session = D
     })
 
 @app.post("/customers/{customer_id}")
-async def update_customer(
+def update_customer(
     customer_id: int,
     request: Request,
     company_name: str = Form(""),
@@ -2703,11 +3255,12 @@ async def update_customer(
     customer.notes = notes if notes else None
     
     db.commit()
+    search_changed("customers")
     
     return RedirectResponse(url=f"/customers/{customer_id}", status_code=303)
 
 @app.post("/customers/{customer_id}/delete")
-async def delete_customer(customer_id: int, db: Session = Depends(get_db)):
+def delete_customer(customer_id: int, db: Session = Depends(get_db)):
     """Kunden als inaktiv markieren (Soft Delete)"""
     customer = db.query(Customer).filter(Customer.id == customer_id).first()
     if not customer:
@@ -2723,25 +3276,24 @@ async def delete_customer(customer_id: int, db: Session = Depends(get_db)):
         # Hard Delete: Kunden ohne Rechnungen komplett löschen
         db.delete(customer)
         db.commit()
+    search_changed("customers")
     
     return RedirectResponse(url="/customers", status_code=303)
 
 @app.get("/api/customers/search")
-async def search_customers(q: str = "", db: Session = Depends(get_db)):
+def search_customers(q: str = "", db: Session = Depends(get_db)):
     """AJAX API für Kundensuche (für Rechnungsformular)"""
+    q = normalize_query(q)  # Derselbe Wert für Cache-Schlüssel und Suche
     if len(q) < 2:
         return []
     
-    customers = db.query(Customer).filter(
-        Customer.is_active == 1
-    ).filter(
-        (Customer.customer_number.ilike(f"%{q}%")) |
-        (Customer.company_name.ilike(f"%{q}%")) |
-        (Customer.first_name.ilike(f"%{q}%")) |
-        (Customer.last_name.ilike(f"%{q}%"))
-    ).limit(10).all()
+    cached = search_cache.get("customers", q, 10)
+    if cached is not None:
+        return cached
     
-    return [
+    customers = search(db, "customers", q, 10)
+    
+    result = [
         {
             "id": c.id,
             "customer_number": c.customer_number,
@@ -2756,19 +3308,18 @@ async def search_customers(q: str = "", db: Session = Depends(get_db)):
         }
         for c in customers
     ]
+    search_cache.put("customers", q, 10, result)
+    return result
 
 
-# ========================================# Initialisiere Standarddaten
-# ========================================
-
-# Starte Initialisierung der Artikelkategorien
-db = SessionLocal()
-try:
-    seed_article_categories(db)
-finally:
-    db.close()
-
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=5000)
+    import sys
+    if sys.argv[1:] == ["--prepare"]:
+        # Nur die Datenbank vorbereiten (gunicorn-Master vor dem Start der Worker)
+        wait_for_database()
+        blob_store.prepare()
+        prepare_database()
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Numeric, Text, DateTime, ForeignKey, JSON
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -110,7 +110,7 @@ class Product(Base):
     __tablename__ = "products"
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(255), nullable=False)
+    name = Column(String(255), nullable=False, index=True)
     product_type = Column(String(50), nullable=False)  # '3d_print', 'sticker_sheet', 'diecut_sticker', etc.
     category = Column(String(100), default="Sonstiges")
     
@@ -449,6 +449,34 @@ class Product(Base):
         return "Kein Material"
 
 
+class ProductCostSnapshot(Base):
+    """Gespeicherte Kostenkalkulation je Produkt
+
+    Wird nur neu berechnet, wenn sich Eingangsdaten des Produkts ändern
+    (Produkt, Material, Maschine, Komponenten oder STROM_PREIS_KWH).
+    """
+    __tablename__ = "product_cost_snapshots"
+    
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    
+    # Wichtigste Werte als Spalten (für Auswertungen in SQL)
+    total_cost = Column(Numeric(10, 2), nullable=False, default=0)
+    material_cost = Column(Numeric(10, 2), nullable=False, default=0)
+    machine_cost = Column(Numeric(10, 2), nullable=False, default=0)
+    labor_cost = Column(Numeric(10, 2), nullable=False, default=0)
+    
+    # Vollständige Aufschlüsselung (Ergebnis von Product.calculate_costs())
+    costs = Column(JSON, nullable=False)
+    
+    # Strompreis zum Zeitpunkt der Berechnung (Änderung -> Snapshot veraltet)
+    strom_preis_kwh = Column(Numeric(6, 4), nullable=False)
+    
+    computed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"ProductCostSnapshot(Product {self.product_id}: {self.total_cost} €)"
+
+
 class Feedback(Base):
     """Feedback-Tabelle für Änderungswünsche und Anregungen"""
     __tablename__ = "feedback"
@@ -484,6 +512,20 @@ class Idea(Base):
         return f"Idea({self.subject or self.content[:30]}...)"
 
 
+class FileBlob(Base):
+    """Inhaltsadressierte Datei im Speicher (siehe blob_store.py)"""
+    __tablename__ = "file_blobs"
+    
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String(500), nullable=False)  # Relativer Pfad unter FILE_STORAGE_PATH
+    size_bytes = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # Anzahl verwendender Einträge
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"FileBlob({self.sha256[:12]}, refs={self.ref_count})"
+
+
 class ConvertedFile(Base):
     """Gespeicherte PNG-zu-SVG Konvertierungen"""
     __tablename__ = "converted_files"
@@ -495,6 +537,8 @@ class ConvertedFile(Base):
     file_path_svg = Column(String(500), nullable=False)  # Relativer Pfad zur SVG
     original_size_bytes = Column(Integer, nullable=True)
     svg_size_bytes = Column(Integer, nullable=True)
+    svg_raw_size_bytes = Column(Integer, nullable=True)  # vtracer-Ausgabe vor der Optimierung
+    file_path_svgz = Column(String(500), nullable=True)  # Optional: gzip-Variante (.svgz)
     
     # Konvertierungs-Optionen (für Dokumentation/Re-Konvertierung)
     conversion_mode = Column(String(50), default="spline")  # 'spline' oder 'pixel'
@@ -504,7 +548,14 @@ class ConvertedFile(Base):
     description = Column(String(500), nullable=True)
     tags = Column(String(255), nullable=True)  # Komma-getrennte Tags
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Inhalts-Hashes der Blobs (leer bei älteren Einträgen mit eigenen Dateien)
+    png_sha256 = Column(String(64), nullable=True)
+    svg_sha256 = Column(String(64), nullable=True)
+    svgz_sha256 = Column(String(64), nullable=True)
+    # SHA-256 über Bild-Hash + Konvertierungs-Parameter - gleiche Eingabe, gleiches SVG
+    conversion_key = Column(String(64), nullable=True, index=True)
+    
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)  # Sortierschlüssel der Liste
     
     def __repr__(self):
         return f"ConvertedFile({self.original_filename})"
@@ -514,6 +565,46 @@ class ConvertedFile(Base):
         if self.original_size_bytes and self.svg_size_bytes and self.original_size_bytes > 0:
             return round((1 - self.svg_size_bytes / self.original_size_bytes) * 100, 1)
         return 0
+    
+    def get_optimization_percent(self):
+        """Einsparung durch die SVG-Optimierung in Prozent (None ohne Optimierung)"""
+        if self.svg_raw_size_bytes and self.svg_size_bytes and self.svg_raw_size_bytes != self.svg_size_bytes:
+            return round((1 - self.svg_size_bytes / self.svg_raw_size_bytes) * 100, 1)
+        return None
+
+
+class ConversionJob(Base):
+    """PNG-zu-SVG Konvertierung in der Warteschlange (läuft im Prozess-Pool)"""
+    __tablename__ = "conversion_jobs"
+    
+    id = Column(String(36), primary_key=True)  # UUID, auch Name der temporären Dateien
+    batch_id = Column(String(36), nullable=True, index=True)  # Stapel-Konvertierung (mehrere Dateien/ZIP)
+    status = Column(String(20), nullable=False, default="queued")  # 'queued', 'done', 'failed'
+    original_filename = Column(String(255), nullable=False)
+    options = Column(JSON, nullable=False)  # vtracer-Parameter
+    
+    # Speicher-Optionen aus dem Formular
+    save_file = Column(Integer, default=1)
+    description = Column(String(500), nullable=True)
+    tags = Column(String(255), nullable=True)
+    
+    # Ergebnis
+    png_sha256 = Column(String(64), nullable=True)  # Hash des Uploads (beim Hochladen berechnet)
+    conversion_key = Column(String(64), nullable=True)  # siehe ConvertedFile.conversion_key
+    svg_sha256 = Column(String(64), nullable=True)  # Ergebnis aus dem Cache (vorhandener Blob)
+    original_size_bytes = Column(Integer, nullable=True)
+    svg_size_bytes = Column(Integer, nullable=True)
+    svg_raw_size_bytes = Column(Integer, nullable=True)  # vor der Optimierung
+    converted_file_id = Column(Integer, ForeignKey("converted_files.id", ondelete="SET NULL"), nullable=True)
+    error = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    
+    converted_file = relationship("ConvertedFile")
+    
+    def __repr__(self):
+        return f"ConversionJob({self.id}, {self.status})"
 
 
 class ProductImage(Base):
@@ -660,6 +751,9 @@ class SalesOrder(Base):
     order_number = Column(String(50), nullable=True)  # Optional: Auftragsnummer
     customer_name = Column(String(255), nullable=True)  # Optional: Kundenname
     
+    # Herkunft importierter Aufträge ('<Quelle>:<Auftragsnummer>', siehe order_import.py)
+    import_key = Column(String(120), nullable=True, unique=True, index=True)
+    
     # Verpackung und Versand (werden hier separat erfasst)
     packaging_cost = Column(Numeric(10, 2), default=0)  # Tatsächliche Verpackungskosten
     shipping_cost = Column(Numeric(10, 2), default=0)  # Tatsächliche Versandkosten
@@ -673,7 +767,7 @@ class SalesOrder(Base):
     notes = Column(Text, nullable=True)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)  # Sortierschlüssel der Liste
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     produced_at = Column(DateTime, nullable=True)  # Wann produziert
     shipped_at = Column(DateTime, nullable=True)  # Wann versendet
@@ -747,10 +841,6 @@ class ArticleCategory(Base):
         """Generiert die nächste Artikelnummer für diese Kategorie"""
         number_str = str(self.next_number).zfill(4)  # 0001, 0002, etc.
         return f"{self.prefix}{number_str}"
-    
-    def increment_number(self):
-        """Erhöht den Nummernzähler"""
-        self.next_number += 1
 
 
 class Article(Base):
@@ -824,7 +914,7 @@ class Customer(Base):
     
     # Ansprechpartner
     first_name = Column(String(100), nullable=True)
-    last_name = Column(String(100), nullable=False)
+    last_name = Column(String(100), nullable=False, index=True)
     
     # Adresse
     address_line1 = Column(String(255), nullable=True)  # Straße + Nr
@@ -920,7 +1010,7 @@ class Invoice(Base):
     footer_text = Column(Text, nullable=True)  # Text am Ende der Rechnung
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)  # Sortierschlüssel der Liste
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     sent_at = Column(DateTime, nullable=True)  # Wann verschickt
     paid_at = Column(DateTime, nullable=True)  # Wann bezahlt
@@ -987,3 +1077,18 @@ class InvoiceItem(Base):
     def calculate_total(self):
         """Berechnet den Gesamtbetrag"""
         return float(self.quantity) * float(self.unit_price_net)
+
+
+# =============================================================================
+# NUMMERNKREISE
+# =============================================================================
+
+class NumberSequence(Base):
+    """Zähler für fortlaufende Belegnummern (siehe numbering.py)"""
+    __tablename__ = "number_sequences"
+    
+    name = Column(String(50), primary_key=True)  # z.B. 'invoice:2026', 'customer'
+    next_value = Column(Integer, nullable=False, default=1)  # Nächste freie Nummer
+    
+    def __repr__(self):
+        return f"NumberSequence({self.name}: {self.next_value})"
@@ -0,0 +1,159 @@
+"""Fortlaufende Belegnummern (Rechnungen, Kunden, Artikel)
+
+Bisher wurde die letzte vergebene Nummer gesucht (Sortierung aller Rechnungen
+bzw. Kunden) und um eins erhöht. Zwei gleichzeitige Anfragen bekamen dabei
+dieselbe Nummer, eine davon scheiterte am Unique-Constraint. Jetzt vergibt ein
+einzelnes UPDATE ... RETURNING auf einem Zähler die Nummer - ohne Suche:
+
+- Rechnungen: Zähler 'invoice:<Jahr>' in number_sequences (RE-2026-0001, je Jahr ab 1)
+- Kunden: Zähler 'customer' in number_sequences (K-0001)
+- Artikel: next_number der Kategorie (eigener Zähler je Präfix)
+
+Das UPDATE sperrt nur die eine Zählerzeile bis zum Commit und läuft in
+derselben Transaktion wie das Speichern des Belegs. Schlägt das Speichern
+fehl, wird die Nummer mit zurückgenommen - anders als bei Postgres-Sequenzen
+entstehen so keine Lücken (wichtig für Rechnungsnummern).
+
+Fehlt ein Zähler (neues Jahr oder Daten aus der Zeit vor den Zählern), wird er
+einmalig aus den vorhandenen Nummern initialisiert.
+
+Von Hand eingegebene Rechnungsnummern aus der automatischen Reihe (z.B.
+RE-2026-0042) setzen den Zähler über diese Nummer (claim_invoice_number) -
+sonst würde der Zähler sie später noch einmal vergeben.
+"""
+from datetime import datetime
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import ArticleCategory, Customer, Invoice, NumberSequence
+
+NUMBER_DIGITS = 4
+CUSTOMER_PREFIX = "K-"
+
+
+def invoice_prefix(year: int = None) -> str:
+    return f"RE-{year or datetime.now().year}-"
+
+
+def format_number(prefix: str, value: int) -> str:
+    return f"{prefix}{str(value).zfill(NUMBER_DIGITS)}"
+
+
+def _first_free(db: Session, column, prefix: str) -> int:
+    """Nächste Nummer nach der höchsten vorhandenen mit diesem Präfix (nur beim Anlegen eines Zählers)"""
+    highest = 0
+    for (number,) in db.query(column).filter(column.like(f"{prefix}%")):
+        tail = number[len(prefix):]
+        if tail.isdigit():
+            highest = max(highest, int(tail))
+    return highest + 1
+
+
+def _increment(db: Session, name: str):
+    """Erhöht den Zähler und gibt den vergebenen Wert zurück - None, wenn es ihn nicht gibt"""
+    value = db.execute(
+        update(NumberSequence)
+        .where(NumberSequence.name == name)
+        .values(next_value=NumberSequence.next_value + 1)
+        .returning(NumberSequence.next_value)
+    ).scalar()
+    return None if value is None else value - 1
+
+
+def next_value(db: Session, name: str, first_value) -> int:
+    """Vergibt den nächsten Wert des Zählers name (gültig ab dem Commit der Transaktion)
+
+    first_value: Funktion, die den ersten Wert liefert, falls der Zähler noch nicht existiert
+    """
+    value = _increment(db, name)
+    if value is not None:
+        return value
+    try:
+        with db.begin_nested():
+            value = first_value()
+            db.add(NumberSequence(name=name, next_value=value + 1))
+        return value
+    except IntegrityError:
+        # Gleichzeitig von einer anderen Anfrage angelegt
+        return _increment(db, name)
+
+
+def raise_value(db: Session, name: str, value: int, first_value):
+    """Setzt den Zähler name mindestens auf value + 1 (value gilt damit als vergeben)"""
+    next_value = NumberSequence.next_value
+    updated = db.execute(
+        update(NumberSequence)
+        .where(NumberSequence.name == name)
+        .values(next_value=case((next_value <= value, value + 1), else_=next_value))
+        .returning(NumberSequence.next_value)
+    ).scalar()
+    if updated is not None:
+        return
+    try:
+        with db.begin_nested():
+            db.add(NumberSequence(name=name, next_value=max(first_value(), value + 1)))
+    except IntegrityError:
+        # Gleichzeitig von einer anderen Anfrage angelegt
+        raise_value(db, name, value, first_value)
+
+
+def peek_value(db: Session, name: str, first_value) -> int:
+    """Wert, den der Zähler als nächstes vergibt (nur zur Anzeige, nichts wird reserviert)"""
+    value = db.query(NumberSequence.next_value).filter(NumberSequence.name == name).scalar()
+    return value if value is not None else first_value()
+
+
+def _invoice_sequence(db: Session, year: int = None):
+    year = year or datetime.now().year
+    prefix = invoice_prefix(year)
+    return prefix, f"invoice:{year}", lambda: _first_free(db, Invoice.invoice_number, prefix)
+
+
+def next_invoice_number(db: Session, year: int = None) -> str:
+    """Vergibt die nächste Rechnungsnummer (RE-YYYY-XXXX)"""
+    prefix, name, first_value = _invoice_sequence(db, year)
+    return format_number(prefix, next_value(db, name, first_value))
+
+
+def preview_invoice_number(db: Session, year: int = None) -> str:
+    prefix, name, first_value = _invoice_sequence(db, year)
+    return format_number(prefix, peek_value(db, name, first_value))
+
+
+def claim_invoice_number(db: Session, number: str):
+    """Von Hand vergebene Rechnungsnummer: Zähler des Jahres darüber hinaus setzen
+
+    Nur Nummern, die der Zähler selbst vergeben würde (RE-YYYY-XXXX), sonst nichts.
+    Sperrt die Zählerzeile bis zum Commit - danach erst auf Duplikate prüfen.
+    """
+    parts = number.split("-")
+    if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+        return
+    year, value = int(parts[1]), int(parts[2])
+    prefix, name, first_value = _invoice_sequence(db, year)
+    if value > 0 and format_number(prefix, value) == number:
+        raise_value(db, name, value, first_value)
+
+
+def _customer_first_value(db: Session):
+    return lambda: _first_free(db, Customer.customer_number, CUSTOMER_PREFIX)
+
+
+def next_customer_number(db: Session) -> str:
+    """Vergibt die nächste Kundennummer (K-0001, K-0002, ...)"""
+    return format_number(CUSTOMER_PREFIX, next_value(db, "customer", _customer_first_value(db)))
+
+
+def preview_customer_number(db: Session) -> str:
+    return format_number(CUSTOMER_PREFIX, peek_value(db, "customer", _customer_first_value(db)))
+
+
+def next_article_number(db: Session, category: ArticleCategory) -> str:
+    """Vergibt die nächste Artikelnummer der Kategorie (Präfix + next_number)"""
+    value = db.execute(
+        update(ArticleCategory)
+        .where(ArticleCategory.id == category.id)
+        .values(next_number=ArticleCategory.next_number + 1)
+        .returning(ArticleCategory.next_number)
+    ).scalar()
+    return format_number(category.prefix, value - 1)
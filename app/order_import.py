@@ -0,0 +1,292 @@
+"""Import von Marktplatz-Bestellungen (CSV / JSON) als Verkaufsaufträge
+
+Exporte von Etsy, Shopify & Co. werden zeilenweise gelesen (row_files.py),
+Positionen über vorab geladene Nachschlage-Tabellen zugeordnet und in
+Blöcken von CHUNK_ORDERS Aufträgen geschrieben - je Block ein INSERT für die
+Köpfe, eines für alle Positionen und ein Commit. Der Speicherbedarf hängt
+damit nur von der Blockgröße und dem Katalog ab, nicht von der Dateigröße.
+
+Eine Zeile ist eine Position. Aufeinanderfolgende Zeilen mit derselben
+Auftragsnummer bilden einen Auftrag. Spalten (Groß-/Kleinschreibung egal):
+
+- order_number (Pflicht), customer_name, notes
+- sku: Artikelnummer (Article.article_number) oder Produktname
+- product: Produktname (wenn sku fehlt oder nicht passt)
+- quantity (Standard 1), unit_price, cost_per_unit (Standard: EK des
+  Artikels bzw. Selbstkosten des Produkts)
+- shipping_cost, packaging_cost: gelten für den Auftrag (erste Zeile zählt)
+
+JSON: ein Array oder eine Datei mit einem Objekt je Zeile (NDJSON). Objekte
+mit einer Liste "items" werden wie mehrere Zeilen behandelt (Kopf-Felder
+gelten für alle Positionen).
+
+Ein Auftrag wird nur einmal importiert: import_key = '<Quelle>:<Auftragsnummer>'
+ist eindeutig, schon vorhandene Aufträge werden übersprungen. Aufträge mit
+unbekannten Positionen werden übersprungen und als Fehler gemeldet, ebenso
+Auftragsnummern, die in der Datei später noch einmal (nicht direkt
+anschließend) auftauchen - diese Zeilen werden nicht nachträglich angehängt.
+
+Kommandozeile: python order_import.py bestellungen.csv --source etsy
+"""
+import itertools
+import json
+from typing import Iterator, NamedTuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from line_items import SalesOrderLine, bulk_insert, sales_order_item_rows
+from models import Article, Product, ProductCostSnapshot, SalesOrder, SalesOrderItem
+from row_files import normalize_row, read_rows
+
+CHUNK_ORDERS = 500
+MAX_ERRORS = 100  # Weitere Fehler werden nur gezählt
+_AMBIGUOUS = object()  # Produktname kommt mehrfach vor
+_INVALID_ITEM = "_invalid_item"  # Markiert Einträge in "items", die kein Objekt sind
+
+
+class ImportResult:
+    """Zusammenfassung eines Imports"""
+
+    def __init__(self):
+        self.rows = 0
+        self.orders_imported = 0
+        self.items_imported = 0
+        self.orders_skipped = 0  # Bereits importiert
+        self.orders_failed = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(message)
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "orders_imported": self.orders_imported,
+            "items_imported": self.items_imported,
+            "orders_skipped": self.orders_skipped,
+            "orders_failed": self.orders_failed,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def expand_items(rows) -> Iterator[dict]:
+    """Aufträge mit einer Liste "items" (JSON) in eine Zeile je Position aufteilen"""
+    for row in rows:
+        items = row.get("items")
+        if isinstance(items, list):
+            header = {key: value for key, value in row.items() if key != "items"}
+            for item in items:
+                if isinstance(item, dict):
+                    yield {**header, **normalize_row(item)}
+                else:
+                    # Fehler meldet parse_order - der ganze Auftrag wird übersprungen
+                    yield {**header, _INVALID_ITEM: True}
+        else:
+            yield row
+
+
+# ---------------------------------------------------------------------------
+# Zuordnung
+# ---------------------------------------------------------------------------
+
+class CatalogLookup:
+    """SKU/Name -> Produkt oder Artikel, einmal pro Import geladen"""
+
+    def __init__(self, articles: dict, products: dict):
+        self.articles = articles  # article_number -> (id, Einkaufspreis)
+        self.products = products  # Name (casefold) -> (id, Selbstkosten) oder _AMBIGUOUS
+
+    @classmethod
+    def load(cls, db: Session) -> "CatalogLookup":
+        articles = {
+            number: (article_id, float(price or 0))
+            for article_id, number, price in db.query(Article.id, Article.article_number, Article.purchase_price)
+        }
+        products = {}
+        rows = db.query(Product.id, Product.name, ProductCostSnapshot.total_cost).outerjoin(
+            ProductCostSnapshot, ProductCostSnapshot.product_id == Product.id
+        )
+        for product_id, name, total_cost in rows:
+            key = (name or "").strip().casefold()
+            products[key] = _AMBIGUOUS if key in products else (product_id, float(total_cost or 0))
+        return cls(articles, products)
+
+    def resolve(self, sku: str, name: str):
+        """(item_type, id, Kosten) oder None, wenn nichts (eindeutig) passt"""
+        if sku and sku in self.articles:
+            return ("article", *self.articles[sku])
+        for candidate in filter(None, (sku, name)):
+            match = self.products.get(candidate.casefold())
+            if match is not None and match is not _AMBIGUOUS:
+                return ("product", *match)
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+
+class ParsedOrder(NamedTuple):
+    header: dict
+    lines: list
+
+
+def _number(value, default: float = 0.0) -> float:
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(str(value).replace(",", "."))
+
+
+def _first(rows: list, key: str):
+    return next((row[key] for row in rows if row.get(key) not in (None, "")), None)
+
+
+def group_orders(rows, result: ImportResult):
+    """(Auftragsnummer, Zeilen) für aufeinanderfolgende Zeilen desselben Auftrags"""
+    def numbered():
+        for row_number, row in enumerate(rows, start=1):
+            result.rows = row_number
+            order_number = str(row.get("order_number") or "").strip()
+            if not order_number:
+                result.error(f"Zeile {row_number}: order_number fehlt")
+                continue
+            yield order_number, row_number, row
+
+    for order_number, group in itertools.groupby(numbered(), key=lambda entry: entry[0]):
+        yield order_number, [(row_number, row) for _, row_number, row in group]
+
+
+def parse_order(order_number: str, rows: list, lookup: CatalogLookup, source: str, result: ImportResult):
+    """ParsedOrder oder None (Fehler werden in result gesammelt)"""
+    lines = []
+    for row_number, row in rows:
+        if row.get(_INVALID_ITEM):
+            result.error(f"Zeile {row_number} (Auftrag {order_number}): Position ist kein Objekt")
+            return None
+        sku, name = str(row.get("sku") or "").strip(), str(row.get("product") or "").strip()
+        match = lookup.resolve(sku, name)
+        if match is None:
+            result.error(f"Zeile {row_number} (Auftrag {order_number}): '{sku or name}' nicht gefunden")
+            return None
+        item_type, ref_id, cost = match
+        try:
+            lines.append(SalesOrderLine(
+                item_type=item_type,
+                product_id=ref_id if item_type == "product" else None,
+                article_id=ref_id if item_type == "article" else None,
+                quantity=int(_number(row.get("quantity"), 1)),
+                unit_price=_number(row.get("unit_price")),
+                cost_per_unit=_number(row.get("cost_per_unit"), cost),
+            ))
+        except ValueError:
+            result.error(f"Zeile {row_number} (Auftrag {order_number}): Ungültige Zahl")
+            return None
+
+    plain_rows = [row for _, row in rows]
+    try:
+        shipping_cost = _number(_first(plain_rows, "shipping_cost"))
+        packaging_cost = _number(_first(plain_rows, "packaging_cost"))
+    except ValueError:
+        result.error(f"Auftrag {order_number}: Ungültige Versand-/Verpackungskosten")
+        return None
+    header = {
+        "order_number": order_number[:50],
+        "import_key": f"{source}:{order_number}"[:120],
+        "customer_name": (_first(plain_rows, "customer_name") or None),
+        "shipping_cost": shipping_cost,
+        "packaging_cost": packaging_cost,
+        "notes": _first(plain_rows, "notes") or f"Import ({source})",
+        "status": "pending",
+    }
+    return ParsedOrder(header, lines)
+
+
+def _write_chunk(db: Session, orders: list, result: ImportResult):
+    """Schreibt einen Block neuer Aufträge (bereits importierte werden übersprungen)"""
+    by_key = {}
+    for order in orders:
+        if order.header["import_key"] in by_key:
+            # Nur bei gekürzten, gleich beginnenden Auftragsnummern möglich
+            result.orders_failed += 1
+            result.error(f"Auftrag {order.header['order_number']}: Import-Schlüssel doppelt")
+        else:
+            by_key[order.header["import_key"]] = order
+
+    for attempt in range(2):
+        existing = {
+            key for (key,) in db.query(SalesOrder.import_key).filter(SalesOrder.import_key.in_(by_key))
+        }
+        new_orders = [order for key, order in by_key.items() if key not in existing]
+        try:
+            ids = dict(
+                (key, order_id) for order_id, key in
+                bulk_insert(db, SalesOrder, [order.header for order in new_orders],
+                            SalesOrder.id, SalesOrder.import_key)
+            )
+            item_rows = [
+                row for order in new_orders
+                for row in sales_order_item_rows(ids[order.header["import_key"]], order.lines)
+            ]
+            bulk_insert(db, SalesOrderItem, item_rows)
+            db.commit()
+        except IntegrityError:
+            # Dieselben Aufträge wurden gleichzeitig importiert - neu prüfen
+            db.rollback()
+            if attempt:
+                raise
+            continue
+        result.orders_skipped += len(existing)
+        result.orders_imported += len(new_orders)
+        result.items_imported += len(item_rows)
+        return
+
+
+def import_orders(db: Session, rows, source: str = "import", chunk_size: int = CHUNK_ORDERS) -> ImportResult:
+    """Importiert Zeilen (z.B. aus read_rows) als Verkaufsaufträge"""
+    source = (source or "import").strip().lower()
+    result = ImportResult()
+    lookup = CatalogLookup.load(db)
+    seen = set()  # Auftragsnummern dieser Datei (nur die Nummern, nicht die Zeilen)
+    chunk = []
+    for order_number, order_rows in group_orders(expand_items(rows), result):
+        if order_number in seen:
+            result.orders_failed += 1
+            result.error(f"Zeile {order_rows[0][0]}: Auftrag {order_number} nicht zusammenhängend "
+                         f"(Zeilen eines Auftrags müssen aufeinander folgen)")
+            continue
+        seen.add(order_number)
+        order = parse_order(order_number, order_rows, lookup, source, result)
+        if order is None:
+            result.orders_failed += 1
+            continue
+        chunk.append(order)
+        if len(chunk) >= chunk_size:
+            _write_chunk(db, chunk, result)
+            chunk = []
+    if chunk:
+        _write_chunk(db, chunk, result)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Marktplatz-Bestellungen als Verkaufsaufträge importieren")
+    parser.add_argument("file", help="CSV- oder JSON-Datei")
+    parser.add_argument("--source", default="import", help="Quelle, z.B. etsy (Teil des Import-Schlüssels)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ORDERS)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        with open(args.file, "rb") as f:
+            summary = import_orders(db, read_rows(f, args.file), args.source, args.chunk_size)
+    finally:
+        db.close()
+    print(json.dumps(summary.to_dict(), indent=2, ensure_ascii=False))
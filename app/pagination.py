@@ -0,0 +1,147 @@
+"""Keyset-Pagination (Seek-Methode) für Listenansichten
+
+Statt OFFSET wird ab dem Sortierwert des letzten angezeigten Eintrags
+weitergelesen ("WHERE (name, id) > (:name, :id) ORDER BY name, id LIMIT n").
+Die Datenbank springt dabei über den Index direkt an die richtige Stelle -
+die Ladezeit einer Seite bleibt unabhängig von der Tabellengröße gleich.
+
+Ein Cursor enthält die Sortierwerte eines Eintrags (Base64-kodiertes JSON).
+Die ID ist immer letzter Sortierschlüssel, damit die Reihenfolge auch bei
+gleichen Werten (z.B. gleicher Nachname) eindeutig und stabil ist.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Query
+from models import (Product, Material, Machine, SalesOrder, Invoice, Customer, Article,
+                    ConvertedFile)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class SortKey:
+    """Sortierschlüssel einer Liste (Spalte, Richtung, Ersatzwert für NULL)"""
+
+    def __init__(self, column, descending: bool = False, null_value=None):
+        if column.nullable and null_value is None:
+            # NULL-Werte würden beim Blättern übersprungen oder doppelt angezeigt
+            raise ValueError(f"{column}: nullable Sortierspalte braucht null_value oder NOT NULL")
+        self.attr = column.key
+        self.descending = descending
+        self.null_value = null_value
+        # NULL lässt sich nicht vergleichen - nullable Spalten brauchen einen Ersatzwert
+        self.expr = func.coalesce(column, null_value) if null_value is not None else column
+
+    def value(self, obj):
+        value = getattr(obj, self.attr)
+        return self.null_value if value is None else value
+
+
+# Sortierung je Liste - entspricht der bisherigen order_by()-Reihenfolge plus ID
+SORT_ORDERS = {
+    "products": (SortKey(Product.name), SortKey(Product.id)),
+    "materials": (SortKey(Material.material_type), SortKey(Material.name), SortKey(Material.id)),
+    "machines": (SortKey(Machine.machine_type), SortKey(Machine.name), SortKey(Machine.id)),
+    "sales_orders": (SortKey(SalesOrder.created_at, descending=True), SortKey(SalesOrder.id, descending=True)),
+    "invoices": (SortKey(Invoice.created_at, descending=True), SortKey(Invoice.id, descending=True)),
+    "customers": (SortKey(Customer.last_name), SortKey(Customer.first_name, null_value=""), SortKey(Customer.id)),
+    "articles": (SortKey(Article.article_number), SortKey(Article.id)),
+    "converted_files": (SortKey(ConvertedFile.created_at, descending=True), SortKey(ConvertedFile.id, descending=True)),
+}
+
+
+def encode_cursor(values) -> str:
+    """Sortierwerte -> URL-sicherer Cursor"""
+    data = [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, count: int) -> list:
+    """Cursor -> Sortierwerte (HTTP 400 bei ungültigem Cursor)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        if not isinstance(data, list) or len(data) != count:
+            raise ValueError
+        return [datetime.fromisoformat(v["dt"]) if isinstance(v, dict) else v for v in data]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Ungültiger Seiten-Cursor")
+
+
+class Page:
+    """Eine Seite einer Liste mit Cursors für die Nachbarseiten"""
+
+    def __init__(self, items, limit, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.limit = limit
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def url(self, request, **params) -> str:
+        """URL der aktuellen Seite mit anderem Cursor (Filter bleiben erhalten)"""
+        url = request.url.remove_query_params(["after", "before", "format"])
+        return str(url.include_query_params(**params))
+
+    def to_dict(self, items=None) -> dict:
+        """JSON-Variante der Seite"""
+        return {
+            "items": jsonable_encoder(self.items if items is None else items),
+            "limit": self.limit,
+            "next_cursor": self.next_cursor,
+            "prev_cursor": self.prev_cursor,
+        }
+
+
+def row_dict(obj) -> dict:
+    """Alle Spalten eines Datensatzes als dict (für die JSON-Varianten)"""
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+
+def _seek_condition(keys, values, reverse: bool):
+    """(k1, k2, ...) > (v1, v2, ...) unter Beachtung der Sortierrichtung je Schlüssel"""
+    conditions = []
+    for i, key in enumerate(keys):
+        equal = [k.expr == v for k, v in zip(keys[:i], values[:i])]
+        after = key.expr < values[i] if key.descending != reverse else key.expr > values[i]
+        conditions.append(and_(*equal, after))
+    return or_(*conditions)
+
+
+def paginate(query: Query, order: str, after: str = "", before: str = "",
+             limit: int = DEFAULT_PAGE_SIZE) -> Page:
+    """Lädt eine Seite der Abfrage in der Sortierung SORT_ORDERS[order]
+
+    after: Einträge nach diesem Cursor (nächste Seite)
+    before: Einträge vor diesem Cursor (vorherige Seite)
+    """
+    keys = SORT_ORDERS[order]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    reverse = bool(before) and not after
+    cursor = after or before
+
+    if cursor:
+        query = query.filter(_seek_condition(keys, decode_cursor(cursor, len(keys)), reverse))
+    query = query.order_by(*[
+        k.expr.desc() if k.descending != reverse else k.expr.asc() for k in keys
+    ])
+
+    # Ein Eintrag mehr als nötig zeigt an, ob es dahinter weitergeht
+    items = query.limit(limit + 1).all()
+    has_more = len(items) > limit
+    items = items[:limit]
+    if reverse:
+        items.reverse()
+    if not items:
+        return Page(items, limit)
+
+    first = encode_cursor([k.value(items[0]) for k in keys])
+    last = encode_cursor([k.value(items[-1]) for k in keys])
+    if reverse:
+        return Page(items, limit, next_cursor=last, prev_cursor=first if has_more else None)
+    return Page(items, limit, next_cursor=last if has_more else None, prev_cursor=first if cursor else None)
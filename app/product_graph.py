@@ -0,0 +1,83 @@
+"""Abhängigkeitsgraph zwischen Produkten
+
+Zusammenbau-Produkte (Assembly) verweisen über ProductComponent.linked_product_id
+auf andere Produkte. Ändern sich deren Kosten, müssen alle Assemblies, die sie
+(auch indirekt) enthalten, neu kalkuliert werden - und zwar in topologischer
+Reihenfolge, damit jede Assembly mit den bereits aktualisierten Kosten ihrer
+Komponenten rechnet.
+"""
+from collections import defaultdict, deque
+from sqlalchemy.orm import Session
+from models import ProductComponent
+
+
+class DependencyCycleError(ValueError):
+    """Zirkuläre Verknüpfung zwischen Produkten (z.B. A enthält B, B enthält A)"""
+
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Zirkuläre Produktverknüpfung: {self.product_ids}")
+
+
+class ProductGraph:
+    """Kanten Assembly -> verknüpftes Produkt"""
+
+    def __init__(self, edges):
+        self.links = defaultdict(set)       # assembly_id -> verknüpfte Produkte
+        self.dependents = defaultdict(set)  # product_id -> Assemblies, die es enthalten
+        for assembly_id, linked_id in edges:
+            self.links[assembly_id].add(linked_id)
+            self.dependents[linked_id].add(assembly_id)
+
+    def dependents_of(self, product_ids) -> set:
+        """Alle Assemblies, die eines der Produkte direkt oder indirekt enthalten"""
+        result = set()
+        queue = deque(product_ids)
+        while queue:
+            pid = queue.popleft()
+            for parent in self.dependents.get(pid, ()):
+                if parent not in result:
+                    result.add(parent)
+                    queue.append(parent)
+        return result
+
+    def topological_order(self, product_ids, strict: bool = True) -> list:
+        """Sortiert die Produkte so, dass Komponenten vor ihren Assemblies stehen
+
+        Bei einem Zyklus wird DependencyCycleError ausgelöst (strict=True)
+        oder die betroffenen Produkte werden am Ende angehängt (strict=False).
+        """
+        nodes = set(product_ids)
+        pending = {pid: len(self.links.get(pid, set()) & nodes) for pid in nodes}
+        queue = deque(sorted(pid for pid, count in pending.items() if count == 0))
+        order = []
+        while queue:
+            pid = queue.popleft()
+            order.append(pid)
+            for parent in sorted(self.dependents.get(pid, set()) & nodes):
+                pending[parent] -= 1
+                if pending[parent] == 0:
+                    queue.append(parent)
+
+        if len(order) < len(nodes):
+            remaining = nodes - set(order)
+            if strict:
+                raise DependencyCycleError(remaining)
+            order.extend(sorted(remaining))
+        return order
+
+    def would_create_cycle(self, assembly_id: int, linked_ids) -> bool:
+        """Prüft, ob die Verknüpfung assembly_id -> linked_ids einen Zyklus erzeugt"""
+        linked_ids = set(linked_ids)
+        if assembly_id in linked_ids:
+            return True
+        # Zyklus, wenn die Assembly selbst (indirekt) in einem der Produkte steckt
+        return bool(linked_ids & self.dependents_of([assembly_id]))
+
+
+def load_product_graph(db: Session) -> ProductGraph:
+    """Lädt alle Produktverknüpfungen in einer Abfrage"""
+    edges = db.query(ProductComponent.product_id, ProductComponent.linked_product_id).filter(
+        ProductComponent.linked_product_id.isnot(None)
+    ).distinct().all()
+    return ProductGraph(edges)
@@ -0,0 +1,81 @@
+"""Zeilenweises Lesen von CSV- und JSON-Dateien (Importe)
+
+Alle Leser sind Generatoren und lesen die Datei blockweise - auch Dateien mit
+Hunderttausenden Zeilen brauchen nur wenig Speicher. Spaltennamen werden
+vereinheitlicht (ohne Leerzeichen, klein geschrieben).
+
+- CSV: Trennzeichen , oder ; (wird an der Kopfzeile erkannt)
+- JSON: ein Array von Objekten oder ein Objekt je Zeile (NDJSON)
+"""
+import csv
+import io
+import itertools
+import json
+from typing import Iterator
+
+JSON_READ_SIZE = 64 * 1024
+MAX_JSON_OBJECT = 1024 * 1024  # Größtes einzelnes Objekt (Schutz vor unlesbaren Dateien)
+
+
+class RowFileError(ValueError):
+    """Datei kann nicht gelesen werden (Format, Kodierung)"""
+
+
+def normalize_row(row: dict) -> dict:
+    return {
+        str(key).strip().lower(): value.strip() if isinstance(value, str) else value
+        for key, value in row.items() if key is not None
+    }
+
+
+def read_csv(text) -> Iterator[dict]:
+    """Zeilen einer CSV-Datei"""
+    header = text.readline()
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    for row in csv.DictReader(itertools.chain([header], text), delimiter=delimiter):
+        yield normalize_row(row)
+
+
+def read_json(text) -> Iterator[dict]:
+    """Objekte aus einem JSON-Array oder NDJSON, blockweise gelesen"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    while True:
+        # Trennzeichen zwischen den Objekten überspringen
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                return
+            buffer, pos = text.read(JSON_READ_SIZE), 0
+            eof = not buffer
+            continue
+        try:
+            obj, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof or len(buffer) - pos > MAX_JSON_OBJECT:
+                raise RowFileError("Ungültiges JSON")
+            chunk = text.read(JSON_READ_SIZE)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        pos = end
+        if not isinstance(obj, dict):
+            raise RowFileError("JSON muss aus Objekten (eines je Zeile) bestehen")
+        yield normalize_row(obj)
+
+
+def read_rows(fileobj, filename: str) -> Iterator[dict]:
+    """Zeilen einer Datei (binär geöffnet) - Format anhand der Endung"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        if filename.lower().endswith((".json", ".ndjson", ".jsonl")):
+            yield from read_json(text)
+        elif filename.lower().endswith((".csv", ".txt")):
+            yield from read_csv(text)
+        else:
+            raise RowFileError(f"{filename}: Nur CSV- oder JSON-Dateien erlaubt")
+    except UnicodeDecodeError:
+        raise RowFileError(f"{filename}: Datei ist nicht UTF-8-kodiert")
+    finally:
+        text.detach()  # Das Dateiobjekt gehört dem Aufrufer
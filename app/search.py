@@ -0,0 +1,165 @@
+"""Suche für die Autocomplete-APIs (Artikel, Produkte, Kunden)
+
+PostgreSQL: Die Suchspalten haben pg_trgm-GIN-Indizes (siehe Alembic-Migration
+add_trigram_search_indexes, in neuen Datenbanken create_trigram_indexes), damit
+ILIKE '%q%' nicht mehr die ganze Tabelle liest. Zuerst werden Treffer gesucht,
+die mit q beginnen (schneller Pfad, meist reicht das für ein volles Ergebnis);
+erst wenn noch Plätze frei sind, folgen Teiltreffer sortiert nach
+Trigramm-Ähnlichkeit - ohne pg_trgm (Extension nicht installierbar) nur
+alphabetisch.
+
+Andere Datenbanken (SQLite für Tests) haben kein pg_trgm - dort wird ein
+Trigramm-Index im Speicher verwendet, der nach Änderungen über
+search_changed() neu aufgebaut wird - in anderen Worker-Prozessen spätestens
+nach SEARCH_CACHE_TTL Sekunden. search_changed() leert außerdem die
+gecachten API-Ergebnisse (search_cache).
+"""
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import Session
+from models import Article, Product, Customer
+from search_cache import SEARCH_CACHE_TTL, search_cache
+
+# Art -> (Modell, Suchspalten, Zusatzfilter); die erste Spalte bestimmt die Sortierung
+SEARCHES = {
+    "articles": (Article, ("article_number", "name"), (Article.is_active == 1,)),
+    "products": (Product, ("name",), ()),
+    "customers": (Customer, ("customer_number", "company_name", "first_name", "last_name"),
+                  (Customer.is_active == 1,)),
+}
+LIKE_ESCAPE = "!"
+
+
+def _like_pattern(q: str, prefix_only: bool) -> str:
+    """q als LIKE-Muster (% und _ im Suchbegriff werden maskiert)"""
+    escaped = q.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace("%", LIKE_ESCAPE + "%").replace("_", LIKE_ESCAPE + "_")
+    return f"{escaped}%" if prefix_only else f"%{escaped}%"
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Trigramm-Index im Speicher für eine Suchart (Fallback ohne pg_trgm)"""
+
+    def __init__(self):
+        self.entries = {}              # id -> normalisierte Suchtexte
+        self.grams = defaultdict(set)  # Trigramm -> ids
+        self.loaded = False
+        self.loaded_at = 0.0
+
+    def build(self, rows):
+        self.entries = {}
+        self.grams = defaultdict(set)
+        for row_id, *texts in rows:
+            texts = tuple((t or "").lower() for t in texts)
+            self.entries[row_id] = texts
+            for text in texts:
+                for gram in _trigrams(text):
+                    self.grams[gram].add(row_id)
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+    def is_current(self) -> bool:
+        # Änderungen aus anderen Prozessen kommen nur über die Ablaufzeit an
+        return self.loaded and time.monotonic() - self.loaded_at < SEARCH_CACHE_TTL
+
+    def search(self, q: str, limit: int) -> list:
+        """IDs der Treffer: zuerst Präfix-Treffer, dann nach Position des Treffers"""
+        q = q.lower()
+        grams = _trigrams(q)
+        if grams:
+            candidates = set.intersection(*(self.grams.get(g, set()) for g in grams))
+        else:
+            candidates = self.entries.keys()  # Suchbegriff kürzer als ein Trigramm
+
+        ranked = []
+        for row_id in candidates:
+            texts = self.entries[row_id]
+            positions = [t.find(q) for t in texts if q in t]
+            if positions:
+                ranked.append((min(positions), texts[0], row_id))
+        ranked.sort()
+        return [row_id for _, _, row_id in ranked[:limit]]
+
+
+_memory_indexes = defaultdict(TrigramIndex)
+_memory_lock = threading.Lock()
+
+
+def create_trigram_indexes(connection):
+    """pg_trgm und die GIN-Indizes der Suchspalten anlegen (wie die Migration, nur PostgreSQL)"""
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    for model, column_names, _ in SEARCHES.values():
+        table = model.__tablename__
+        for column in column_names:
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_trgm "
+                f"ON {table} USING gin ({column} gin_trgm_ops)"
+            ))
+
+
+_has_pg_trgm = False
+
+
+def _pg_trgm_installed(db: Session) -> bool:
+    """Ob similarity() verfügbar ist (nur ein positives Ergebnis wird gemerkt)"""
+    global _has_pg_trgm
+    if not _has_pg_trgm:
+        _has_pg_trgm = db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+    return _has_pg_trgm
+
+
+def search_changed(kind: str):
+    """Nach Änderungen an Artikeln/Produkten/Kunden aufrufen (Index neu laden, Cache leeren)"""
+    with _memory_lock:
+        _memory_indexes[kind].loaded = False
+    search_cache.invalidate(kind)
+
+
+def _search_postgres(db: Session, model, columns, filters, q: str, limit: int) -> list:
+    query = db.query(model).filter(*filters)
+    order_column = columns[0]
+
+    # Schneller Pfad: Präfix-Treffer
+    prefix = _like_pattern(q, prefix_only=True)
+    results = query.filter(or_(*[c.ilike(prefix, escape=LIKE_ESCAPE) for c in columns])).order_by(
+        order_column, model.id
+    ).limit(limit).all()
+    if len(results) >= limit:
+        return results
+
+    # Teiltreffer nach Trigramm-Ähnlichkeit
+    contains = _like_pattern(q, prefix_only=False)
+    rest = query.filter(or_(*[c.ilike(contains, escape=LIKE_ESCAPE) for c in columns]))
+    if results:
+        rest = rest.filter(~model.id.in_([r.id for r in results]))
+    order = [order_column, model.id]
+    if _pg_trgm_installed(db):
+        order.insert(0, func.greatest(*[func.similarity(func.coalesce(c, ""), q) for c in columns]).desc())
+    rest = rest.order_by(*order).limit(limit - len(results)).all()
+    return results + rest
+
+
+def _search_memory(db: Session, kind: str, model, columns, filters, q: str, limit: int) -> list:
+    with _memory_lock:
+        index = _memory_indexes[kind]
+        if not index.is_current():
+            index.build(db.query(model.id, *columns).filter(*filters).all())
+        ids = index.search(q, limit)
+    if not ids:
+        return []
+    objects = {o.id: o for o in db.query(model).filter(model.id.in_(ids))}
+    return [objects[i] for i in ids if i in objects]
+
+
+def search(db: Session, kind: str, q: str, limit: int) -> list:
+    """Sucht Datensätze der Art kind, deren Suchspalten q enthalten (bestes Ergebnis zuerst)"""
+    model, column_names, filters = SEARCHES[kind]
+    columns = [getattr(model, name) for name in column_names]
+    if db.bind.dialect.name == "postgresql":
+        return _search_postgres(db, model, columns, filters, q, limit)
+    return _search_memory(db, kind, model, columns, filters, q, limit)
@@ -0,0 +1,99 @@
+"""Cache für die Autocomplete-APIs
+
+Die Suchfelder in Rechnungs- und Auftragsformularen fragen bei jedem
+Tastendruck an - meist mehrfach mit demselben Suchbegriff. Ergebnisse werden
+pro (Endpunkt, normalisierter Suchbegriff, Limit) im Speicher gehalten:
+höchstens SEARCH_CACHE_SIZE Einträge (älteste zuerst verdrängt), jeweils
+höchstens SEARCH_CACHE_TTL Sekunden lang.
+
+Die Routen normalisieren den Suchbegriff mit normalize_query() einmal und
+verwenden denselben Wert für Cache-Schlüssel und Suche - sonst könnten sich
+unterschiedliche Suchen (z.B. "a  b" und "a b") einen Eintrag teilen.
+
+Schreibende Routen leeren den Cache des betroffenen Endpunkts über
+invalidate() (siehe search.search_changed). Der Cache gilt pro Prozess -
+bei mehreren Workern begrenzt die TTL, wie lange ein anderer Worker
+veraltete Treffer liefern kann.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "60"))
+
+
+def normalize_query(q: str) -> str:
+    """Suchbegriff klein geschrieben, Leerzeichen zusammengefasst (Suche ist ohnehin case-insensitiv)"""
+    return " ".join(q.lower().split())
+
+
+class SearchCache:
+    """LRU-Cache mit Ablaufzeit und Zählern für die Trefferquote"""
+
+    def __init__(self, max_size: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (endpoint, q, limit) -> (Ablaufzeit, Ergebnis)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(endpoint: str, q: str, limit: int):
+        return (endpoint, normalize_query(q), limit)
+
+    def get(self, endpoint: str, q: str, limit: int):
+        """Gecachtes Ergebnis oder None"""
+        key = self._key(endpoint, q, limit)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, endpoint: str, q: str, limit: int, result):
+        key = self._key(endpoint, q, limit)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, endpoint: str):
+        """Entfernt alle Einträge eines Endpunkts (nach Änderungen an dessen Daten)"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == endpoint]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+search_cache = SearchCache()
@@ -0,0 +1,108 @@
+"""Nachbearbeitung der vtracer-Ausgabe
+
+vtracer schreibt Koordinaten mit bis zu 16 Nachkommastellen, jede Form als
+eigenen <path> mit transform="translate(x,y)" und einen Generator-Kommentar.
+Das SVG wird dadurch oft größer als das Original-PNG. optimize_svg():
+
+- rechnet translate() in die (absoluten) Koordinaten ein und rundet sie auf
+  `precision` Nachkommastellen (Modus spline trennt mit Leerzeichen,
+  polygon und none mit Kommas - beides wird gelesen)
+- fasst direkt aufeinanderfolgende Pfade gleicher Farbe zu einem Pfad zusammen
+  (nur aufeinanderfolgende - die Zeichenreihenfolge bleibt erhalten - und nur,
+  wenn sich ihre Bounding-Boxen nicht überschneiden: mit fill-rule="nonzero"
+  würde eine Überlappung gegenläufiger Pfade im gemeinsamen Pfad zum Loch)
+- kürzt Farben (#AABBCC -> #ABC), entfernt Kommentare und überflüssige Leerzeichen
+
+Zeilen, die nicht dem bekannten vtracer-Format entsprechen, bleiben
+unverändert. Läuft in den Worker-Prozessen (siehe vectorize.py) und braucht
+deshalb nur die Standardbibliothek.
+"""
+import re
+
+DEFAULT_PRECISION = 2
+
+_PATH_RE = re.compile(
+    r'^<path d="([MLCZ0-9eE.+\-, ]*)" fill="#([0-9A-Fa-f]{6})"'
+    r'(?: transform="translate\((-?[0-9.]+),(-?[0-9.]+)\)")?\s*/>$'
+)
+_TOKEN_RE = re.compile(r"[MLCZ]|-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def format_number(value: float, precision: int) -> str:
+    text = f"{value:.{precision}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _rewrite_path(d: str, dx: float, dy: float, precision: int):
+    """Verschiebt die Koordinaten um (dx, dy), rundet und schreibt den Pfad kompakt
+
+    Gibt (Pfad, Bounding-Box) zurück. Die Box umfasst alle Stützpunkte, damit
+    auch die Kurven (die in der konvexen Hülle ihrer Stützpunkte liegen).
+    """
+    parts = []
+    previous = None
+    coordinate = 0  # Position im aktuellen Befehl: gerade = x, ungerade = y
+    xs, ys = [], []
+    for token in _TOKEN_RE.findall(d):
+        if token.isalpha():
+            coordinate = 0
+        else:
+            value = float(token) + (dx if coordinate % 2 == 0 else dy)
+            (xs if coordinate % 2 == 0 else ys).append(value)
+            token = format_number(value, precision)
+            coordinate += 1
+            # Trennzeichen nur zwischen zwei Zahlen, und nicht vor einem Minus
+            if previous is not None and not previous.isalpha() and not token.startswith("-"):
+                parts.append(" ")
+        parts.append(token)
+        previous = token
+    bbox = (min(xs), min(ys), max(xs), max(ys)) if xs and ys else None
+    return "".join(parts), bbox
+
+
+def _overlaps(a, b) -> bool:
+    """Ob sich zwei Bounding-Boxen überschneiden (Berühren an einer Kante zählt nicht)"""
+    if a is None or b is None:
+        return True
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _short_color(hex_color: str) -> str:
+    hex_color = hex_color.upper()
+    if hex_color[0::2] == hex_color[1::2]:
+        return "#" + hex_color[0::2]
+    return "#" + hex_color
+
+
+def optimize_svg(svg: str, precision: int = DEFAULT_PRECISION) -> str:
+    """Optimiert ein von vtracer erzeugtes SVG (siehe Modul-Docstring)"""
+    lines = []
+    current_fill, current_paths, current_boxes = None, [], []
+
+    def flush():
+        if current_paths:
+            lines.append(f'<path d="{"".join(current_paths)}" fill="{current_fill}"/>')
+            current_paths.clear()
+            current_boxes.clear()
+
+    for line in svg.splitlines():
+        line = line.strip()
+        if not line or (line.startswith("<!--") and line.endswith("-->")):
+            continue
+        match = _PATH_RE.match(line)
+        if match is None:
+            flush()
+            lines.append(line)
+            continue
+        d, fill, dx, dy = match.groups()
+        fill = _short_color(fill)
+        path, bbox = _rewrite_path(d, float(dx or 0), float(dy or 0), precision)
+        if fill != current_fill or any(_overlaps(bbox, other) for other in current_boxes):
+            flush()
+            current_fill = fill
+        current_paths.append(path)
+        current_boxes.append(bbox)
+    flush()
+    return "\n".join(lines) + "\n"
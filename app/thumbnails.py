@@ -0,0 +1,140 @@
+"""Verkleinerte Varianten der Produktbilder
+
+Listen und Detailseiten zeigen Produktbilder nur als kleine Vorschau - das
+Original (oft mehrere MB) wird dafür nicht gebraucht. /product-images/{id}?w=
+liefert stattdessen eine Variante in fester Breite (VARIANT_WIDTHS, angefragte
+Breite wird aufgerundet) als WebP oder - wenn der Browser kein WebP kann - JPEG.
+
+Varianten werden in einem Hintergrund-Thread mit Pillow erzeugt und unter
+FILE_STORAGE_PATH/variants abgelegt. Der Schlüssel ist der Hash des Originals
+(bei Blobs) bzw. des Dateipfads, gleiche Bilder teilen sich also ihre
+Varianten. Beim Hochladen werden die häufig gebrauchten Breiten
+(PREGENERATE_WIDTHS) schon vorab erzeugt.
+
+Originale, die Pillow nicht lesen kann, werden gemerkt (Pfad + Änderungszeit)
+und danach direkt ausgeliefert - ohne erneuten Versuch bei jedem Aufruf.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from blob_store import BlobStore
+
+VARIANT_WIDTHS = (160, 320, 640, 1280)
+PREGENERATE_WIDTHS = (320, 640)  # Produktliste und Galerie (1x/2x)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+VARIANT_QUALITY = 82
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+def variant_width(requested: int):
+    """Nächstgrößere feste Breite - None, wenn das Original ausgeliefert werden soll"""
+    for width in VARIANT_WIDTHS:
+        if requested <= width:
+            return width
+    return None
+
+
+def variant_format(accept: str) -> str:
+    return "webp" if "image/webp" in accept else "jpeg"
+
+
+class Thumbnailer:
+    """Erzeugt und cached Bildvarianten (Pillow, im Thread-Pool)"""
+
+    def __init__(self, storage_path: Path, workers: int = THUMBNAIL_WORKERS):
+        self.storage_path = storage_path
+        self.variant_dir = storage_path / "variants"
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self._pending = {}  # (Schlüssel, Breite, Format) -> Future der laufenden Erzeugung
+        self._failed = set()  # (Pfad, mtime) von Originalen, aus denen keine Variante entsteht
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def source_key(file_path: str) -> str:
+        return BlobStore.sha256_of(file_path) or hashlib.sha256(file_path.encode()).hexdigest()
+
+    def _key_dir(self, key: str) -> Path:
+        return self.variant_dir / key[:2] / key
+
+    def variant_path(self, file_path: str, width: int, fmt: str) -> Path:
+        return self._key_dir(self.source_key(file_path)) / f"{width}.{fmt}"
+
+    def _generate(self, file_path: str, width: int, fmt: str) -> Path:
+        from PIL import Image, ImageOps  # erst bei Bedarf laden (Startzeit)
+
+        target = self.variant_path(file_path, width, fmt)
+        if target.exists():
+            return target
+        with Image.open(self.storage_path / file_path) as original:
+            img = ImageOps.exif_transpose(original)
+            img.thumbnail((width, width * 10), Image.LANCZOS)  # nur verkleinern, Seitenverhältnis bleibt
+            if fmt == "jpeg" and img.mode != "RGB":
+                # JPEG kennt keine Transparenz - auf weißen Hintergrund legen
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel("A"))
+            elif img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # Erst unter temporärem Namen schreiben, damit nie halbe Dateien ausgeliefert werden
+            tmp = target.with_name(f".{uuid.uuid4()}{target.suffix}")
+            img.save(tmp, VARIANT_FORMATS[fmt][0], quality=VARIANT_QUALITY)
+            os.replace(tmp, target)
+        return target
+
+    def _generate_or_remember(self, file_path: str, width: int, fmt: str, failed_key) -> Path:
+        try:
+            return self._generate(file_path, width, fmt)
+        except Exception:
+            # Unlesbares Original - bis zur nächsten Änderung der Datei nicht erneut versuchen
+            logger.warning("Keine Variante für %s möglich", file_path, exc_info=True)
+            self._failed.add(failed_key)
+            raise
+
+    def get(self, file_path: str, width: int, fmt: str):
+        """Future mit dem Pfad der Variante (sofort erfüllt, wenn sie schon existiert)
+
+        None, wenn aus dem Original keine Variante erzeugt werden kann.
+        """
+        target = self.variant_path(file_path, width, fmt)
+        if target.exists():
+            future = Future()
+            future.set_result(target)
+            return future
+        try:
+            failed_key = (file_path, (self.storage_path / file_path).stat().st_mtime_ns)
+        except FileNotFoundError:
+            return None
+        if failed_key in self._failed:
+            return None
+        key = (target, width, fmt)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._generate_or_remember, file_path, width, fmt, failed_key)
+                self._pending[key] = future
+                future.add_done_callback(lambda f: self._pending.pop(key, None))
+        return future
+
+    def pregenerate(self, file_path: str):
+        """Häufig gebrauchte Varianten im Hintergrund vorab erzeugen"""
+        for width in PREGENERATE_WIDTHS:
+            self.get(file_path, width, "webp")
+
+    def discard(self, paths):
+        """Entfernt die Varianten gelöschter Originale (absolute Pfade wie bei BlobStore.remove_files)"""
+        for path in paths:
+            if path is None:
+                continue
+            relative = str(Path(path).relative_to(self.storage_path))
+            shutil.rmtree(self._key_dir(self.source_key(relative)), ignore_errors=True)
@@ -0,0 +1,48 @@
+"""Bild-Vektorisierung mit vtracer
+
+Läuft in den Worker-Prozessen des Konvertierungs-Pools (siehe conversion_jobs)
+und importiert deshalb nur vtracer und svg_optimize - keine Datenbank, keine Web-App.
+vtracer wird erst beim ersten Aufruf geladen, damit der Start der Web-App es
+nicht mitbezahlt.
+"""
+import gzip
+import os
+from svg_optimize import DEFAULT_PRECISION, optimize_svg
+
+
+def svgz_path(output_path: str) -> str:
+    """Pfad der gzip-Variante (.svgz) neben output_path"""
+    return os.path.splitext(output_path)[0] + ".svgz"
+
+
+def trace_image(input_path: str, output_path: str, options: dict) -> tuple:
+    """Konvertiert input_path nach output_path (SVG)
+
+    Gibt (Größe vor, Größe nach der Optimierung) in Bytes zurück.
+    """
+    import vtracer
+
+    vtracer.convert_image_to_svg_py(
+        input_path,
+        output_path,
+        colormode=options["color_mode"],              # 'color' oder 'binary'
+        mode=options["mode"],                         # 'spline', 'polygon', oder 'none'
+        filter_speckle=options["filter_speckle"],     # Default: 4
+        color_precision=options["color_precision"],   # Default: 6
+        layer_difference=options["layer_difference"], # Default: 16
+        corner_threshold=options["corner_threshold"], # Default: 60
+    )
+    raw_size = os.path.getsize(output_path)
+
+    if options.get("optimize"):
+        with open(output_path, "r", encoding="utf-8") as f:
+            svg = f.read()
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(optimize_svg(svg, options.get("precision", DEFAULT_PRECISION)))
+
+    if options.get("svgz"):
+        # mtime=0: gleiche SVG ergibt byte-gleiche .svgz (Deduplizierung im BlobStore)
+        with open(output_path, "rb") as src, gzip.GzipFile(svgz_path(output_path), "wb", compresslevel=9, mtime=0) as dst:
+            dst.write(src.read())
+
+    return raw_size, os.path.getsize(output_path)
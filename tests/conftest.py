@@ -0,0 +1,20 @@
+"""Testumgebung: SQLite-Datenbank und Speicherordner in einem temporären Verzeichnis
+
+Die App-Module liegen flach in app/ und öffnen Templates relativ zum
+Arbeitsverzeichnis - daher sys.path und chdir wie im Container (WORKDIR /app).
+DATABASE_URL muss gesetzt sein, bevor database.py importiert wird.
+
+Ausführen im Projektverzeichnis: pip install pytest && python -m pytest
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+_TMP_DIR = tempfile.mkdtemp(prefix="picocalc-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/test.db"
+os.environ["FILE_STORAGE_PATH"] = f"{_TMP_DIR}/storage"
+sys.path.insert(0, str(APP_DIR))
+os.chdir(APP_DIR)
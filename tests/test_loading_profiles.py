@@ -0,0 +1,116 @@
+"""Die Listenansichten brauchen eine feste Anzahl SQL-Statements
+
+Jede Seite wird einmal mit einem und einmal mit vielen Datensätzen
+gerendert (die Kunden-Detailseite mit einer bzw. vielen Rechnungen samt
+Aufträgen). Lädt ein Template eine Beziehung pro Zeile nach (N+1), weil ein
+Lade-Profil (loading_profiles.py) sie nicht enthält, steigt die Zahl der
+Statements mit der Zeilenzahl und der Test schlägt fehl.
+"""
+import pytest
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+
+import main
+from database import SessionLocal, engine
+from models import (Article, ArticleCategory, Base, Customer, Invoice, InvoiceItem, Machine, Material,
+                    Product, ProductComponent, ProductImage, SalesOrder, SalesOrderItem)
+
+MANY = 25  # Mehr als eine Zeile, höchstens eine Seite (DEFAULT_PAGE_SIZE)
+MAX_STATEMENTS = 10
+
+LIST_PAGES = [
+    "/",  # products.summary
+    "/products",  # products.list
+    "/sales-orders",  # sales_orders.list
+    "/invoices",  # invoices.list
+    "/articles",  # articles.list
+    "/customers/1",  # view_customer: Rechnungen (invoices.list) des einzigen Kunden
+]
+
+
+def populate(db, count: int):
+    """count Datensätze je Liste, jeweils mit allen Beziehungen, die die Templates zeigen"""
+    material = Material(name="PLA", material_type="filament", unit="kg", price_per_unit=20)
+    machine = Machine(name="Drucker", machine_type="3d_printer", depreciation_euro=300,
+                      lifespan_hours=1000, power_kw=0.2)
+    category = ArticleCategory(code="T", name="Test", prefix="T-")
+    customer = Customer(customer_number="K-0001", last_name="Muster")
+    db.add_all([material, machine, category, customer])
+    db.flush()
+
+    for i in range(count):
+        product = Product(name=f"Produkt {i}", product_type="3d_print", category="Technik",
+                          filament_material_id=material.id, filament_weight_g=10, print_time_hours=1,
+                          machine_id=machine.id, labor_minutes=5, labor_rate_per_hour=20)
+        db.add(product)
+        db.flush()
+        db.add(ProductComponent(product_id=product.id, name="Ring", quantity=1, unit_cost=0.5))
+        db.add(ProductImage(product_id=product.id, original_filename="bild.png",
+                            stored_filename=f"bild-{i}.png", file_path=f"products/bild-{i}.png"))
+        article = Article(article_number=f"T-{i:04d}", category_id=category.id, name=f"Artikel {i}",
+                          purchase_price=1, selling_price=3, linked_product_id=product.id)
+        db.add(article)
+        db.flush()
+
+        order = SalesOrder(order_number=f"A-{i}", customer_name="Muster")
+        db.add(order)
+        db.flush()
+        db.add(SalesOrderItem(sales_order_id=order.id, item_type="product", product_id=product.id,
+                              quantity=2, unit_price=5, cost_per_unit=1))
+        db.add(SalesOrderItem(sales_order_id=order.id, item_type="article", article_id=article.id,
+                              quantity=1, unit_price=3, cost_per_unit=1))
+
+        invoice = Invoice(invoice_number=f"RE-{i:04d}", sales_order_id=order.id, customer_id=customer.id,
+                          customer_name="Muster", total_net=10, vat_amount=1.9, total_gross=11.9)
+        db.add(invoice)
+        db.flush()
+        db.add(InvoiceItem(invoice_id=invoice.id, position=1, article_id=article.id, description="Artikel",
+                           quantity=1, unit_price_net=10, total_net=10))
+    db.commit()
+    main.refresh_stale_snapshots(db)
+
+
+def statements_per_page(count: int) -> dict:
+    """Anzahl SQL-Statements je Listenseite bei count Datensätzen"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        populate(db, count)
+    finally:
+        db.close()
+
+    client = TestClient(main.app)
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    result = {}
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        for url in LIST_PAGES:
+            statements.clear()
+            response = client.get(url)
+            assert response.status_code == 200, url
+            result[url] = len(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    return result
+
+
+@pytest.fixture(scope="module")
+def counts():
+    return statements_per_page(1), statements_per_page(MANY)
+
+
+@pytest.mark.parametrize("url", LIST_PAGES)
+def test_statement_count_independent_of_rows(counts, url):
+    one, many = counts
+    assert many[url] == one[url], f"{url}: {one[url]} Statements bei 1 Zeile, {many[url]} bei {MANY}"
+
+
+@pytest.mark.parametrize("url", LIST_PAGES)
+def test_statement_count_bounded(counts, url):
+    _, many = counts
+    assert many[url] <= MAX_STATEMENTS, f"{url}: {many[url]} Statements"